@@ -0,0 +1,167 @@
+import argparse
+import json
+import logging
+import random
+import sqlite3
+import threading
+import time
+from urllib.parse import urlsplit
+import requests
+import http_client
+from http_client import redact_url
+
+FIXTURES_FILE = "api_fixtures.db"
+
+# Response headers and JSON body fields holding credentials, redacted before a fixture is written
+SECRET_HEADERS = {"authorization", "proxy-authorization", "set-cookie"}
+SECRET_FIELDS = {"access_token", "refresh_token", "id_token"}
+
+# Statuses the replay server answers with when an error is injected
+INJECTED_STATUSES = (429, 500, 503)
+
+logger = logging.getLogger(__name__)
+
+def redact_body(body):
+    """JSON body with credential fields replaced (token responses), other bodies unchanged"""
+    if not body.lstrip()[:1] == b"{":
+        return body
+    try:
+        data = json.loads(body)
+    except ValueError:
+        return body
+    if not isinstance(data, dict) or not SECRET_FIELDS & data.keys():
+        return body
+    return json.dumps({name: "REDACTED" if name in SECRET_FIELDS else value
+                       for name, value in data.items()}).encode("utf-8")
+
+class FixtureStore:
+    """
+    Recorded API responses in a SQLite file, one per method and redacted URL
+    (the latest recording wins). Tokens in the URL, headers and JSON body are
+    redacted before writing. Safe to use from several threads.
+    """
+
+    def __init__(self, fixtures_file=FIXTURES_FILE):
+        self.lock = threading.Lock()
+        self.conn = sqlite3.connect(fixtures_file, check_same_thread=False)
+        self.conn.execute("""
+            CREATE TABLE IF NOT EXISTS fixtures (
+                method TEXT NOT NULL,
+                url TEXT NOT NULL,
+                host TEXT NOT NULL,
+                status INTEGER NOT NULL,
+                headers TEXT NOT NULL,
+                body BLOB NOT NULL,
+                elapsed REAL,
+                recorded_at TEXT NOT NULL,
+                PRIMARY KEY (method, url)
+            )
+        """)
+        self.conn.commit()
+
+    def put(self, method, url, response, commit=True):
+        url = redact_url(url)
+        headers = "\n".join(f"{name}: {'REDACTED' if name.lower() in SECRET_HEADERS else value}"
+                            for name, value in response.headers.items()
+                            if name.lower() not in ("content-encoding", "transfer-encoding", "content-length"))
+        with self.lock:
+            self.conn.execute("""
+                INSERT OR REPLACE INTO fixtures (method, url, host, status, headers, body, elapsed, recorded_at)
+                VALUES (?, ?, ?, ?, ?, ?, ?, datetime('now'))
+            """, (method.upper(), url, urlsplit(url).netloc, response.status_code, headers,
+                  redact_body(response.content), response.elapsed.total_seconds()))
+            if commit:
+                self.conn.commit()
+
+    def get(self, method, url):
+        """Recorded (status, headers, body, elapsed) of a call, None if it was never recorded"""
+        with self.lock:
+            return self.conn.execute(
+                "SELECT status, headers, body, elapsed FROM fixtures WHERE method = ? AND url = ?",
+                (method.upper(), redact_url(url))).fetchone()
+
+    def summary(self):
+        """Number of fixtures and their mean recorded latency, per host"""
+        with self.lock:
+            return self.conn.execute("""
+                SELECT host, COUNT(*), AVG(elapsed) FROM fixtures GROUP BY host ORDER BY host
+            """).fetchall()
+
+class RecordingClient(http_client.HttpClient):
+    """HttpClient that stores every response it receives from the network in a FixtureStore"""
+
+    def __init__(self, store, **kwargs):
+        super().__init__(**kwargs)
+        self.store_fixtures = store
+
+    def send(self, method, url, **kwargs):
+        response = super().send(method, url, **kwargs)
+        self.store_fixtures.put(method, response.url or url, response)
+        return response
+
+class ReplayClient(http_client.HttpClient):
+    """
+    HttpClient answering from a FixtureStore instead of the network.
+
+    Each call waits `latency` seconds (plus up to `jitter`), or the latency measured
+    when it was recorded if `latency` is None. With probability `error_rate` it fails
+    instead: a 429/500/503 response, or a timeout for one in four injected errors.
+    Calls that were never recorded get a 404. Runs are reproducible for a given seed.
+    """
+
+    def __init__(self, store, latency=0.0, jitter=0.0, error_rate=0.0, seed=0, **kwargs):
+        kwargs.setdefault("cache", None)
+        super().__init__(**kwargs)
+        self.fixtures = store
+        self.latency = latency
+        self.jitter = jitter
+        self.error_rate = error_rate
+        self.random = random.Random(seed)
+        self.random_lock = threading.Lock()
+        self.stats.update({'replayed': 0, 'missing': 0, 'injected_errors': 0})
+
+    def send(self, method, url, params=None, **kwargs):
+        full_url = self.full_url(method, url, params)
+        self.count('network')
+        with self.random_lock:
+            jitter = self.random.uniform(0, self.jitter)
+            inject = self.random.random() < self.error_rate
+            error = self.random.choice(INJECTED_STATUSES + ("timeout",))
+
+        fixture = self.fixtures.get(method, full_url)
+        recorded_latency = fixture[3] if fixture and fixture[3] is not None else 0.0
+        time.sleep((recorded_latency if self.latency is None else self.latency) + jitter)
+
+        if inject:
+            self.count('injected_errors')
+            if error == "timeout":
+                raise requests.Timeout(f"Injected timeout for {full_url}")
+            response = http_client.build_response(full_url, error, "Retry-After: 1", b'{"error": "injected"}')
+        elif fixture is None:
+            self.count('missing')
+            logger.warning(f"No fixture recorded for {method.upper()} {redact_url(full_url)}")
+            response = http_client.build_response(full_url, 404, "", b'{"error": "no fixture"}')
+        else:
+            self.count('replayed')
+            status, headers, body, _ = fixture
+            response = http_client.build_response(full_url, status, headers, body)
+        response.request = requests.Request(method, full_url).prepare()
+        return response
+
+    def log_stats(self, log=None):
+        (log or logger).warning(
+            "Replayed calls: {replayed}, missing fixtures: {missing}, injected errors: {injected_errors}".format(**self.stats))
+
+def parse_args():
+    parser = argparse.ArgumentParser(description='Summarize the recorded API fixtures')
+    parser.add_argument('--fixtures-file', default=FIXTURES_FILE,
+                        help=f'Fixture database (default: {FIXTURES_FILE})')
+    return parser.parse_args()
+
+def main():
+    args = parse_args()
+    for host, count, elapsed in FixtureStore(args.fixtures_file).summary():
+        print(f"{host:<30} {count:>8} responses, {1000 * (elapsed or 0):8.1f} ms recorded latency")
+
+if __name__ == "__main__":
+    main()
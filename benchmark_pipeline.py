@@ -0,0 +1,188 @@
+import argparse
+import csv
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import datetime
+from generate_synthetic_data import SONGS_PER_CHART, generate_data
+
+REPO_DIR = os.path.dirname(os.path.abspath(__file__))
+
+DB_FILE = "music_weather.db"
+
+# database_update runs weather and charts together; call them one at a time to time them apart
+DATABASE_UPDATE_STAGE = ("import sys; sys.argv[1:] = ['--log-level', 'ERROR']; import database_update as d; "
+                         "d.CreateTables(); d.{}(); d.con.commit(); d.con.close()")
+
+# Stages in pipeline order, each run in its own process from the scale's directory
+STAGES = {
+    "weather": ["-c", DATABASE_UPDATE_STAGE.format("PopulateWeather")],
+    "charts": ["-c", DATABASE_UPDATE_STAGE.format("PopulateCharts")],
+    "csv_songs": [os.path.join(REPO_DIR, "csv_parsing_songs_update.py"),
+                  "--csv-dir", "song_metadata", "--non-interactive", "--log-level", "ERROR"],
+}
+
+# Runs a stage command (['-c', code, ...] or [script, ...]) and, on Linux, writes the stage's own
+# peak RSS in kB (VmHWM) to the file given as first argument. ru_maxrss cannot be used, in the
+# child or through wait4: Linux carries the parent's high-water mark over fork and exec.
+PEAK_RSS_WRAPPER = """\
+import atexit, os, runpy, sys
+rss_file = sys.argv.pop(1)
+
+def report_peak_rss():
+    with open('/proc/self/status') as status:
+        peak_kb = next(line.split()[1] for line in status if line.startswith('VmHWM:'))
+    with open(rss_file, 'w') as f:
+        f.write(peak_kb)
+
+if os.path.exists('/proc/self/status'):
+    atexit.register(report_peak_rss)
+if sys.argv[1] == '-c':
+    code = sys.argv[2]
+    sys.argv = ['-c'] + sys.argv[3:]
+    exec(compile(code, '<string>', 'exec'), {'__name__': '__main__'})
+else:
+    sys.argv = sys.argv[1:]
+    sys.path[0] = os.path.dirname(os.path.abspath(sys.argv[0]))
+    runpy.run_path(sys.argv[0], run_name='__main__')
+"""
+
+RESULT_COLUMNS = ["run_at", "cities", "days", "songs", "chart_rows", "stage", "seconds",
+                  "rows_per_second", "peak_rss_mb", "db_mb", "returncode"]
+
+def parse_scale(text):
+    """'1000x365' -> (1000 cities, 365 days)"""
+    try:
+        cities, days = (int(part) for part in text.lower().split("x"))
+    except ValueError:
+        raise argparse.ArgumentTypeError(f"Scale '{text}' is not CITIESxDAYS")
+    return cities, days
+
+def db_size_mb(scale_dir):
+    """Size of the database with its WAL file"""
+    size = 0
+    for name in (DB_FILE, DB_FILE + "-wal"):
+        path = os.path.join(scale_dir, name)
+        if os.path.exists(path):
+            size += os.path.getsize(path)
+    return size / 2 ** 20
+
+def run_stage(command, cwd, env):
+    """
+    Run a stage, returns (seconds, peak RSS in MB, return code).
+    Peak RSS is measured inside the stage's process (see PEAK_RSS_WRAPPER),
+    so it is None where /proc is missing (macOS, Windows).
+    """
+    fd, rss_file = tempfile.mkstemp(prefix="peak_rss_")
+    os.close(fd)
+    try:
+        start = time.perf_counter()
+        process = subprocess.run([sys.executable, "-c", PEAK_RSS_WRAPPER, rss_file] + command, cwd=cwd, env=env,
+                                 stdout=subprocess.DEVNULL, stderr=subprocess.PIPE)
+        seconds = time.perf_counter() - start
+        with open(rss_file) as f:
+            peak_kb = f.read().strip()
+    finally:
+        os.remove(rss_file)
+    peak_rss = int(peak_kb) / 2 ** 10 if peak_kb else None
+    if process.returncode != 0:
+        print(process.stderr.decode(errors="replace")[-2000:], file=sys.stderr)
+    return seconds, peak_rss, process.returncode
+
+def stage_env(fixtures_file, api_latency_ms):
+    """Environment replaying the synthetic Spotify fixtures instead of calling the API"""
+    env = dict(os.environ)
+    env["PYTHONPATH"] = os.pathsep.join(filter(None, [REPO_DIR, env.get("PYTHONPATH")]))
+    env["HTTP_MODE"] = "replay"
+    env["HTTP_FIXTURES_FILE"] = fixtures_file
+    env["HTTP_REPLAY_LATENCY_MS"] = str(api_latency_ms)
+    env.setdefault("MUSIC_CLIENT_ID", "synthetic")
+    env.setdefault("MUSIC_CLIENT_SECRET", "synthetic")
+    return env
+
+def benchmark_scale(work_dir, cities, days, args):
+    """Generate one scale's data and run every stage on it, returns the result rows"""
+    scale_dir = os.path.join(work_dir, f"{cities}x{days}")
+    if os.path.exists(scale_dir):
+        shutil.rmtree(scale_dir)
+    os.makedirs(scale_dir)
+    fixtures_file = os.path.abspath(os.path.join(scale_dir, "api_fixtures.db"))
+
+    run_at = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+    start = time.perf_counter()
+    counts = generate_data(scale_dir, num_cities=cities, num_days=days, num_songs=args.songs,
+                           distribution=args.distribution, exponent=args.zipf_exponent,
+                           fixtures_file=fixtures_file, seed=args.seed)
+    generate_seconds = time.perf_counter() - start
+    print(f"{cities}x{days}: generated {counts['chart_rows']} chart rows in {generate_seconds:.1f}s")
+
+    base = {"run_at": run_at, "cities": cities, "days": days, "songs": args.songs,
+            "chart_rows": counts["chart_rows"]}
+    rows_by_stage = {"weather": cities * days, "charts": counts["chart_rows"], "csv_songs": args.songs}
+    env = stage_env(fixtures_file, args.api_latency_ms)
+    results = []
+    for stage in args.stages:
+        seconds, peak_rss, returncode = run_stage(STAGES[stage], scale_dir, env)
+        result = dict(base, stage=stage, seconds=round(seconds, 3),
+                      rows_per_second=round(rows_by_stage[stage] / seconds, 1) if seconds else None,
+                      peak_rss_mb=round(peak_rss, 1) if peak_rss is not None else None,
+                      db_mb=round(db_size_mb(scale_dir), 2), returncode=returncode)
+        results.append(result)
+        print(f"{cities}x{days} {stage:<10} {seconds:9.2f}s  "
+              f"{result['rows_per_second'] or 0:10.1f} rows/s  "
+              f"peak RSS {result['peak_rss_mb'] or 0:8.1f} MB  DB {result['db_mb']:8.2f} MB"
+              + ("" if returncode == 0 else f"  FAILED ({returncode})"))
+
+    if not args.keep:
+        shutil.rmtree(scale_dir)
+    return results
+
+def save_results(results_file, results):
+    """Append result rows to the results CSV, writing the header for a new file"""
+    new_file = not os.path.exists(results_file)
+    with open(results_file, "a", newline="", encoding="utf-8") as f:
+        writer = csv.DictWriter(f, fieldnames=RESULT_COLUMNS)
+        if new_file:
+            writer.writeheader()
+        writer.writerows(results)
+
+def parse_args():
+    parser = argparse.ArgumentParser(
+        description='Benchmark the ingestion stages on synthetic data of growing size. '
+                    'Spotify lookups are replayed from generated fixtures, so no network is needed.')
+    parser.add_argument('--scales', type=parse_scale, nargs='+', default=[(10, 7), (100, 50), (1000, 50)],
+                        metavar='CITIESxDAYS',
+                        help='Scales to run (default: 10x7 100x50 1000x50)')
+    parser.add_argument('--stages', nargs='+', choices=list(STAGES), default=list(STAGES),
+                        help='Stages to run, in order (default: all)')
+    parser.add_argument('--songs', type=int, default=5000,
+                        help=f'Catalog size, at least {SONGS_PER_CHART} (default: 5000)')
+    parser.add_argument('--distribution', choices=['zipf', 'uniform'], default='zipf',
+                        help='Song popularity distribution (default: zipf)')
+    parser.add_argument('--zipf-exponent', type=float, default=1.1,
+                        help='Exponent of the zipf popularity distribution (default: 1.1)')
+    parser.add_argument('--api-latency-ms', type=float, default=0,
+                        help='Simulated latency of each replayed API call (default: 0)')
+    parser.add_argument('--work-dir', default='benchmark_runs',
+                        help='Directory for the generated data and databases (default: benchmark_runs)')
+    parser.add_argument('--results-file', default='benchmark_results.csv',
+                        help='CSV the results are appended to (default: benchmark_results.csv)')
+    parser.add_argument('--keep', action='store_true',
+                        help='Keep each scale\'s data and database instead of deleting them')
+    parser.add_argument('--seed', type=int, default=0,
+                        help='Random seed of the generated data (default: 0)')
+    return parser.parse_args()
+
+def main():
+    args = parse_args()
+    os.makedirs(args.work_dir, exist_ok=True)
+    for cities, days in args.scales:
+        results = benchmark_scale(args.work_dir, cities, days, args)
+        save_results(args.results_file, results)
+    print(f"Results appended to {args.results_file}")
+
+if __name__ == "__main__":
+    main()
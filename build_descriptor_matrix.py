@@ -0,0 +1,202 @@
+import argparse
+import json
+import os
+import sqlite3
+import numpy as np
+from pathlib import Path
+
+from extract_features import get_filename_index, load_analysis, KEY_NAMES, SCALE_NAMES
+
+# Bump when the flattening rules below change so old layouts are not reused
+SCHEMA_VERSION = 1
+
+# Sections of the Essentia document that hold descriptors (metadata is skipped)
+SECTIONS = ('lowlevel', 'rhythm', 'tonal')
+
+def flatten_descriptors(data):
+    """
+    Flatten the descriptor sections of an analysis document into blocks.
+    Nested keys are joined with '.'; numeric lists are kept whole as one block
+    and key/scale names become codes into KEY_NAMES/SCALE_NAMES. Other strings are dropped.
+    Returns a dictionary of path -> float32 array (0-d for scalars), in document order.
+    """
+    blocks = {}
+
+    def walk(node, path):
+        if isinstance(node, dict):
+            for key, value in node.items():
+                walk(value, f"{path}.{key}")
+        elif isinstance(node, str):
+            if node in KEY_NAMES:
+                blocks[path] = np.float32(KEY_NAMES.index(node))
+            elif node in SCALE_NAMES:
+                blocks[path] = np.float32(SCALE_NAMES.index(node))
+        else:
+            try:
+                blocks[path] = np.asarray(node, dtype=np.float32)
+            except (TypeError, ValueError):
+                pass
+
+    for section in SECTIONS:
+        if section in data:
+            walk(data[section], section)
+    return blocks
+
+def block_columns(path, shape):
+    """Column names for a block, list items get their index appended (e.g. 'lowlevel.mfcc.cov.3.7')"""
+    if not shape:
+        return [path]
+    return [f"{path}.{'.'.join(map(str, index))}" for index in np.ndindex(*shape)]
+
+def list_analysis_files(analysis_dir):
+    """Sorted list of *_analysis.json files, without the combined analysis file"""
+    return sorted(
+        path for path in Path(analysis_dir).glob('*_analysis.json')
+        if path.name != 'combined_analysis.json'
+    )
+
+def load_blocks(json_file):
+    """Flattened blocks of an analysis file, empty when it cannot be read"""
+    try:
+        return flatten_descriptors(load_analysis(json_file))
+    except Exception as e:
+        print(f"Error processing {json_file}: {e}")
+        return {}
+
+def build_schema(documents):
+    """
+    Derive the block layout from the flattened blocks of all analysis files, in first-seen document order.
+    Blocks whose shape differs between files (e.g. rhythm.beats_position)
+    cannot have a fixed layout and are left out.
+    Returns a list of [path, shape] pairs.
+    """
+    shapes = {}
+    variable = set()
+    for blocks in documents:
+        for path, value in blocks.items():
+            if shapes.setdefault(path, value.shape) != value.shape:
+                variable.add(path)
+
+    if variable:
+        print(f"Skipping {len(variable)} variable-length blocks: {', '.join(sorted(variable))}")
+
+    return [[path, list(shape)] for path, shape in shapes.items() if path not in variable]
+
+def load_schema(schema_file):
+    """Load an existing schema, None if missing or written by other flattening rules"""
+    if not os.path.exists(schema_file):
+        return None
+    with open(schema_file, 'r', encoding='utf-8') as f:
+        schema = json.load(f)
+    if schema.get('schema_version') != SCHEMA_VERSION:
+        return None
+    return schema
+
+def preview_filename_index(db_file):
+    """Map preview file stems to spotify_id (see extract_features.get_filename_index), empty without a database"""
+    if not os.path.exists(db_file):
+        return {}
+    conn = sqlite3.connect(db_file)
+    try:
+        return get_filename_index(conn.cursor())
+    except sqlite3.Error as e:
+        print(f"Could not read songs from {db_file}: {e}")
+        return {}
+    finally:
+        conn.close()
+
+def build_descriptor_matrix(analysis_dir, output_dir, db_file, new_schema=False):
+    """
+    Write output_dir/descriptors.npy (float32, songs x columns, NaN where a file lacks a column),
+    output_dir/schema.json (versioned block and column layout) and output_dir/rows.json (filename/spotify_id per row).
+    An existing schema is reused so column positions stay stable between builds.
+    """
+    os.makedirs(output_dir, exist_ok=True)
+    schema_file = os.path.join(output_dir, 'schema.json')
+    json_files = list_analysis_files(analysis_dir)
+
+    # Flattened files are kept when the layout is derived so each file is only parsed once
+    documents = None
+    schema = None if new_schema else load_schema(schema_file)
+    if schema is None:
+        previous = load_schema(schema_file)
+        documents = [load_blocks(json_file) for json_file in json_files]
+        blocks = build_schema(documents)
+        layout_version = 1
+        if previous is not None:
+            layout_version = previous['layout_version'] + (previous['blocks'] != blocks)
+        schema = {
+            'schema_version': SCHEMA_VERSION,
+            'layout_version': layout_version,
+            'sections': list(SECTIONS),
+            'dtype': 'float32',
+            'blocks': blocks,
+            'columns': [c for path, shape in blocks for c in block_columns(path, shape)],
+        }
+        with open(schema_file, 'w', encoding='utf-8') as f:
+            json.dump(schema, f, indent=2)
+
+    # Each block occupies a contiguous run of columns
+    plan = {}
+    start = 0
+    for path, shape in schema['blocks']:
+        size = int(np.prod(shape))
+        plan[path] = (start, size, tuple(shape))
+        start += size
+
+    matrix = np.lib.format.open_memmap(
+        os.path.join(output_dir, 'descriptors.npy'), mode='w+',
+        dtype=np.float32, shape=(len(json_files), start)
+    )
+
+    spotify_ids = preview_filename_index(db_file)
+    rows = []
+    for row, json_file in enumerate(json_files):
+        filename = json_file.name.replace('_analysis.json', '')
+        vector = np.full(start, np.nan, dtype=np.float32)
+        blocks = documents[row] if documents is not None else load_blocks(json_file)
+        for path, value in blocks.items():
+            if path in plan and value.shape == plan[path][2]:
+                offset, size, _ = plan[path]
+                vector[offset:offset + size] = value.ravel()
+        matrix[row] = vector
+        rows.append({'filename': filename, 'spotify_id': spotify_ids.get(filename)})
+
+    matrix.flush()
+    with open(os.path.join(output_dir, 'rows.json'), 'w', encoding='utf-8') as f:
+        json.dump(rows, f, ensure_ascii=False)
+
+    print(f"Wrote {matrix.shape[0]} songs x {matrix.shape[1]} descriptors "
+          f"(layout v{schema['layout_version']}) to {output_dir}/")
+    return matrix
+
+def load_descriptor_matrix(output_dir='descriptor_matrix', mmap_mode='r'):
+    """
+    Memory-map a matrix written by build_descriptor_matrix.
+    Returns (rows, schema, matrix).
+    """
+    with open(os.path.join(output_dir, 'schema.json'), 'r', encoding='utf-8') as f:
+        schema = json.load(f)
+    with open(os.path.join(output_dir, 'rows.json'), 'r', encoding='utf-8') as f:
+        rows = json.load(f)
+    matrix = np.load(os.path.join(output_dir, 'descriptors.npy'), mmap_mode=mmap_mode)
+    return rows, schema, matrix
+
+def parse_args():
+    parser = argparse.ArgumentParser(description='Build a float32 matrix of every Essentia descriptor')
+    parser.add_argument('--analysis-dir', default='essentia_output_deezer',
+                        help='Directory containing *_analysis.json files (default: essentia_output_deezer)')
+    parser.add_argument('--output-dir', default='descriptor_matrix',
+                        help='Directory for descriptors.npy, schema.json and rows.json (default: descriptor_matrix)')
+    parser.add_argument('--db', default='music_weather.db',
+                        help='Database used to map filenames to spotify_id (default: music_weather.db)')
+    parser.add_argument('--new-schema', action='store_true',
+                        help='Re-derive the column layout instead of reusing schema.json')
+    return parser.parse_args()
+
+def main():
+    args = parse_args()
+    build_descriptor_matrix(args.analysis_dir, args.output_dir, args.db, new_schema=args.new_schema)
+
+if __name__ == '__main__':
+    main()
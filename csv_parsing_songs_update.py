@@ -1,15 +1,20 @@
 import sqlite3
 import csv
 import os
-import re
+import json
+import hashlib
 import logging
 import argparse
+from concurrent.futures import ProcessPoolExecutor
 from logger_config import get_script_logger
+from song_matching import MatchIndex, normalize_artist, normalize_title
 
 # Parse command line arguments
 parser = argparse.ArgumentParser(description='Parse CSV files for song information and update database')
-parser.add_argument('--csv-file', type=str, required=True,
+parser.add_argument('--csv-file', type=str,
                     help='Path to the CSV file to parse')
+parser.add_argument('--csv-dir', type=str,
+                    help='Process every CSV file in this directory (batch mode)')
 parser.add_argument('--log-level', 
                     choices=['DEBUG', 'INFO', 'WARNING', 'ERROR', 'CRITICAL'],
                     default='WARNING',
@@ -18,6 +23,14 @@ parser.add_argument('--batch-size', type=int, default=50,
                     help='Number of records to process in each batch (default: 50)')
 parser.add_argument('--non-interactive', action='store_true',
                     help='Run in non-interactive mode (not recommended)')
+parser.add_argument('--profile', type=str,
+                    help='Name of the column mapping profile to use, or to save a new mapping under')
+parser.add_argument('--profiles-file', type=str, default='column_mapping_profiles.json',
+                    help='File storing column mapping profiles (default: column_mapping_profiles.json)')
+parser.add_argument('--overwrite-profile', action='store_true',
+                    help='Allow a new interactive mapping to replace a saved profile of the same name')
+parser.add_argument('--workers', type=int, default=None,
+                    help='Number of parallel CSV parse workers in batch mode (default: one per CPU)')
 args = parser.parse_args()
 
 # Convert string log level to logging constant
@@ -280,91 +293,338 @@ def interactive_column_matching(csv_columns, db_columns):
     
     return matching_columns, update_columns
 
-def get_first_word(text):
-    """Get the first word of a text, handling special characters"""
-    if not text:
-        return ""
-    # Split on whitespace and take first word, removing any special characters
-    return text.split()[0].lower().strip('.,!?()[]{}')
+def flush_song_updates(conn, pending_updates):
+    """
+    Apply queued updates, but only for fields that don't already have values.
+    pending_updates maps a tuple of database columns to a list of
+    (values..., spotify_id) parameter tuples; each column set is applied
+    with a single executemany and everything is committed together.
+    Returns the number of songs that actually had a field filled.
+    """
+    updated = 0
+    cursor = conn.cursor()
+    for db_columns, params in pending_updates.items():
+        assignments = ', '.join(f"{col} = COALESCE(NULLIF({col}, ''), ?)" for col in db_columns)
+        empty_check = ' OR '.join(f"{col} IS NULL OR {col} = ''" for col in db_columns)
+        cursor.executemany(f"""
+            UPDATE songs 
+            SET {assignments}
+            WHERE spotify_id = ? AND ({empty_check})
+        """, params)
+        updated += max(cursor.rowcount, 0)
+    conn.commit()
+    logger.debug(f"Flushed {sum(len(p) for p in pending_updates.values())} queued updates, {updated} songs updated")
+    pending_updates.clear()
+    return updated
+
+def approximate_key(db_col, value):
+    """Normalized form of a value for approximate matching"""
+    if db_col == 'artist':
+        return normalize_artist(value)
+    if db_col == 'title':
+        return normalize_title(value)
+    return ' '.join(str(value).lower().split())
+
+def songs_table_columns(cursor):
+    """Column names of the songs table"""
+    cursor.execute("PRAGMA table_info(songs)")
+    return {col[1] for col in cursor.fetchall()}
+
+def filter_update_columns(csv_file_path, update_columns, known_columns):
+    """
+    Drop update columns mapped to database columns the songs table does not have,
+    with a warning for each, so they never reach the UPDATE statement.
+    """
+    kept = {}
+    for csv_col, db_col in update_columns.items():
+        if db_col in known_columns:
+            kept[csv_col] = db_col
+        else:
+            logger.warning(f"Ignoring column '{csv_col}' of {csv_file_path}: songs has no column '{db_col}'")
+    return kept
 
-def is_approximate_match(str1, str2):
-    """Check if two strings match approximately by comparing first words"""
-    if not str1 or not str2:
-        return False
-    # Try exact match first
-    if str1.lower() == str2.lower():
-        return True
-    # Try first word match
-    return get_first_word(str1) == get_first_word(str2)
+def load_match_rows(cursor, db_columns):
+    """
+    Load spotify_id and the given match columns for every song in one query.
+    Returns a list of dictionaries.
+    """
+    known_columns = songs_table_columns(cursor)
+    unknown = [col for col in db_columns if col not in known_columns]
+    if unknown:
+        raise ValueError(f"Unknown database columns for matching: {', '.join(unknown)}")
+    
+    select_columns = ', '.join(['spotify_id'] + list(db_columns))
+    cursor.execute(f"SELECT {select_columns} FROM songs")
+    return [dict(zip(['spotify_id'] + list(db_columns), row)) for row in cursor.fetchall()]
 
-def update_song_info(spotify_id, updates):
+def build_match_indexes(songs, db_columns):
     """
-    Update song information in the database, but only for fields that don't already have values.
+    Build hash indexes over the songs for one combination of match columns.
+    Returns:
+    1. Exact index (case-insensitive values), key tuple -> spotify_id
+    2. Approximate index (normalized values, see song_matching), key tuple -> spotify_id
+    3. Fuzzy MatchIndex over title/artist, None when matching on other columns
+    The first song in table order wins when several share a key.
     """
+    exact_index = {}
+    approximate_index = {}
+    fuzzy_index = MatchIndex() if 'title' in db_columns and set(db_columns) <= {'title', 'artist'} else None
+    for song in songs:
+        values = [song[db_col] for db_col in db_columns]
+        if any(value is None for value in values):
+            continue
+        exact_index.setdefault(tuple(str(value).lower() for value in values), song['spotify_id'])
+        approximate_index.setdefault(
+            tuple(approximate_key(db_col, value) for db_col, value in zip(db_columns, values)),
+            song['spotify_id']
+        )
+        if fuzzy_index is not None:
+            fuzzy_index.add(song['spotify_id'], song['title'], song.get('artist'))
+    return exact_index, approximate_index, fuzzy_index
+
+def header_signature(csv_columns):
+    """Signature of a CSV header, used to recognise files from the same source"""
+    normalized = [col.strip().lower() for col in csv_columns]
+    return hashlib.sha1("\x1f".join(normalized).encode('utf-8')).hexdigest()
+
+def load_profiles():
+    """Load saved column mapping profiles, keyed by profile name"""
+    if not os.path.exists(args.profiles_file):
+        return {}
     try:
-        conn = sqlite3.connect(DB_FILE)
-        cursor = conn.cursor()
-        
-        # First, get the current values for this song
-        cursor.execute("SELECT * FROM songs WHERE spotify_id = ?", (spotify_id,))
-        current_values = cursor.fetchone()
-        
-        if not current_values:
-            logger.warning(f"No song found with ID {spotify_id}")
+        with open(args.profiles_file, 'r', encoding='utf-8') as f:
+            return json.load(f)
+    except (OSError, ValueError) as e:
+        logger.error(f"Error reading profiles file {args.profiles_file}: {e}")
+        return {}
+
+def save_profile(name, csv_columns, matching_columns, update_columns):
+    """
+    Save a column mapping under a profile name. An existing profile of that name
+    is only replaced with --overwrite-profile; returns whether the mapping was saved.
+    """
+    profiles = load_profiles()
+    if name in profiles:
+        old = profiles[name]
+        if not args.overwrite_profile:
+            logger.warning(f"Not saving the mapping as profile '{name}', which already exists "
+                           f"(use --overwrite-profile to replace it, or --profile to pick another name)")
             return False
-        
-        # Get column names
-        cursor.execute("PRAGMA table_info(songs)")
-        columns = [col[1] for col in cursor.fetchall()]
-        
-        # Create a dictionary of current values
-        current_data = {}
-        for i, col in enumerate(columns):
-            current_data[col] = current_values[i]
-        
-        # Build the update query dynamically based on available data
-        update_fields = []
-        params = []
-        
-        for field, value in updates.items():
-            # Only update if the current value is None or empty
-            if value is not None and (current_data.get(field) is None or current_data.get(field) == ''):
-                update_fields.append(f"{field} = ?")
-                params.append(value)
-                logger.debug(f"Will update {field} from empty to '{value}'")
+        logger.warning(f"Replacing profile '{name}': matching {old['matching_columns']}, "
+                       f"updating {old['update_columns']}")
+    profiles[name] = {
+        'signature': header_signature(csv_columns),
+        'header': list(csv_columns),
+        'matching_columns': matching_columns,
+        'update_columns': update_columns
+    }
+    with open(args.profiles_file, 'w', encoding='utf-8') as f:
+        json.dump(profiles, f, indent=2, ensure_ascii=False)
+    logger.info(f"Saved column mapping profile '{name}' to {args.profiles_file}")
+    return True
+
+def fit_profile(profile, csv_columns):
+    """
+    Profile whose column names are those of the actual CSV header, matched
+    case-insensitively as in header_signature. Returns (profile, missing column names).
+    """
+    header = {col.strip().lower(): col for col in csv_columns}
+    fitted = dict(profile)
+    missing = []
+    for key in ('matching_columns', 'update_columns'):
+        fitted[key] = {}
+        for csv_col, db_col in profile[key].items():
+            actual = header.get(csv_col.strip().lower())
+            if actual is None:
+                missing.append(csv_col)
             else:
-                logger.debug(f"Skipping update for {field} as it already has a value: '{current_data.get(field)}'")
-        
-        if not update_fields:
-            logger.info(f"No fields to update for song with ID {spotify_id} (all fields already have values)")
-            return False
-        
-        # Add the spotify_id to the parameters
-        params.append(spotify_id)
-        
-        # Execute the update query
-        query = f"""
-            UPDATE songs 
-            SET {', '.join(update_fields)}
-            WHERE spotify_id = ?
-        """
+                fitted[key][actual] = db_col
+    return fitted, missing
+
+def find_profile(csv_columns, name=None):
+    """
+    Find a saved mapping for a CSV header.
+    A named profile is used if all of its columns exist in the header,
+    otherwise the first profile with the same header signature.
+    Returns (name, profile) or (None, None); the profile's columns use the header's spelling.
+    """
+    profiles = load_profiles()
+    if name and name in profiles:
+        profile, missing = fit_profile(profiles[name], csv_columns)
+        if not missing:
+            return name, profile
+        logger.warning(f"Profile '{name}' uses columns missing from this CSV: {', '.join(sorted(missing))}")
+        return None, None
+    signature = header_signature(csv_columns)
+    for profile_name, profile in profiles.items():
+        if profile.get('signature') == signature:
+            return profile_name, fit_profile(profile, csv_columns)[0]
+    return None, None
+
+def auto_column_matching(csv_columns):
+    """
+    Guess matching and update columns from CSV column names.
+    Returns the same two dictionaries as interactive_column_matching.
+    """
+    matching_columns = {}
+    update_columns = {}
+    
+    # Find title and artist columns for matching
+    for col in csv_columns:
+        col_lower = col.lower()
+        if 'title' in col_lower or 'song' in col_lower or 'track' in col_lower or 'name' in col_lower:
+            matching_columns[col] = 'title'
+        elif 'artist' in col_lower or 'performer' in col_lower or 'singer' in col_lower or 'band' in col_lower:
+            matching_columns[col] = 'artist'
+    
+    # Find other columns for updating
+    for col in csv_columns:
+        if col not in matching_columns:
+            col_lower = col.lower()
+            if 'album' in col_lower or 'record' in col_lower:
+                update_columns[col] = 'album'
+            elif 'year' in col_lower or 'release' in col_lower or 'date' in col_lower:
+                update_columns[col] = 'release_year'
+            elif 'genre' in col_lower or 'style' in col_lower or 'category' in col_lower:
+                update_columns[col] = 'genres'
+    
+    return matching_columns, update_columns
+
+def resolve_column_mapping(csv_file_path, csv_columns, db_columns):
+    """
+    Get the column mapping for a CSV file: a saved profile if one fits,
+    otherwise ask interactively (and save the answer as a profile),
+    or guess from column names in non-interactive mode.
+    """
+    profile_name, profile = find_profile(csv_columns, args.profile)
+    if profile:
+        logger.info(f"Using column mapping profile '{profile_name}' for {csv_file_path}")
+        return profile['matching_columns'], profile['update_columns']
+    
+    if not args.non_interactive:
+        print(f"\nNo saved column mapping for {csv_file_path}")
+        matching_columns, update_columns = interactive_column_matching(csv_columns, db_columns)
+        name = args.profile or os.path.splitext(os.path.basename(csv_file_path))[0]
+        save_profile(name, csv_columns, matching_columns, update_columns)
+        return matching_columns, update_columns
+    
+    logger.warning(f"No saved profile for {csv_file_path}, guessing columns (not recommended)")
+    return auto_column_matching(csv_columns)
+
+def read_csv_rows(csv_file_path, matching_columns, update_columns):
+    """
+    Read the match and update values of every CSV row.
+    Returns a list of (match_values, update_values) dictionaries keyed by database column.
+    Runs in the parse workers in batch mode, so it does not touch the database.
+    """
+    rows = []
+    with open(csv_file_path, 'r', encoding='utf-8-sig') as file:
+        reader = csv.DictReader(file)
         
-        cursor.execute(query, params)
-        conn.commit()
+        if not reader.fieldnames:
+            raise ValueError("CSV file has no headers")
         
-        if cursor.rowcount > 0:
-            logger.info(f"Updated song with ID {spotify_id}")
-            return True
-        else:
-            logger.warning(f"No song found with ID {spotify_id}")
-            return False
+        for row in reader:
+            # Get values for matching
+            match_values = {}
+            for csv_col, db_col in matching_columns.items():
+                value = (row.get(csv_col) or '').strip()
+                if value:
+                    match_values[db_col] = value
             
-    except sqlite3.Error as e:
-        logger.error(f"Database error: {e}")
-        return False
-    finally:
-        if conn:
-            conn.close()
+            # Skip if we don't have enough values to match
+            if not match_values:
+                logger.warning("Skipping row with no matching values")
+                continue
+            
+            # Get values for updating
+            update_values = {}
+            for csv_col, db_col in update_columns.items():
+                value = (row.get(csv_col) or '').strip()
+                if value:
+                    update_values[db_col] = value
+            
+            rows.append((match_values, update_values))
+    return rows
+
+def parse_csv_job(job):
+    """Parse worker for batch mode, reports errors instead of raising them across processes"""
+    csv_file_path, matching_columns, update_columns = job
+    try:
+        return csv_file_path, read_csv_rows(csv_file_path, matching_columns, update_columns), None
+    except Exception as e:
+        return csv_file_path, None, str(e)
+
+def apply_csv_rows(conn, songs, indexes, rows):
+    """
+    Match parsed CSV rows against the songs and apply batched updates.
+    indexes caches match indexes per combination of match columns and can be shared between files.
+    Returns a dictionary of counts.
+    """
+    pending_updates = {}
+    pending_count = 0
+    counts = {'updates': 0, 'matches': 0, 'approximate_matches': 0, 'no_matches': 0}
+    
+    for match_values, update_values in rows:
+        # Indexes depend on which match columns this row has values for
+        db_columns = tuple(sorted(match_values))
+        if db_columns not in indexes:
+            indexes[db_columns] = build_match_indexes(songs, db_columns)
+        exact_index, approximate_index, fuzzy_index = indexes[db_columns]
+        
+        # Try to find a match in the database
+        match_found = False
+        spotify_id = exact_index.get(tuple(match_values[db_col].lower() for db_col in db_columns))
+        if spotify_id is not None:
+            logger.debug(f"Exact match found for: {match_values}")
+            match_found = True
+            counts['matches'] += 1
+        else:
+            spotify_id = approximate_index.get(
+                tuple(approximate_key(db_col, match_values[db_col]) for db_col in db_columns)
+            )
+            if spotify_id is not None:
+                logger.debug(f"Approximate match found for: {match_values}")
+                match_found = True
+                counts['approximate_matches'] += 1
+            elif fuzzy_index is not None:
+                # Typos and leftover credits the normalized keys miss
+                result = fuzzy_index.lookup(match_values['title'], match_values.get('artist'))
+                if result is not None:
+                    spotify_id, score, _ = result
+                    logger.debug(f"Fuzzy match found for: {match_values} (score {score:.2f})")
+                    match_found = True
+                    counts['approximate_matches'] += 1
+        
+        # Queue the update, grouped by the set of columns it fills
+        if match_found and update_values:
+            db_update_columns = tuple(sorted(update_values))
+            pending_updates.setdefault(db_update_columns, []).append(
+                tuple(update_values[col] for col in db_update_columns) + (spotify_id,)
+            )
+            pending_count += 1
+            if pending_count >= args.batch_size:
+                counts['updates'] += flush_song_updates(conn, pending_updates)
+                pending_count = 0
+        
+        if not match_found:
+            logger.debug(f"No match found for: {match_values}")
+            counts['no_matches'] += 1
+    
+    # Apply the last partial batch
+    if pending_updates:
+        counts['updates'] += flush_song_updates(conn, pending_updates)
+    
+    return counts
+
+def log_summary(csv_file_path, counts):
+    """Log the match and update counts for a CSV file"""
+    logger.info(f"CSV processing complete for {csv_file_path}:")
+    logger.info(f"  Total rows processed: {counts['matches'] + counts['approximate_matches'] + counts['no_matches']}")
+    logger.info(f"  Exact matches: {counts['matches']}")
+    logger.info(f"  Approximate matches: {counts['approximate_matches']}")
+    logger.info(f"  No matches: {counts['no_matches']}")
+    logger.info(f"  Updates performed: {counts['updates']}")
 
 def process_csv_file(csv_file_path, matching_columns, update_columns):
     """
@@ -374,138 +634,34 @@ def process_csv_file(csv_file_path, matching_columns, update_columns):
         logger.error(f"CSV file not found: {csv_file_path}")
         return
     
+    conn = None
     try:
         # Connect to the database
         conn = sqlite3.connect(DB_FILE)
         cursor = conn.cursor()
         
-        # Get all songs from the database
-        cursor.execute("SELECT spotify_id, title, artist FROM songs")
-        songs = cursor.fetchall()
+        # Load the match columns of all songs once
+        songs = load_match_rows(cursor, sorted(set(matching_columns.values())))
+        update_columns = filter_update_columns(csv_file_path, update_columns, songs_table_columns(cursor))
         
         if not songs:
             logger.warning("No songs found in the database")
             return
         
-        total_songs = len(songs)
-        logger.info(f"Found {total_songs} songs in the database")
+        logger.info(f"Found {len(songs)} songs in the database")
         
-        # Open and read the CSV file
-        with open(csv_file_path, 'r', encoding='utf-8-sig') as file:
-            reader = csv.DictReader(file)
-            header = reader.fieldnames
-            
-            if not header:
-                logger.error("CSV file has no headers")
-                return
-            
-            # Log the column mappings
-            logger.info("Matching columns:")
-            for csv_col, db_col in matching_columns.items():
-                logger.info(f"  CSV: '{csv_col}' -> DB: '{db_col}'")
-            
-            logger.info("Update columns:")
-            for csv_col, db_col in update_columns.items():
-                logger.info(f"  CSV: '{csv_col}' -> DB: '{db_col}'")
-            
-            # Process each row in the CSV
-            updates = 0
-            matches = 0
-            approximate_matches = 0
-            no_matches = 0
-            
-            for row in reader:
-                # Get values for matching
-                match_values = {}
-                for csv_col, db_col in matching_columns.items():
-                    value = row.get(csv_col, '').strip()
-                    if value:
-                        match_values[db_col] = value
-                
-                # Skip if we don't have enough values to match
-                if not match_values:
-                    logger.warning("Skipping row with no matching values")
-                    continue
-                
-                # Get values for updating
-                update_values = {}
-                for csv_col, db_col in update_columns.items():
-                    value = row.get(csv_col, '').strip()
-                    if value:
-                        update_values[db_col] = value
-                
-                # Try to find a match in the database
-                match_found = False
-                for spotify_id, db_title, db_artist in songs:
-                    # Check for exact match
-                    exact_match = True
-                    for db_col, value in match_values.items():
-                        db_value = None
-                        if db_col == 'title':
-                            db_value = db_title
-                        elif db_col == 'artist':
-                            db_value = db_artist
-                        else:
-                            # For other columns, we need to query the database
-                            cursor.execute(f"SELECT {db_col} FROM songs WHERE spotify_id = ?", (spotify_id,))
-                            result = cursor.fetchone()
-                            if result:
-                                db_value = result[0]
-                        
-                        if db_value is None or value.lower() != db_value.lower():
-                            exact_match = False
-                            break
-                    
-                    if exact_match:
-                        logger.debug(f"Exact match found for: {match_values}")
-                        match_found = True
-                        matches += 1
-                        
-                        # Update the song information
-                        if update_song_info(spotify_id, update_values):
-                            updates += 1
-                        break
-                    
-                    # Check for approximate match
-                    approx_match = True
-                    for db_col, value in match_values.items():
-                        db_value = None
-                        if db_col == 'title':
-                            db_value = db_title
-                        elif db_col == 'artist':
-                            db_value = db_artist
-                        else:
-                            # For other columns, we need to query the database
-                            cursor.execute(f"SELECT {db_col} FROM songs WHERE spotify_id = ?", (spotify_id,))
-                            result = cursor.fetchone()
-                            if result:
-                                db_value = result[0]
-                        
-                        if db_value is None or not is_approximate_match(value, db_value):
-                            approx_match = False
-                            break
-                    
-                    if approx_match:
-                        logger.debug(f"Approximate match found for: {match_values}")
-                        match_found = True
-                        approximate_matches += 1
-                        
-                        # Update the song information
-                        if update_song_info(spotify_id, update_values):
-                            updates += 1
-                        break
-                
-                if not match_found:
-                    logger.debug(f"No match found for: {match_values}")
-                    no_matches += 1
-            
-            # Log summary
-            logger.info(f"CSV processing complete:")
-            logger.info(f"  Total rows processed: {matches + approximate_matches + no_matches}")
-            logger.info(f"  Exact matches: {matches}")
-            logger.info(f"  Approximate matches: {approximate_matches}")
-            logger.info(f"  No matches: {no_matches}")
-            logger.info(f"  Updates performed: {updates}")
+        # Log the column mappings
+        logger.info("Matching columns:")
+        for csv_col, db_col in matching_columns.items():
+            logger.info(f"  CSV: '{csv_col}' -> DB: '{db_col}'")
+        
+        logger.info("Update columns:")
+        for csv_col, db_col in update_columns.items():
+            logger.info(f"  CSV: '{csv_col}' -> DB: '{db_col}'")
+        
+        rows = read_csv_rows(csv_file_path, matching_columns, update_columns)
+        counts = apply_csv_rows(conn, songs, {}, rows)
+        log_summary(csv_file_path, counts)
     
     except Exception as e:
         logger.error(f"Error processing CSV file: {e}")
@@ -513,53 +669,102 @@ def process_csv_file(csv_file_path, matching_columns, update_columns):
         if conn:
             conn.close()
 
+def process_csv_batch(jobs):
+    """
+    Process many CSV files: parse workers read the files in parallel
+    and this process is the single database writer.
+    jobs is a list of (csv_file_path, matching_columns, update_columns).
+    """
+    conn = None
+    try:
+        conn = sqlite3.connect(DB_FILE)
+        cursor = conn.cursor()
+        
+        # Load every match column any of the files needs, once
+        match_db_columns = sorted({db_col for _, matching_columns, _ in jobs for db_col in matching_columns.values()})
+        songs = load_match_rows(cursor, match_db_columns)
+        known_columns = songs_table_columns(cursor)
+        jobs = [(csv_file_path, matching_columns, filter_update_columns(csv_file_path, update_columns, known_columns))
+                for csv_file_path, matching_columns, update_columns in jobs]
+        
+        if not songs:
+            logger.warning("No songs found in the database")
+            return
+        
+        logger.info(f"Found {len(songs)} songs in the database")
+        
+        indexes = {}
+        totals = {'updates': 0, 'matches': 0, 'approximate_matches': 0, 'no_matches': 0}
+        with ProcessPoolExecutor(max_workers=args.workers) as executor:
+            futures = [executor.submit(parse_csv_job, job) for job in jobs]
+            # Apply files in the given order, so when several fill the same song
+            # the result does not depend on which worker finished first
+            for job, future in zip(jobs, futures):
+                try:
+                    csv_file_path, rows, error = future.result()
+                    if error is not None:
+                        raise Exception(error)
+                    counts = apply_csv_rows(conn, songs, indexes, rows)
+                except Exception as e:
+                    conn.rollback()
+                    logger.error(f"Error processing CSV file {job[0]}: {e}")
+                    continue
+                log_summary(csv_file_path, counts)
+                for key, value in counts.items():
+                    totals[key] += value
+        
+        logger.warning(f"Batch complete: {len(jobs)} files, {totals['matches']} exact matches, "
+                       f"{totals['approximate_matches']} approximate matches, {totals['no_matches']} not matched, "
+                       f"{totals['updates']} songs updated")
+    
+    except Exception as e:
+        logger.error(f"Error processing CSV batch: {e}")
+    finally:
+        if conn:
+            conn.close()
+
 if __name__ == "__main__":
-    logger.info(f"Processing CSV file: {args.csv_file}")
+    if not args.csv_file and not args.csv_dir:
+        parser.error("one of --csv-file or --csv-dir is required")
     
     # Get database schema
     db_schema = get_database_schema()
     db_columns = list(db_schema.keys())
     
-    # Read CSV header
-    csv_columns = read_csv_header(args.csv_file)
-    
-    if not csv_columns:
-        logger.error("Failed to read CSV header")
-        exit(1)
-    
-    # Default to interactive mode unless explicitly disabled
-    if not args.non_interactive:
-        matching_columns, update_columns = interactive_column_matching(csv_columns, db_columns)
-        
-        # Process the CSV file with the user-defined mappings
-        process_csv_file(args.csv_file, matching_columns, update_columns)
+    if args.csv_file:
+        csv_files = [args.csv_file]
     else:
+        csv_files = sorted(
+            os.path.join(args.csv_dir, name) for name in os.listdir(args.csv_dir)
+            if name.lower().endswith('.csv')
+        )
+        logger.info(f"Found {len(csv_files)} CSV files in {args.csv_dir}")
+    
+    if not args.non_interactive and not args.csv_dir:
+        logger.info("Running in interactive mode for files without a saved profile")
+    elif args.non_interactive:
         logger.warning("Running in non-interactive mode (not recommended)")
-        
-        # Try to automatically match columns
-        matching_columns = {}
-        update_columns = {}
-        
-        # Find title and artist columns for matching
-        for col in csv_columns:
-            col_lower = col.lower()
-            if 'title' in col_lower or 'song' in col_lower or 'track' in col_lower or 'name' in col_lower:
-                matching_columns[col] = 'title'
-            elif 'artist' in col_lower or 'performer' in col_lower or 'singer' in col_lower or 'band' in col_lower:
-                matching_columns[col] = 'artist'
-        
-        # Find other columns for updating
-        for col in csv_columns:
-            if col not in matching_columns:
-                col_lower = col.lower()
-                if 'album' in col_lower or 'record' in col_lower:
-                    update_columns[col] = 'album'
-                elif 'year' in col_lower or 'release' in col_lower or 'date' in col_lower:
-                    update_columns[col] = 'release_year'
-                elif 'genre' in col_lower or 'style' in col_lower or 'category' in col_lower:
-                    update_columns[col] = 'genres'
-        
-        # Process the CSV file with the automatically determined mappings
-        process_csv_file(args.csv_file, matching_columns, update_columns)
     
-    logger.info("CSV processing completed") 
\ No newline at end of file
+    # Resolve every mapping up front so batch mode never stops for input mid-run
+    jobs = []
+    for csv_file in csv_files:
+        logger.info(f"Processing CSV file: {csv_file}")
+        
+        # Read CSV header
+        csv_columns = read_csv_header(csv_file)
+        
+        if not csv_columns:
+            logger.error(f"Failed to read CSV header of {csv_file}")
+            if args.csv_file:
+                exit(1)
+            continue
+        
+        matching_columns, update_columns = resolve_column_mapping(csv_file, csv_columns, db_columns)
+        jobs.append((csv_file, matching_columns, update_columns))
+    
+    if args.csv_file:
+        process_csv_file(*jobs[0])
+    elif jobs:
+        process_csv_batch(jobs)
+    
+    logger.info("CSV processing completed")
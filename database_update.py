@@ -3,12 +3,11 @@ import csv
 import os
 import re
 from datetime import datetime
-from dotenv import load_dotenv
 import requests
-import base64
 import logging
 import argparse
 from logger_config import get_script_logger
+from spotify_client import SpotifyClient
 
 # Parse command line arguments
 parser = argparse.ArgumentParser(description='Update database with weather and music data')
@@ -70,7 +69,7 @@ def CreateChartsTable():
 			rank INTEGER NOT NULL,
 			PRIMARY KEY (city, date, rank))
 		""")
-    logger.info("Charts table created or already exists")
+	logger.info("Charts table created or already exists")
 
 
 
@@ -93,7 +92,7 @@ def CreateWeatherTable():
 			UNIQUE(city,date)
 			)
 		""")
-    logger.info("Weather table created or already exists")
+	logger.info("Weather table created or already exists")
 
 
 def CreateTables():
@@ -103,42 +102,31 @@ def CreateTables():
 	CreateSongTable()
 	CreateChartsTable()
 	CreateWeatherTable()
-    logger.info("All tables created successfully")
+	logger.info("All tables created successfully")
+
+
+spotify_client = None
 
 
 def getTrackID(song_name, artist_name):
     """
     Retrieves the Spotify ID of a song based on the song's name and artist using Spotify's API.
+    The client is created on first use and reused, so the token is fetched once per run
+    and throttled searches are retried instead of dropping the song.
     """
-    # Load environment variables
-    load_dotenv()
-    
-    # Get client_id and client_secret from environment variables
-    client_id = os.getenv("MUSIC_CLIENT_ID")
-    client_secret = os.getenv("MUSIC_CLIENT_SECRET")
-    
-    if not client_id or not client_secret:
-        logger.error("Missing client ID or client secret in .env file")
-        raise Exception("Missing client ID or client secret in .env file")
-    
-    # Obtain access token
-    auth_url = "https://accounts.spotify.com/api/token"
-    auth_headers = {
-        "Authorization": "Basic " + base64.b64encode(f"{client_id}:{client_secret}".encode()).decode(),
-    }
-    auth_data = {"grant_type": "client_credentials"}
-    auth_response = requests.post(auth_url, headers=auth_headers, data=auth_data)
-    access_token = auth_response.json().get("access_token")
-    
-    if not access_token:
-        logger.error("Failed to obtain access token")
-        raise Exception("Failed to obtain access token")
+    global spotify_client
+    if spotify_client is None:
+        spotify_client = SpotifyClient(logger=logger)
     
     # Search for track
     query = f"track:{song_name} artist:{artist_name}"
     search_url = f"https://api.spotify.com/v1/search?q={requests.utils.quote(query)}&type=track&limit=1"
-    search_headers = {"Authorization": f"Bearer {access_token}"}
-    search_response = requests.get(search_url, headers=search_headers)
+    search_response = spotify_client.get(search_url)
+    
+    if search_response.status_code != 200:
+        logger.error(f"Spotify search failed for '{song_name}' by '{artist_name}': {search_response.text}")
+        return None
+    
     data = search_response.json()
     
     results = data.get("tracks", {}).get("items", [])
@@ -382,7 +370,7 @@ def PopulateData():
     """
 	PopulateWeather()
 	PopulateCharts()
-    logger.info("Data population completed")
+	logger.info("Data population completed")
 
 
 if __name__ == "__main__":
@@ -390,4 +378,4 @@ if __name__ == "__main__":
 	PopulateData()
 	con.commit()
 	con.close()
-    logger.info("Database update completed successfully")
\ No newline at end of file
+	logger.info("Database update completed successfully")
\ No newline at end of file
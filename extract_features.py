@@ -1,72 +1,293 @@
+import argparse
+import csv
 import json
 import os
-import pandas as pd
-from pathlib import Path
+import re
+import numpy as np
+from concurrent.futures import ProcessPoolExecutor
 
-def extract_features(json_file):
+try:
+    import orjson
+except ImportError:  # orjson is optional, the standard json module works too
+    orjson = None
+
+# Output column -> dotted path inside the Essentia analysis document.
+# Add a line here to extract a new feature.
+FEATURE_PATHS = {
+    # Rhythm features
+    'tempo': 'rhythm.bpm',
+    # Energy and dynamics
+    'energy': 'lowlevel.average_loudness',
+    'brightness': 'lowlevel.spectral_centroid.mean',
+    # Musical properties
+    'key': 'tonal.key_edma.key',
+    'scale': 'tonal.key_edma.scale',
+    'key_strength': 'tonal.key_edma.strength',
+    # Mood/texture indicators
+    'dissonance': 'lowlevel.dissonance.mean',
+    'entropy': 'lowlevel.spectral_entropy.mean',
+    # Additional features
+    'danceability': 'rhythm.danceability',
+    'chord_strength': 'tonal.chords_strength.mean',
+}
+
+# Key and scale are stored as small integer codes in the feature store,
+# -1 meaning missing. Essentia names keys with these spellings.
+KEY_NAMES = ('C', 'C#', 'D', 'Eb', 'E', 'F', 'F#', 'G', 'Ab', 'A', 'Bb', 'B')
+SCALE_NAMES = ('minor', 'major')
+CODED_COLUMNS = {'key': KEY_NAMES, 'scale': SCALE_NAMES}
+
+def compile_feature_paths(feature_paths):
+    """
+    Compile dotted paths into a prefix tree so each section of the document
+    is visited once no matter how many features read from it.
+    Leaves hold the list of output columns for that path.
+    """
+    tree = {}
+    for column, path in feature_paths.items():
+        node = tree
+        parts = path.split('.')
+        for part in parts[:-1]:
+            node = node.setdefault(part, {})
+            if isinstance(node, list):
+                raise ValueError(f"Path '{path}' for '{column}' goes through a leaf")
+        node.setdefault(parts[-1], []).append(column)
+    return tree
+
+COMPILED_PATHS = compile_feature_paths(FEATURE_PATHS)
+
+# Below this many changed files a process pool costs more than it saves
+PARALLEL_THRESHOLD = 32
+
+def load_analysis(json_file):
+    """Load an Essentia analysis document, using orjson when it is installed"""
+    if orjson is not None:
+        with open(json_file, 'rb') as f:
+            return orjson.loads(f.read())
     with open(json_file, 'r', encoding='utf-8') as f:
-        data = json.load(f)
-    
+        return json.load(f)
+
+def _walk(data, tree, values):
+    """Copy every leaf of the compiled path tree from data into values"""
+    for key, node in tree.items():
+        value = data.get(key) if isinstance(data, dict) else None
+        if isinstance(node, list):
+            for column in node:
+                values[column] = value
+        else:
+            _walk(value, node, values)
+
+def extract_features(json_file, feature_paths=FEATURE_PATHS):
+    data = load_analysis(json_file)
+
     # Extract basic information
     filename = os.path.basename(json_file).replace('_analysis.json', '')
-    
-    # Extract rhythm features
-    tempo = data.get('rhythm', {}).get('bpm', None)
-    
-    # Extract energy and dynamics
-    energy = data.get('lowlevel', {}).get('average_loudness', None)
-    brightness = data.get('lowlevel', {}).get('spectral_centroid', {}).get('mean', None)
-    
-    # Extract musical properties
-    key = data.get('tonal', {}).get('key_edma', None)
-    scale = data.get('tonal', {}).get('scale', None)
-    
-    # Extract mood/texture indicators
-    dissonance = data.get('lowlevel', {}).get('dissonance', {}).get('mean', None)
-    entropy = data.get('lowlevel', {}).get('spectral_entropy', {}).get('mean', None)
-    
-    # Extract additional features
-    danceability = data.get('rhythm', {}).get('danceability', None)
-    chord_strength = data.get('tonal', {}).get('chords_strength', {}).get('mean', None)
-    bpm = data.get('rhythm', {}).get('bpm', None)
-    
-    return {
-        'filename': filename,
-        'tempo': tempo,
-        'energy': energy,
-        'brightness': brightness,
-        'key': key,
-        'scale': scale,
-        'dissonance': dissonance,
-        'entropy': entropy,
-        'danceability': danceability,
-        'chord_strength': chord_strength,
-        'bpm': bpm
-    }
+
+    if feature_paths is FEATURE_PATHS:
+        tree = COMPILED_PATHS
+    else:
+        tree = compile_feature_paths(feature_paths)
+
+    values = {}
+    _walk(data, tree, values)
+
+    features = {'filename': filename}
+    for column in feature_paths:
+        features[column] = values[column]
+    return features
+
+def load_cache(cache_file):
+    """
+    Load the per-file feature cache.
+    The cache is discarded if it was built with a different FEATURE_PATHS.
+    """
+    if not os.path.exists(cache_file):
+        return {}
+    try:
+        with open(cache_file, 'r', encoding='utf-8') as f:
+            cache = json.load(f)
+    except (OSError, ValueError):
+        return {}
+    if cache.get('feature_paths') != FEATURE_PATHS:
+        return {}
+    return cache.get('files', {})
+
+def save_cache(cache_file, entries):
+    """Write the per-file feature cache atomically"""
+    tmp_file = f"{cache_file}.tmp"
+    with open(tmp_file, 'w', encoding='utf-8') as f:
+        json.dump({'feature_paths': FEATURE_PATHS, 'files': entries}, f)
+    os.replace(tmp_file, cache_file)
+
+def scan_analysis_files(analysis_dir):
+    """
+    List the analysis files with their change signature (mtime and size).
+    Returns a dictionary of file name -> (path, signature).
+    """
+    found = {}
+    with os.scandir(analysis_dir) as it:
+        for entry in it:
+            # Skip the combined analysis file
+            if not entry.name.endswith('_analysis.json') or entry.name == 'combined_analysis.json':
+                continue
+            stat = entry.stat()
+            found[entry.name] = (entry.path, [stat.st_mtime_ns, stat.st_size])
+    return found
+
+def _extract_one(json_file):
+    """Worker wrapper that reports errors instead of raising them across processes"""
+    try:
+        return json_file, extract_features(json_file), None
+    except Exception as e:
+        return json_file, None, str(e)
+
+def build_features(analysis_dir, cache_file, workers=None, full=False):
+    """
+    Bring the feature cache up to date with analysis_dir.
+    Only new or changed files are extracted, in parallel when there are enough of them.
+    Returns the list of feature rows sorted by filename.
+    """
+    cached = {} if full else load_cache(cache_file)
+    found = scan_analysis_files(analysis_dir)
+
+    entries = {}
+    to_extract = {}
+    for name, (path, signature) in found.items():
+        entry = cached.get(name)
+        if entry and entry['signature'] == signature:
+            entries[name] = entry
+        else:
+            to_extract[path] = (name, signature)
+
+    removed = len(set(cached) - set(found))
+    print(f"{len(found)} analysis files: {len(entries)} cached, "
+          f"{len(to_extract)} to extract, {removed} removed")
+
+    if to_extract:
+        paths = list(to_extract)
+        if len(paths) < PARALLEL_THRESHOLD or workers == 1:
+            results = [_extract_one(path) for path in paths]
+        else:
+            with ProcessPoolExecutor(max_workers=workers) as executor:
+                results = list(executor.map(_extract_one, paths, chunksize=16))
+
+        for path, features, error in results:
+            if error is not None:
+                print(f"Error processing {path}: {error}")
+                continue
+            name, signature = to_extract[path]
+            entries[name] = {'signature': signature, 'features': features}
+
+    if to_extract or removed or full:
+        save_cache(cache_file, entries)
+
+    return [entries[name]['features'] for name in sorted(entries)]
+
+def write_features_csv(rows, output_file):
+    """Write feature rows to CSV in the declared column order"""
+    fieldnames = ['filename'] + list(FEATURE_PATHS)
+    with open(output_file, 'w', encoding='utf-8', newline='') as f:
+        writer = csv.DictWriter(f, fieldnames=fieldnames)
+        writer.writeheader()
+        writer.writerows(rows)
+
+FEATURE_STORE_DTYPE = np.dtype([
+    (column, 'i1' if column in CODED_COLUMNS else 'f4') for column in FEATURE_PATHS
+])
+
+def store_index_file(store_file):
+    """Path of the sidecar listing the filename of each row of the store"""
+    return os.path.splitext(store_file)[0] + '_index.json'
+
+def write_feature_store(rows, store_file):
+    """
+    Write feature rows as a NumPy structured array (.npy) of int8 codes and float32 features.
+    Key/scale become codes into KEY_NAMES/SCALE_NAMES and missing values become NaN (-1 for codes).
+    Row filenames are written to a JSON sidecar so the array itself stays fixed-width and small.
+    """
+    store = np.empty(len(rows), dtype=FEATURE_STORE_DTYPE)
+    for column in FEATURE_PATHS:
+        values = [row.get(column) for row in rows]
+        if column in CODED_COLUMNS:
+            names = CODED_COLUMNS[column]
+            store[column] = [names.index(v) if v in names else -1 for v in values]
+        else:
+            store[column] = [np.nan if v is None else v for v in values]
+
+    np.save(store_file, store)
+    with open(store_index_file(store_file), 'w', encoding='utf-8') as f:
+        json.dump([row['filename'] for row in rows], f, ensure_ascii=False)
+    return store
+
+def load_feature_store(store_file, mmap_mode='r'):
+    """
+    Memory-map the feature store written by write_feature_store.
+    Returns (filenames, store); use decode_codes to turn key/scale codes back into names.
+    """
+    with open(store_index_file(store_file), 'r', encoding='utf-8') as f:
+        filenames = json.load(f)
+    return filenames, np.load(store_file, mmap_mode=mmap_mode)
+
+def decode_codes(codes, column):
+    """Map key or scale codes back to their names, None for missing"""
+    names = CODED_COLUMNS[column]
+    return [names[code] if code >= 0 else None for code in codes]
+
+def sanitize_filename(filename):
+    """
+    Sanitize the filename by removing invalid characters
+    (same rules as update_song_information_from_deezer)
+    """
+    sanitized = re.sub(r'[<>:"/\\|?*]', '', filename)
+    sanitized = sanitized.replace(' ', '_')
+    return sanitized
+
+def get_filename_index(cursor):
+    """
+    Map preview filenames (without .mp3) to spotify_id.
+    Uses songs.preview_file recorded by the Deezer stage, and falls back to
+    re-deriving '<title>_<artist>' for songs downloaded before it was recorded.
+    """
+    cursor.execute("PRAGMA table_info(songs)")
+    columns = [column[1] for column in cursor.fetchall()]
+
+    index = {}
+    cursor.execute("SELECT spotify_id, title, artist FROM songs")
+    for spotify_id, title, artist in cursor.fetchall():
+        index[f"{sanitize_filename(title)}_{sanitize_filename(artist)}"] = spotify_id
+
+    if "preview_file" in columns:
+        cursor.execute("SELECT spotify_id, preview_file FROM songs WHERE preview_file IS NOT NULL")
+        for spotify_id, preview_file in cursor.fetchall():
+            index[os.path.splitext(preview_file)[0]] = spotify_id
+
+    return index
+
+def parse_args():
+    parser = argparse.ArgumentParser(description='Extract audio features from Essentia analysis files')
+    parser.add_argument('--analysis-dir', default='essentia_output_deezer',
+                        help='Directory containing *_analysis.json files (default: essentia_output_deezer)')
+    parser.add_argument('--output', default='audio_features.csv',
+                        help='Output CSV file (default: audio_features.csv)')
+    parser.add_argument('--store', default='audio_features.npy',
+                        help='Typed feature store written next to the CSV (default: audio_features.npy)')
+    parser.add_argument('--cache-file', default='audio_features_cache.json',
+                        help='Per-file feature cache (default: audio_features_cache.json)')
+    parser.add_argument('--workers', type=int, default=None,
+                        help='Number of worker processes (default: one per CPU)')
+    parser.add_argument('--full', action='store_true',
+                        help='Ignore the cache and re-extract every file')
+    return parser.parse_args()
 
 def main():
-    # Directory containing the analysis files
-    analysis_dir = Path('essentia_output_deezer')
-    
-    # List to store all features
-    all_features = []
-    
-    # Process each JSON file
-    for json_file in analysis_dir.glob('*_analysis.json'):
-        # Skip the combined analysis file
-        if json_file.name == 'combined_analysis.json':
-            continue
-            
-        try:
-            features = extract_features(json_file)
-            all_features.append(features)
-        except Exception as e:
-            print(f"Error processing {json_file}: {e}")
-    
-    # Create DataFrame and save to CSV
-    df = pd.DataFrame(all_features)
-    df.to_csv('audio_features.csv', index=False)
+    args = parse_args()
+
+    all_features = build_features(args.analysis_dir, args.cache_file,
+                                  workers=args.workers, full=args.full)
+
+    write_features_csv(all_features, args.output)
+    write_feature_store(all_features, args.store)
     print(f"Successfully extracted features from {len(all_features)} files")
 
 if __name__ == '__main__':
-    main() 
\ No newline at end of file
+    main()
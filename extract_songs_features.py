@@ -1,13 +1,15 @@
 import os
+import argparse
+import multiprocessing
+import numpy as np
 import pandas as pd
 import sqlite3
+from concurrent.futures import ProcessPoolExecutor
+from song_matching import normalize_title, normalize_artist
 
 # Directory containing CSV files
 data_folder = "songs_features_data/Spotify_songs_dataset"
 
-# List of CSV files in directory
-files = [f for f in os.listdir(data_folder) if f.endswith(".csv")]
-
 # Standard column mapping for `songs_master_table`
 column_mapping = {
     "track_id": ["track_id", "id", "track_uri", "track_href", "instance_id"],
@@ -33,70 +35,371 @@ column_mapping = {
     "playlist_genre": ["playlist_genre", "playlist_name", "playlist_subgenre"]
 }
 
-# Function to standardize column names
-def standardize_columns(df):
-    df.columns = df.columns.str.lower().str.strip()  # Convert to lowercase & remove spaces
-    df = df.loc[:, ~df.columns.duplicated()]  # Remove duplicate columns
-    new_columns = {col: std_col for std_col, possible_names in column_mapping.items() for col in possible_names if col in df.columns}
-    df = df.rename(columns=new_columns)
+# Declared type of every `songs_master_table` column, in table order
+master_columns = {
+    "track_id": "TEXT PRIMARY KEY",
+    "track_name": "TEXT",
+    "artist_name": "TEXT",
+    "album_name": "TEXT",
+    "release_year": "INTEGER",
+    "danceability": "REAL",
+    "energy": "REAL",
+    "valence": "REAL",
+    "tempo": "REAL",
+    "loudness": "REAL",
+    "speechiness": "REAL",
+    "instrumentalness": "REAL",
+    "acousticness": "REAL",
+    "liveness": "REAL",
+    "popularity": "INTEGER",
+    "streams": "INTEGER",
+    "explicit": "BOOLEAN",
+    "mode": "INTEGER",
+    "key": "INTEGER",
+    "spotify_url": "TEXT",
+    "playlist_genre": "TEXT",
+    # Derived while loading: matching keys and where the row came from
+    "track_name_norm": "TEXT",
+    "artist_name_norm": "TEXT",
+    "source_file": "TEXT",
+    "source_row": "INTEGER",
+    "rescaled_columns": "TEXT"
+}
+
+# Features stored on a 0-1 scale; some datasets give them in percent ('danceability_%')
+UNIT_COLUMNS = ("danceability", "energy", "valence", "speechiness",
+                "instrumentalness", "acousticness", "liveness")
+
+# Integer columns some datasets spell out ('C#', 'Major'), mapped to Spotify's codes
+CATEGORY_CODES = {
+    "key": {
+        "c": 0, "c#": 1, "db": 1, "d": 2, "d#": 3, "eb": 3, "e": 4, "f": 5, "f#": 6, "gb": 6,
+        "g": 7, "g#": 8, "ab": 8, "a": 9, "a#": 10, "bb": 10, "b": 11
+    },
+    "mode": {"major": 1, "minor": 0}
+}
+
+# Rows per chunk read from a CSV file
+CHUNK_SIZE = 100_000
+
+# Parsed chunks waiting for the database writer, bounds memory use
+QUEUE_SIZE = 8
+
+# Function to map a file's header to the standard columns
+def map_columns(header):
+    """
+    Find the source column for each standard column in a CSV header.
+    Names are compared lowercased and stripped; the first name of column_mapping
+    present in the header wins. Returns a dictionary of standard column -> source column.
+    """
+    available = {}
+    for col in header:
+        available.setdefault(col.lower().strip(), col)
+    mapping = {}
+    for std_col, possible_names in column_mapping.items():
+        for name in possible_names:
+            if name.lower() in available:
+                mapping[std_col] = available[name.lower()]
+                break
+    return mapping
+
+def source_dtypes(mapping):
+    """
+    Explicit read dtypes for the source columns of a file: numeric columns as float64
+    (integers included, so missing values stay NaN), everything else as strings.
+    """
+    dtypes = {}
+    for std_col, source_col in mapping.items():
+        sql_type = master_columns[std_col]
+        numeric = (sql_type.startswith("REAL") or sql_type.startswith("INTEGER")) and std_col not in CATEGORY_CODES
+        # A source column feeding several standard columns is read as text if any of them is text
+        if numeric and dtypes.get(source_col, "float64") == "float64":
+            dtypes[source_col] = "float64"
+        else:
+            dtypes[source_col] = str
+    return dtypes
+
+def convert_types(df):
+    """Convert a standardized chunk to the declared column types"""
+    for col, codes in CATEGORY_CODES.items():
+        values = df[col].astype("string").str.strip()
+        df[col] = values.str.lower().map(codes).fillna(values)
+    for col, sql_type in master_columns.items():
+        if sql_type.startswith("REAL"):
+            df[col] = pd.to_numeric(df[col], errors="coerce")
+        elif sql_type.startswith("INTEGER"):
+            df[col] = pd.to_numeric(df[col], errors="coerce").round().astype("Int64")
+        elif sql_type.startswith("BOOLEAN"):
+            lowered = df[col].astype("string").str.strip().str.lower()
+            df[col] = lowered.map({"true": True, "1": True, "1.0": True,
+                                   "false": False, "0": False, "0.0": False}).astype("boolean")
+    return df
+
+def clean_track_ids(track_ids):
+    """Reduce 'spotify:track:<id>' URIs and '.../tracks/<id>' URLs to the bare track ID"""
+    track_ids = track_ids.astype("string").str.strip()
+    return track_ids.str.replace(r"^(?:spotify:track:|https?://\S*/tracks?/)", "", regex=True).str.split("?").str[0]
+
+def detect_scale(source_col, values):
+    """
+    Scale of a 0-1 feature in a source file: 'percent' when the source column is named
+    '..._%' or most of its values are above 1, 'unit' otherwise, None while there are no values yet.
+    A few stray values above 1 do not rescale a unit column; normalize_scales nulls them instead.
+    """
+    if source_col.strip().endswith("%"):
+        return "percent"
+    values = values.dropna()
+    if len(values):
+        return "percent" if (values > 1).mean() > 0.5 else "unit"
+    return None
+
+def normalize_scales(df, mapping, scales):
+    """
+    Bring the UNIT_COLUMNS of a chunk to 0-1, a whole column at a time.
+    scales holds the scale detected for each column of the file, so every chunk of
+    a file is treated the same. Values still outside 0-1 are invalid and become null.
+    The rescaled columns are recorded in rescaled_columns.
+    """
+    rescaled = []
+    for col in UNIT_COLUMNS:
+        if col not in mapping:
+            continue
+        if scales.get(col) is None:
+            scales[col] = detect_scale(mapping[col], df[col])
+        if scales[col] == "percent":
+            df[col] = df[col] / 100
+            rescaled.append(col)
+        df[col] = df[col].where(df[col].between(0, 1))
+    df["rescaled_columns"] = ",".join(rescaled) or None
+    return df
+
+def standardize_chunk(chunk, mapping, source_file, scales):
+    """
+    Standard columns of a raw chunk, in table order; columns the file lacks are filled with nulls.
+    0-1 features are normalized (see normalize_scales), and the normalized name/artist keys
+    and the source file and row of each row are filled in.
+    """
+    df = pd.DataFrame({
+        std_col: chunk[mapping[std_col]] if std_col in mapping else pd.Series(pd.NA, index=chunk.index, dtype=object)
+        for std_col in master_columns
+    })
+    df = convert_types(df)
+    df = normalize_scales(df, mapping, scales)
+    df["track_id"] = clean_track_ids(df["track_id"])
+    df["track_name_norm"] = df["track_name"].map(normalize_title, na_action="ignore")
+    df["artist_name_norm"] = df["artist_name"].map(normalize_artist, na_action="ignore")
+    df["source_file"] = source_file
+    # The reader numbers rows continuously across chunks
+    df["source_row"] = pd.Series(chunk.index, index=chunk.index, dtype="Int64")
     return df
 
-# Process CSV files
-merged_data = []
-
-for file in files:
-    file_path = os.path.join(data_folder, file)
-    df = pd.read_csv(file_path, encoding="ISO-8859-1", low_memory=False)
-    
-    df = standardize_columns(df)
-    df = df.loc[:, ~df.columns.duplicated()]  # Remove duplicate columns
-    df = df.reset_index(drop=True)  # Reset index
-    merged_data.append(df)
-
-# Concatenate all DataFrames
-songs_master_df = pd.concat(merged_data, ignore_index=True)
-
-# Drop duplicate column names (in case of conflicts)
-songs_master_df = songs_master_df.loc[:, ~songs_master_df.columns.duplicated()]
-
-# Connect to SQLite database
-conn = sqlite3.connect("songs_master.db")
-cursor = conn.cursor()
-
-# Drop existing table if it exists to avoid conflicts
-cursor.execute("DROP TABLE IF EXISTS songs_master_table")
-
-# Create `songs_master_table`
-cursor.execute("""
-CREATE TABLE songs_master_table (
-    track_id TEXT PRIMARY KEY,
-    track_name TEXT,
-    artist_name TEXT,
-    album_name TEXT,
-    release_year INTEGER,
-    danceability REAL,
-    energy REAL,
-    valence REAL,
-    tempo REAL,
-    loudness REAL,
-    speechiness REAL,
-    instrumentalness REAL,
-    acousticness REAL,
-    liveness REAL,
-    popularity INTEGER,
-    streams INTEGER,
-    explicit BOOLEAN,
-    mode INTEGER,
-    key INTEGER,
-    spotify_url TEXT,
-    playlist_genre TEXT
+def read_file_chunks(file_path, chunksize=CHUNK_SIZE):
+    """
+    Read a CSV file in chunks of standardized, typed rows.
+    Only the mapped columns are read, with explicit dtypes so nothing is guessed.
+    If a numeric column holds text (e.g. a stray header line), the rest of the file
+    is read as strings and converted, non-numbers becoming nulls.
+    """
+    header = pd.read_csv(file_path, encoding="ISO-8859-1", nrows=0).columns
+    mapping = map_columns(header)
+    source_file = os.path.basename(file_path)
+    scales = {}
+    source_columns = sorted(set(mapping.values()))
+
+    done = 0
+    try:
+        for chunk in pd.read_csv(file_path, encoding="ISO-8859-1", usecols=source_columns,
+                                 dtype=source_dtypes(mapping), chunksize=chunksize):
+            yield standardize_chunk(chunk, mapping, source_file, scales)
+            done += len(chunk)
+        return
+    except ValueError as e:
+        print(f"⚠️ {os.path.basename(file_path)}: {e}, reading the rest as text")
+
+    seen = 0
+    for chunk in pd.read_csv(file_path, encoding="ISO-8859-1", usecols=source_columns,
+                             dtype=str, chunksize=chunksize):
+        # Skip the rows already read with numeric dtypes
+        if seen + len(chunk) <= done:
+            seen += len(chunk)
+            continue
+        chunk = chunk.iloc[max(done - seen, 0):]
+        seen = done
+        yield standardize_chunk(chunk, mapping, source_file, scales)
+
+def to_rows(df):
+    """Turn a typed chunk into tuples for executemany, missing values as None"""
+    columns = []
+    for col in df.columns:
+        series = df[col]
+        if series.dtype == "float64":
+            # SQLite stores a bound NaN as NULL
+            columns.append(series.tolist())
+        else:
+            columns.append(series.astype(object).where(series.notna(), None).tolist())
+    return list(zip(*columns))
+
+# Queue the parse workers put chunks on, set by init_worker
+chunk_queue = None
+
+def init_worker(queue):
+    global chunk_queue
+    chunk_queue = queue
+
+def parse_file(file_path, chunksize=CHUNK_SIZE):
+    """
+    Worker: put the rows of each chunk of a file on the queue, then (file_path, None, error).
+    error is None when the whole file was read.
+    """
+    try:
+        for df in read_file_chunks(file_path, chunksize):
+            chunk_queue.put((file_path, to_rows(df), None))
+    except Exception as e:
+        chunk_queue.put((file_path, None, str(e)))
+        return
+    chunk_queue.put((file_path, None, None))
+
+STAGING_TABLE = "songs_master_staging"
+
+def create_master_table(cursor, table="songs_master_table", primary_key=True):
+    """
+    Creates `songs_master_table` (or the unindexed staging table when primary_key is False),
+    dropping any existing one to avoid conflicts.
+    """
+    cursor.execute(f"DROP TABLE IF EXISTS {table}")
+    columns = ",\n    ".join(
+        f"{col} {sql_type if primary_key else sql_type.replace(' PRIMARY KEY', '')}"
+        for col, sql_type in master_columns.items()
+    )
+    cursor.execute(f"""
+CREATE TABLE {table} (
+    {columns}
 );
 """)
 
-# Insert cleaned data into SQLite
-songs_master_df.to_sql("songs_master_table", conn, if_exists="replace", index=False)
+def finish_master_table(conn):
+    """
+    Move the staged rows into `songs_master_table`, one row per track_id, and index it.
+    Precedence for a duplicated track_id: the file that sorts first, then its earliest row.
+    Rows without a track_id are all kept. Rows are written in that same order, so
+    "first row" lookups downstream follow the precedence too.
+    """
+    cursor = conn.cursor()
+    names = ", ".join(master_columns)
+    with conn:
+        create_master_table(cursor)
+        cursor.execute(f"""
+            INSERT INTO songs_master_table ({names})
+            SELECT {names} FROM (
+                SELECT *, ROW_NUMBER() OVER (
+                    PARTITION BY track_id ORDER BY source_file, source_row
+                ) AS precedence
+                FROM {STAGING_TABLE}
+            )
+            WHERE track_id IS NULL OR precedence = 1
+            ORDER BY source_file, source_row
+        """)
+        kept = cursor.rowcount
+        cursor.execute(f"DROP TABLE {STAGING_TABLE}")
+        # track_id is indexed by its primary key
+        cursor.execute("CREATE INDEX idx_songs_master_name_artist ON songs_master_table(track_name_norm, artist_name_norm)")
+        cursor.execute("CREATE INDEX idx_songs_master_artist ON songs_master_table(artist_name_norm)")
+    conn.execute("VACUUM")
+    return kept
+
+def load_master_table(files, db_file, workers=None, chunksize=CHUNK_SIZE):
+    """
+    Load the CSV files into `songs_master_table`.
+    Files are parsed in parallel worker processes; parsed chunks go through a bounded
+    queue to this process, the only database writer, which appends each chunk to an
+    unindexed staging table as it arrives. finish_master_table then dedupes on track_id
+    into the declared table and builds the indexes.
+    Returns (rows read, rows kept).
+    """
+    conn = sqlite3.connect(db_file)
+    cursor = conn.cursor()
+    create_master_table(cursor, STAGING_TABLE, primary_key=False)
+    conn.commit()
+
+    placeholders = ", ".join("?" for _ in master_columns)
+    insert_sql = f"INSERT INTO {STAGING_TABLE} ({', '.join(master_columns)}) VALUES ({placeholders})"
+
+    def insert_rows(rows):
+        # One transaction per chunk
+        with conn:
+            cursor.executemany(insert_sql, rows)
+        return len(rows)
+
+    total_rows = 0
+    workers = min(workers or os.cpu_count() or 1, len(files))
+    if workers <= 1:
+        # A single worker would only add pickling overhead, read in this process
+        for file_path in files:
+            try:
+                for df in read_file_chunks(file_path, chunksize):
+                    total_rows += insert_rows(to_rows(df))
+            except Exception as e:
+                print(f"❌ Error reading {file_path}: {e}")
+                continue
+            print(f"Loaded {os.path.basename(file_path)}")
+    else:
+        queue = multiprocessing.Queue(maxsize=QUEUE_SIZE)
+        with ProcessPoolExecutor(max_workers=workers, initializer=init_worker, initargs=(queue,)) as executor:
+            futures = [executor.submit(parse_file, file_path, chunksize) for file_path in files]
+            remaining = len(files)
+            while remaining:
+                file_path, rows, error = queue.get()
+                if rows is not None:
+                    total_rows += insert_rows(rows)
+                    continue
+                remaining -= 1
+                if error is not None:
+                    print(f"❌ Error reading {file_path}: {error}")
+                else:
+                    print(f"Loaded {os.path.basename(file_path)}")
+            for future in futures:
+                future.result()
+
+    kept_rows = finish_master_table(conn)
+    conn.close()
+    return total_rows, kept_rows
+
+def load_master_features(db_file="songs_master.db", columns=UNIT_COLUMNS + ("tempo", "loudness")):
+    """
+    Read numeric features of `songs_master_table` for analysis, indexed by track_id.
+    Feature columns come back as float32, missing values as NaN.
+    """
+    conn = sqlite3.connect(db_file)
+    try:
+        return pd.read_sql_query(
+            f"SELECT track_id, {', '.join(columns)} FROM songs_master_table",
+            conn, index_col="track_id", dtype={col: np.float32 for col in columns}
+        )
+    finally:
+        conn.close()
+
+def parse_args():
+    parser = argparse.ArgumentParser(description='Build songs_master_table from the Kaggle Spotify datasets')
+    parser.add_argument('--data-folder', default=data_folder,
+                        help=f'Directory containing the dataset CSV files (default: {data_folder})')
+    parser.add_argument('--db', default='songs_master.db',
+                        help='Output database (default: songs_master.db)')
+    parser.add_argument('--workers', type=int, default=None,
+                        help='Number of files parsed in parallel (default: one per CPU)')
+    parser.add_argument('--chunk-size', type=int, default=CHUNK_SIZE,
+                        help=f'Rows read per chunk (default: {CHUNK_SIZE})')
+    return parser.parse_args()
+
+def main():
+    args = parse_args()
+
+    # List of CSV files in directory
+    files = sorted(os.path.join(args.data_folder, f) for f in os.listdir(args.data_folder) if f.endswith(".csv"))
+
+    total_rows, kept_rows = load_master_table(files, args.db, workers=args.workers, chunksize=args.chunk_size)
 
-# Close connection
-conn.close()
+    print(f"✅ Songs master table created successfully in SQLite! "
+          f"({total_rows} rows read from {len(files)} files, {kept_rows} kept after removing duplicate track_ids)")
 
-print("✅ Songs master table created successfully in SQLite!")
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,258 @@
+import argparse
+import csv
+import hashlib
+import math
+import os
+from datetime import date, datetime, timedelta
+import numpy as np
+import requests
+
+SONGS_PER_CHART = 25
+
+# Columns written by web_crawler_api
+CHART_COLUMNS = ["Date", "Song Title", "Artist", "Album", "Duration"]
+WEATHER_COLUMNS = ["City", "Temperature (°C)", "Feels Like (°C)", "Weather", "Description",
+                   "Humidity (%)", "Pressure (hPa)", "Wind Speed (m/s)"]
+METADATA_COLUMNS = ["Track Title", "Artist", "Album"]
+
+# OpenWeather main conditions and some of their descriptions
+WEATHER_CONDITIONS = {
+    "Clear": ["clear sky"],
+    "Clouds": ["few clouds", "scattered clouds", "broken clouds", "overcast clouds"],
+    "Rain": ["light rain", "moderate rain", "heavy intensity rain"],
+    "Drizzle": ["light intensity drizzle", "drizzle"],
+    "Thunderstorm": ["thunderstorm", "thunderstorm with light rain"],
+    "Snow": ["light snow", "snow"],
+    "Mist": ["mist"],
+}
+
+WORDS = ["love", "night", "fire", "dream", "heart", "city", "rain", "summer", "gold", "wild",
+         "blue", "dance", "light", "home", "river", "ghost", "sugar", "stars", "money", "paradise",
+         "midnight", "electric", "sweet", "broken", "forever", "young", "lonely", "neon", "ocean", "shadow"]
+FIRST_NAMES = ["Nova", "Kai", "Luna", "Milo", "Zara", "Leo", "Ivy", "Omar", "Aya", "Rico",
+               "Maya", "Jules", "Sol", "Nia", "Theo", "Lila", "Ezra", "Mina", "Felix", "Rae"]
+LAST_NAMES = ["Rivers", "Stone", "Vega", "Knight", "Moreau", "Okafor", "Tanaka", "Silva",
+              "Novak", "Reyes", "Kim", "Haddad", "Larsen", "Costa", "Baker", "Quinn"]
+
+BASE62 = "0123456789ABCDEFGHIJKLMNOPQRSTUVWXYZabcdefghijklmnopqrstuvwxyz"
+
+def spotify_id(index):
+    """Deterministic 22-character Spotify-like ID of a catalog song"""
+    value = int.from_bytes(hashlib.sha1(str(index).encode()).digest(), "big")
+    digits = []
+    for _ in range(22):
+        value, digit = divmod(value, 62)
+        digits.append(BASE62[digit])
+    return "".join(digits)
+
+def city_name(index):
+    """
+    Letters-only city name, as the crawler derives file names from its URLs
+    (database_update rejects digits in chart file names)
+    """
+    letters = ""
+    index += 26 * 26
+    while index:
+        index, letter = divmod(index, 26)
+        letters = chr(ord('a') + letter) + letters
+    return f"city_{letters}"
+
+def make_catalog(rng, num_songs, missing_album_rate=0.3):
+    """Catalog songs as dictionaries with spotify_id, title, artist, album, chart_album and duration"""
+    num_artists = max(1, num_songs // 4)
+    artists = [f"{FIRST_NAMES[i % len(FIRST_NAMES)]} {LAST_NAMES[(i // len(FIRST_NAMES)) % len(LAST_NAMES)]}"
+               + (f" {i // (len(FIRST_NAMES) * len(LAST_NAMES)) + 1}" if i >= len(FIRST_NAMES) * len(LAST_NAMES) else "")
+               for i in range(num_artists)]
+    catalog = []
+    seen = set()
+    for i in range(num_songs):
+        words = rng.choice(WORDS, size=rng.integers(1, 4), replace=False)
+        title = " ".join(word.title() for word in words)
+        artist = artists[int(rng.integers(num_artists))]
+        # Keep titles unique per artist, as songs are looked up by title and artist
+        if (title, artist) in seen:
+            title = f"{title} (Part {i})"
+        seen.add((title, artist))
+        duration = int(rng.integers(120, 300))
+        catalog.append({
+            "spotify_id": spotify_id(i),
+            "title": title,
+            "artist": artist,
+            "album": artist if rng.random() < 0.4 else " ".join(w.title() for w in rng.choice(WORDS, size=2, replace=False)),
+            "duration": f"{duration // 60}:{duration % 60:02d}",
+        })
+        # Some chart rows lack the album, which csv_parsing_songs_update then fills from the metadata
+        catalog[-1]["chart_album"] = "" if rng.random() < missing_album_rate else catalog[-1]["album"]
+    return catalog
+
+def popularity_weights(num_songs, distribution, exponent):
+    """Chart probability of each catalog song, the first songs being the most popular"""
+    if distribution == "uniform":
+        weights = np.ones(num_songs)
+    else:
+        weights = 1.0 / np.arange(1, num_songs + 1) ** exponent
+    return weights / weights.sum()
+
+def draw_charts(rng, cdf, num_charts):
+    """
+    Indexes of SONGS_PER_CHART distinct songs for each of num_charts charts, in draw order.
+    Songs are drawn one after another from the cumulative popularity `cdf`, skipping
+    repeats, which samples without replacement in proportion to popularity.
+    """
+    charts = []
+    last = len(cdf) - 1
+    for _ in range(num_charts):
+        chart = []
+        seen = set()
+        while len(chart) < SONGS_PER_CHART:
+            for i in np.searchsorted(cdf, rng.random(2 * SONGS_PER_CHART), side="right"):
+                i = min(int(i), last)
+                if i not in seen:
+                    seen.add(i)
+                    chart.append(i)
+                    if len(chart) == SONGS_PER_CHART:
+                        break
+        charts.append(chart)
+    return charts
+
+def make_cities(rng, num_cities):
+    """Cities with a latitude, which drives their weather"""
+    return [{"name": city_name(i), "lat": float(rng.uniform(-60, 65))} for i in range(num_cities)]
+
+def weather_row(rng, city, day):
+    """One city's weather on a day: seasonal temperature by latitude plus noise"""
+    season = math.cos(2 * math.pi * (day.timetuple().tm_yday - 15) / 365.25)
+    if city["lat"] < 0:
+        season = -season
+    temperature = 27 - 0.4 * abs(city["lat"]) + 0.15 * abs(city["lat"]) * season + rng.normal(0, 3)
+    wind_speed = abs(rng.normal(3.5, 2))
+    condition = rng.choice(list(WEATHER_CONDITIONS))
+    if condition == "Snow" and temperature > 2:
+        condition = "Rain"
+    return [
+        city["name"],
+        round(temperature, 2),
+        round(temperature - wind_speed * 0.7, 2),
+        condition,
+        rng.choice(WEATHER_CONDITIONS[condition]),
+        int(rng.integers(20, 100)),
+        int(rng.normal(1013, 8)),
+        round(wind_speed, 2),
+    ]
+
+def write_csv(path, columns, rows):
+    with open(path, 'w', newline='', encoding='utf-8') as f:
+        writer = csv.writer(f)
+        writer.writerow(columns)
+        writer.writerows(rows)
+
+def write_spotify_fixtures(fixtures_file, catalog):
+    """
+    Record Spotify token and search answers for the catalog in an api_replay fixture file,
+    so database_update can run with HTTP_MODE=replay and no credentials or network
+    """
+    import api_replay
+    from http_client import HttpClient, build_response
+
+    store = api_replay.FixtureStore(fixtures_file)
+    token_url = "https://accounts.spotify.com/api/token"
+    store.put("POST", token_url, build_response(
+        token_url, 200, "Content-Type: application/json",
+        b'{"access_token": "synthetic", "token_type": "Bearer", "expires_in": 3600}'))
+    for song in catalog:
+        # Same URL as database_update.getTrackID
+        query = f"track:{song['title']} artist:{song['artist']}"
+        url = HttpClient.full_url("GET", f"https://api.spotify.com/v1/search?q={requests.utils.quote(query)}&type=track&limit=1")
+        body = ('{"tracks": {"items": [{"id": "%s"}]}}' % song["spotify_id"]).encode()
+        store.put("GET", url, build_response(url, 200, "Content-Type: application/json", body), commit=False)
+    store.conn.commit()
+
+def generate_data(output_dir, num_cities=100, num_days=50, num_songs=2000, distribution="zipf",
+                  exponent=1.1, start_date=None, metadata_files=4, fixtures_file=None, seed=0):
+    """
+    Write a synthetic data tree under output_dir:
+      Data/data_MM_DD/<city>_MM_DD.csv       top 25 songs of each city, as web_crawler_api writes them
+      Data/data_MM_DD/weather_YYYY_MM_DD.csv the day's weather of every city
+      song_metadata/songs_metadata_N.csv     catalog metadata for csv_parsing_songs_update --csv-dir
+    Chart songs are drawn from a num_songs catalog with `distribution` popularity
+    ("zipf" with the given exponent, or "uniform"). Returns a dictionary of counts.
+    """
+    rng = np.random.default_rng(seed)
+    # Folder names carry no year, so one tree spans at most a year
+    if num_days > 366:
+        raise ValueError("A Data/ tree holds at most 366 days (folders are named data_MM_DD)")
+    if num_songs < SONGS_PER_CHART:
+        raise ValueError(f"The catalog needs at least {SONGS_PER_CHART} songs")
+    # database_update dates weather files with the current year
+    start_date = start_date or date(datetime.now().year, 1, 1)
+
+    catalog = make_catalog(rng, num_songs)
+    cdf = np.cumsum(popularity_weights(num_songs, distribution, exponent))
+    cities = make_cities(rng, num_cities)
+    data_dir = os.path.join(output_dir, "Data")
+
+    counts = {"days": num_days, "cities": num_cities, "songs": num_songs, "chart_files": 0, "chart_rows": 0}
+    for day_index in range(num_days):
+        day = start_date + timedelta(days=day_index)
+        month_day = day.strftime("%m_%d")
+        folder = os.path.join(data_dir, f"data_{month_day}")
+        os.makedirs(folder, exist_ok=True)
+
+        day_string = day.isoformat()
+        for city, chart in zip(cities, draw_charts(rng, cdf, num_cities)):
+            rows = [[day_string, catalog[i]["title"], catalog[i]["artist"], catalog[i]["chart_album"], catalog[i]["duration"]]
+                    for i in chart]
+            write_csv(os.path.join(folder, f"{city['name']}_{month_day}.csv"), CHART_COLUMNS, rows)
+        counts["chart_files"] += num_cities
+        counts["chart_rows"] += num_cities * SONGS_PER_CHART
+
+        write_csv(os.path.join(folder, f"weather_{day.year}_{month_day}.csv"), WEATHER_COLUMNS,
+                  [weather_row(rng, city, day) for city in cities])
+
+    metadata_dir = os.path.join(output_dir, "song_metadata")
+    os.makedirs(metadata_dir, exist_ok=True)
+    per_file = math.ceil(num_songs / metadata_files)
+    for n in range(metadata_files):
+        songs = catalog[n * per_file:(n + 1) * per_file]
+        write_csv(os.path.join(metadata_dir, f"songs_metadata_{n + 1}.csv"), METADATA_COLUMNS,
+                  [[song["title"], song["artist"], song["album"]] for song in songs])
+
+    if fixtures_file:
+        write_spotify_fixtures(fixtures_file, catalog)
+    return counts
+
+def parse_args():
+    parser = argparse.ArgumentParser(description='Generate a synthetic Data/ tree of city charts and weather')
+    parser.add_argument('--output-dir', default='synthetic',
+                        help='Directory to write Data/ and song_metadata/ into (default: synthetic)')
+    parser.add_argument('--cities', type=int, default=100,
+                        help='Number of cities (default: 100)')
+    parser.add_argument('--days', type=int, default=50,
+                        help='Number of days, at most 366 (default: 50)')
+    parser.add_argument('--songs', type=int, default=2000,
+                        help='Size of the song catalog charts are drawn from (default: 2000)')
+    parser.add_argument('--distribution', choices=['zipf', 'uniform'], default='zipf',
+                        help='Song popularity distribution (default: zipf)')
+    parser.add_argument('--zipf-exponent', type=float, default=1.1,
+                        help='Exponent of the zipf popularity distribution (default: 1.1)')
+    parser.add_argument('--start-date', type=date.fromisoformat, default=None,
+                        help='First day, YYYY-MM-DD (default: January 1st of the current year)')
+    parser.add_argument('--metadata-files', type=int, default=4,
+                        help='Number of song metadata CSV files (default: 4)')
+    parser.add_argument('--fixtures-file', default=None,
+                        help='Also write Spotify replay fixtures for the catalog to this file')
+    parser.add_argument('--seed', type=int, default=0,
+                        help='Random seed (default: 0)')
+    return parser.parse_args()
+
+def main():
+    args = parse_args()
+    counts = generate_data(args.output_dir, num_cities=args.cities, num_days=args.days, num_songs=args.songs,
+                           distribution=args.distribution, exponent=args.zipf_exponent,
+                           start_date=args.start_date, metadata_files=args.metadata_files,
+                           fixtures_file=args.fixtures_file, seed=args.seed)
+    print(f"Wrote {counts['chart_files']} chart files ({counts['chart_rows']} rows) for "
+          f"{counts['cities']} cities over {counts['days']} days to {args.output_dir}")
+
+if __name__ == "__main__":
+    main()
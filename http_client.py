@@ -0,0 +1,297 @@
+import logging
+import os
+import sqlite3
+import threading
+import time
+from urllib.parse import parse_qsl, urlencode, urlsplit, urlunsplit
+import requests
+from requests.adapters import HTTPAdapter
+from requests.structures import CaseInsensitiveDict
+from requests.utils import get_encoding_from_headers
+
+# (connect, read) timeout applied when a call does not give one
+DEFAULT_TIMEOUT = (10, 30)
+
+CACHE_FILE = "http_cache.db"
+CACHE_MAX_BYTES = 500 * 1024 * 1024
+
+# Seconds a cached response stays valid, by URL prefix (the longest matching prefix wins).
+# 0 or a missing prefix means responses are never cached.
+DEFAULT_TTLS = {
+    "https://api.spotify.com/": 7 * 24 * 3600,
+    "https://api.deezer.com/": 7 * 24 * 3600,
+    "https://musicbrainz.org/": 30 * 24 * 3600,
+    "https://acousticbrainz.org/": 30 * 24 * 3600,
+    "https://api.getsong.co/": 30 * 24 * 3600,
+    # Current weather and tokens must always be fresh
+    "https://api.openweathermap.org/": 0,
+    "https://accounts.spotify.com/": 0,
+}
+
+# Query parameters holding credentials, redacted from cache keys and recorded fixtures
+SECRET_PARAMS = {"api_key", "apikey", "appid", "token", "access_token"}
+
+logger = logging.getLogger(__name__)
+
+def redact_url(url):
+    """URL with credential parameters replaced, so it can be stored and matches whatever key is configured"""
+    parts = urlsplit(url)
+    query = [(name, "REDACTED" if name.lower() in SECRET_PARAMS else value)
+             for name, value in parse_qsl(parts.query, keep_blank_values=True)]
+    return urlunsplit(parts._replace(query=urlencode(query)))
+
+class ResponseCache:
+    """
+    On-disk cache of successful GET responses in a SQLite file, keyed by method
+    and full URL (query parameters included, credentials redacted). Entries expire after the TTL of
+    their URL prefix; once the file holds more than max_bytes of bodies, the
+    least recently used entries are evicted. Safe to use from several threads.
+    """
+
+    def __init__(self, cache_file=CACHE_FILE, ttls=None, max_bytes=CACHE_MAX_BYTES):
+        self.ttls = dict(DEFAULT_TTLS if ttls is None else ttls)
+        self.max_bytes = max_bytes
+        self.lock = threading.Lock()
+        self.conn = sqlite3.connect(cache_file, check_same_thread=False)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute("""
+            CREATE TABLE IF NOT EXISTS responses (
+                key TEXT PRIMARY KEY,
+                status INTEGER NOT NULL,
+                headers TEXT NOT NULL,
+                body BLOB NOT NULL,
+                size INTEGER NOT NULL,
+                fetched_at REAL NOT NULL,
+                last_used REAL NOT NULL
+            )
+        """)
+        self.conn.execute("CREATE INDEX IF NOT EXISTS idx_responses_last_used ON responses(last_used)")
+        self.purge_secret_keys()
+        self.conn.commit()
+        self.total_bytes = self.conn.execute("SELECT COALESCE(SUM(size), 0) FROM responses").fetchone()[0]
+
+    def purge_secret_keys(self):
+        """Delete entries cached before keys were redacted, their key holds a credential"""
+        pattern = " OR ".join("key LIKE ?" for _ in SECRET_PARAMS)
+        rows = self.conn.execute(f"SELECT key FROM responses WHERE {pattern}",
+                                 [f"%{name}=%" for name in SECRET_PARAMS]).fetchall()
+        stale = [(key,) for key, in rows if key != f"GET {redact_url(key[4:])}"]
+        if stale:
+            self.conn.executemany("DELETE FROM responses WHERE key = ?", stale)
+            logger.info(f"Deleted {len(stale)} cached responses keyed with credentials")
+
+    def ttl_for(self, url):
+        """TTL in seconds of a URL, 0 if it is not cached"""
+        prefixes = [prefix for prefix in self.ttls if url.startswith(prefix)]
+        return self.ttls[max(prefixes, key=len)] if prefixes else 0
+
+    def get(self, key, url):
+        """Cached response of a key, None if missing or expired"""
+        ttl = self.ttl_for(url)
+        if not ttl:
+            return None
+        now = time.time()
+        with self.lock:
+            row = self.conn.execute(
+                "SELECT status, headers, body FROM responses WHERE key = ? AND fetched_at > ?",
+                (key, now - ttl)).fetchone()
+            if row is None:
+                return None
+            self.conn.execute("UPDATE responses SET last_used = ? WHERE key = ?", (now, key))
+            self.conn.commit()
+        status, headers, body = row
+        return build_response(url, status, headers, body)
+
+    def put(self, key, url, response):
+        """Store a response if its URL is cacheable"""
+        if not self.ttl_for(url):
+            return
+        body = response.content
+        headers = "\n".join(f"{name}: {value}" for name, value in response.headers.items()
+                            if name.lower() not in ("content-encoding", "transfer-encoding", "content-length"))
+        now = time.time()
+        with self.lock:
+            old = self.conn.execute("SELECT size FROM responses WHERE key = ?", (key,)).fetchone()
+            self.conn.execute("""
+                INSERT OR REPLACE INTO responses (key, status, headers, body, size, fetched_at, last_used)
+                VALUES (?, ?, ?, ?, ?, ?, ?)
+            """, (key, response.status_code, headers, body, len(body), now, now))
+            self.total_bytes += len(body) - (old[0] if old else 0)
+            if self.total_bytes > self.max_bytes:
+                self.evict()
+            self.conn.commit()
+
+    def evict(self):
+        """Drop least recently used entries until the cache is under 90% of max_bytes"""
+        target = self.max_bytes * 0.9
+        removed = []
+        for key, size in self.conn.execute("SELECT key, size FROM responses ORDER BY last_used"):
+            if self.total_bytes <= target:
+                break
+            removed.append((key,))
+            self.total_bytes -= size
+        self.conn.executemany("DELETE FROM responses WHERE key = ?", removed)
+        logger.info(f"Evicted {len(removed)} cached responses")
+
+    def clear(self):
+        with self.lock:
+            self.conn.execute("DELETE FROM responses")
+            self.conn.commit()
+            self.total_bytes = 0
+
+def build_response(url, status, headers, body):
+    """requests.Response rebuilt from stored parts"""
+    response = requests.Response()
+    response.status_code = status
+    response.url = url
+    response.headers = CaseInsensitiveDict(
+        line.split(": ", 1) for line in headers.split("\n") if ": " in line)
+    response.encoding = get_encoding_from_headers(response.headers)
+    response._content = bytes(body)
+    response._content_consumed = True
+    return response
+
+class HttpClient:
+    """
+    HTTP layer shared by the API modules: one pooled session per host,
+    a default timeout on every call and an optional response cache
+    (GET requests answered 200 only). `stats` counts cache hits and network calls.
+    """
+
+    def __init__(self, cache=None, timeout=DEFAULT_TIMEOUT, pool_size=16):
+        self.cache = cache
+        self.timeout = timeout
+        self.pool_size = pool_size
+        self.sessions = {}
+        self.sessions_lock = threading.Lock()
+        self.stats_lock = threading.Lock()
+        self.stats = {'network': 0, 'cache_hits': 0}
+
+    def session(self, url):
+        """Pooled session of the URL's host"""
+        host = urlsplit(url).netloc
+        with self.sessions_lock:
+            session = self.sessions.get(host)
+            if session is None:
+                session = requests.Session()
+                adapter = HTTPAdapter(pool_connections=1, pool_maxsize=self.pool_size)
+                session.mount("https://", adapter)
+                session.mount("http://", adapter)
+                self.sessions[host] = session
+            return session
+
+    def count(self, name):
+        with self.stats_lock:
+            self.stats[name] += 1
+
+    @staticmethod
+    def full_url(method, url, params=None):
+        """URL with its query parameters encoded, as sent and as cached"""
+        return requests.Request(method, url, params=params).prepare().url
+
+    @staticmethod
+    def cache_key(full_url):
+        """Cache key of a GET, without the credentials in its query string"""
+        return f"GET {redact_url(full_url)}"
+
+    def cached(self, method, url, params=None):
+        """Cached response of a call, None if it would go to the network"""
+        if self.cache is None or method.upper() != "GET":
+            return None
+        full_url = self.full_url(method, url, params)
+        response = self.cache.get(self.cache_key(full_url), full_url)
+        if response is not None:
+            self.count('cache_hits')
+        return response
+
+    def send(self, method, url, **kwargs):
+        """Send a request over the host's pooled session"""
+        kwargs.setdefault("timeout", self.timeout)
+        self.count('network')
+        return self.session(url).request(method, url, **kwargs)
+
+    def request(self, method, url, params=None, cache=True, **kwargs):
+        """
+        Send a request, answering cacheable GETs from the cache when possible.
+        cache=False bypasses the cache for this call (streamed downloads, for example).
+        """
+        use_cache = cache and self.cache is not None and method.upper() == "GET" and not kwargs.get("stream")
+        if use_cache:
+            response = self.cached(method, url, params)
+            if response is not None:
+                return response
+        response = self.send(method, url, params=params, **kwargs)
+        if use_cache:
+            self.store(method, url, params, response)
+        return response
+
+    def store(self, method, url, params, response):
+        """Cache a response fetched outside request(), if it is a successful GET"""
+        if self.cache is None or method.upper() != "GET" or response.status_code != 200:
+            return
+        # Deezer answers quota errors with a 200 and an "error" object; never cache those
+        if response.content[:16].lstrip().startswith(b'{"error"'):
+            return
+        full_url = self.full_url(method, url, params)
+        self.cache.put(self.cache_key(full_url), full_url, response)
+
+    def get(self, url, **kwargs):
+        return self.request("GET", url, **kwargs)
+
+    def post(self, url, **kwargs):
+        return self.request("POST", url, **kwargs)
+
+    def log_stats(self, log=None):
+        (log or logger).warning("HTTP network calls: {network}, cache hits: {cache_hits}".format(**self.stats))
+
+_client = None
+_client_lock = threading.Lock()
+
+def get_client():
+    """
+    The process-wide HttpClient. The response cache is on by default;
+    set HTTP_CACHE=0 to disable it, HTTP_CACHE_FILE and HTTP_CACHE_MAX_MB to move or size it.
+
+    HTTP_MODE=record stores every response in the api_replay fixture file
+    (HTTP_FIXTURES_FILE) and HTTP_MODE=replay answers from it without network,
+    waiting HTTP_REPLAY_LATENCY_MS (the recorded latency if unset) plus up to
+    HTTP_REPLAY_JITTER_MS and failing HTTP_REPLAY_ERROR_RATE of calls, seeded by HTTP_REPLAY_SEED.
+    Both modes leave the response cache out.
+    """
+    global _client
+    with _client_lock:
+        if _client is None:
+            mode = os.getenv("HTTP_MODE", "live")
+            if mode in ("record", "replay"):
+                import api_replay
+                store = api_replay.FixtureStore(os.getenv("HTTP_FIXTURES_FILE", api_replay.FIXTURES_FILE))
+                if mode == "record":
+                    _client = api_replay.RecordingClient(store)
+                else:
+                    latency = os.getenv("HTTP_REPLAY_LATENCY_MS")
+                    _client = api_replay.ReplayClient(
+                        store,
+                        latency=float(latency) / 1000 if latency else None,
+                        jitter=float(os.getenv("HTTP_REPLAY_JITTER_MS", 0)) / 1000,
+                        error_rate=float(os.getenv("HTTP_REPLAY_ERROR_RATE", 0)),
+                        seed=int(os.getenv("HTTP_REPLAY_SEED", 0)))
+                logger.warning(f"HTTP {mode} mode with fixtures in {os.getenv('HTTP_FIXTURES_FILE', api_replay.FIXTURES_FILE)}")
+            else:
+                cache = None
+                if os.getenv("HTTP_CACHE", "1") != "0":
+                    cache = ResponseCache(os.getenv("HTTP_CACHE_FILE", CACHE_FILE),
+                                          max_bytes=int(float(os.getenv("HTTP_CACHE_MAX_MB", CACHE_MAX_BYTES / 2 ** 20)) * 2 ** 20))
+                _client = HttpClient(cache=cache)
+        return _client
+
+def set_client(client):
+    """Replace the process-wide HttpClient"""
+    global _client
+    with _client_lock:
+        _client = client
+
+def get(url, **kwargs):
+    return get_client().get(url, **kwargs)
+
+def post(url, **kwargs):
+    return get_client().post(url, **kwargs)
@@ -0,0 +1,92 @@
+import sqlite3
+import argparse
+import logging
+import numpy as np
+from logger_config import get_script_logger
+from extract_features import load_feature_store, decode_codes, get_filename_index, CODED_COLUMNS, FEATURE_PATHS
+
+# Parse command line arguments
+parser = argparse.ArgumentParser(description='Load Essentia audio features into the audio_features table')
+parser.add_argument('--log-level',
+                    choices=['DEBUG', 'INFO', 'WARNING', 'ERROR', 'CRITICAL'],
+                    default='WARNING',
+                    help='Set the logging level (default: WARNING)')
+parser.add_argument('--store', default='audio_features.npy',
+                    help='Feature store written by extract_features.py (default: audio_features.npy)')
+args = parser.parse_args()
+
+# Convert string log level to logging constant
+log_level = getattr(logging, args.log_level)
+
+# Set up logger
+logger = get_script_logger('load_audio_features', level=log_level)
+
+# Database connection
+DB_FILE = "music_weather.db"
+
+def create_audio_features_table(cursor):
+    """
+    Creates the 'audio_features' table keyed by spotify_id, with an index on
+    the preview filename the Essentia outputs are named after.
+    """
+    feature_columns = ",\n".join(
+        f"            {column} {'TEXT' if column in CODED_COLUMNS else 'REAL'}"
+        for column in FEATURE_PATHS
+    )
+    cursor.execute(f"""
+        CREATE TABLE IF NOT EXISTS audio_features (
+            spotify_id TEXT PRIMARY KEY REFERENCES songs(spotify_id),
+            filename TEXT NOT NULL,
+{feature_columns})
+    """)
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_audio_features_filename ON audio_features(filename)")
+    logger.info("audio_features table created or already exists")
+
+def load_audio_features():
+    """Bulk upsert the feature store into audio_features in a single transaction"""
+    filenames, store = load_feature_store(args.store)
+    logger.warning(f"Loaded {len(filenames)} rows from {args.store}")
+
+    conn = sqlite3.connect(DB_FILE)
+    try:
+        cursor = conn.cursor()
+        create_audio_features_table(cursor)
+        filename_index = get_filename_index(cursor)
+
+        # Decode key/scale codes once per column, NaN becomes NULL
+        columns = {}
+        for column in FEATURE_PATHS:
+            if column in CODED_COLUMNS:
+                columns[column] = decode_codes(store[column], column)
+            else:
+                values = np.asarray(store[column], dtype=np.float64)
+                columns[column] = [None if np.isnan(v) else float(v) for v in values]
+
+        rows = []
+        unmatched = 0
+        for i, filename in enumerate(filenames):
+            spotify_id = filename_index.get(filename)
+            if spotify_id is None:
+                unmatched += 1
+                logger.debug(f"No song found for preview file: {filename}")
+                continue
+            rows.append((spotify_id, filename) + tuple(columns[column][i] for column in FEATURE_PATHS))
+
+        names = ", ".join(FEATURE_PATHS)
+        placeholders = ", ".join("?" for _ in FEATURE_PATHS)
+        assignments = ", ".join(f"{column} = excluded.{column}" for column in FEATURE_PATHS)
+        with conn:
+            cursor.executemany(f"""
+                INSERT INTO audio_features (spotify_id, filename, {names})
+                VALUES (?, ?, {placeholders})
+                ON CONFLICT(spotify_id) DO UPDATE SET filename = excluded.filename, {assignments}
+            """, rows)
+
+        logger.warning(f"Upserted {len(rows)} songs into audio_features, {unmatched} files had no matching song")
+    except sqlite3.Error as e:
+        logger.error(f"Database error: {e}")
+    finally:
+        conn.close()
+
+if __name__ == "__main__":
+    load_audio_features()
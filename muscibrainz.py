@@ -1,86 +1,262 @@
 import requests
-import os
+import sqlite3
 import json
-from dotenv import load_dotenv
-
-# Load credentials from .env
-load_dotenv()
-SPOTIFY_CLIENT_ID = os.getenv("MUSIC_CLIENT_ID")
-SPOTIFY_CLIENT_SECRET = os.getenv("MUSIC_CLIENT_SECRET")
-
-# === Helper Functions ===
-
-def get_spotify_token():
-    url = 'https://accounts.spotify.com/api/token'
-    headers = {'Content-Type': 'application/x-www-form-urlencoded'}
-    data = {
-        'grant_type': 'client_credentials',
-        'client_id': SPOTIFY_CLIENT_ID,
-        'client_secret': SPOTIFY_CLIENT_SECRET
-    }
-    r = requests.post(url, headers=headers, data=data)
-    r.raise_for_status()
-    return r.json()['access_token']
+import time
+import logging
+import argparse
+from logger_config import get_script_logger
+import http_client
 
-def get_spotify_track_info(track_id, token):
-    url = f"https://api.spotify.com/v1/tracks/{track_id}"
-    headers = {"Authorization": f"Bearer {token}"}
-    r = requests.get(url, headers=headers)
-    r.raise_for_status()
-    return r.json()
+# Parse command line arguments
+parser = argparse.ArgumentParser(description='Enrich songs with MusicBrainz IDs and AcousticBrainz features')
+parser.add_argument('--log-level',
+                    choices=['DEBUG', 'INFO', 'WARNING', 'ERROR', 'CRITICAL'],
+                    default='WARNING',
+                    help='Set the logging level (default: WARNING)')
+parser.add_argument('--limit', type=int, default=0,
+                    help='Most MusicBrainz lookups in this run (default: 0, meaning no limit)')
+parser.add_argument('--min-score', type=int, default=90,
+                    help='Lowest MusicBrainz search score accepted as a match (default: 90)')
+parser.add_argument('--max-attempts', type=int, default=3,
+                    help='Give up on a song after this many failed lookups (default: 3)')
+parser.add_argument('--skip-musicbrainz', action='store_true',
+                    help='Only fetch AcousticBrainz data for MBIDs already found')
+parser.add_argument('--skip-acousticbrainz', action='store_true',
+                    help='Only look up MBIDs')
+parser.add_argument('--user-agent', default='MusicMatcher/1.0 ( your_email@example.com )',
+                    help='User-Agent sent to MusicBrainz, which asks for contact details')
+args = parser.parse_args()
+
+# Convert string log level to logging constant
+log_level = getattr(logging, args.log_level)
+
+# Set up logger
+logger = get_script_logger('musicbrainz', level=log_level)
+
+# Database connection
+DB_FILE = "music_weather.db"
+
+MUSICBRAINZ_URL = "https://musicbrainz.org/ws/2/recording/"
+ACOUSTICBRAINZ_URL = "https://acousticbrainz.org/api/v1"
+ACOUSTICBRAINZ_LEVELS = ("low-level", "high-level")
+
+# MusicBrainz allows one request per second; AcousticBrainz bulk calls take 25 MBIDs
+MUSICBRAINZ_INTERVAL = 1.0
+ACOUSTICBRAINZ_INTERVAL = 1.0
+ACOUSTICBRAINZ_BATCH_SIZE = 25
+
+http = http_client.get_client()
+headers = {'User-Agent': args.user_agent}
+
+class RateLimiter:
+    """Spaces calls at least `interval` seconds apart"""
+
+    def __init__(self, interval):
+        self.interval = interval
+        self.last_call = 0.0
+
+    def wait(self):
+        delay = self.last_call + self.interval - time.monotonic()
+        if delay > 0:
+            time.sleep(delay)
+        self.last_call = time.monotonic()
+
+musicbrainz_limiter = RateLimiter(MUSICBRAINZ_INTERVAL)
+acousticbrainz_limiter = RateLimiter(ACOUSTICBRAINZ_INTERVAL)
+
+def polite_get(url, limiter, params=None, retries=3):
+    """
+    GET through a rate limiter, backing off when the service answers 429/503.
+    Responses cached by http_client are returned without waiting.
+    """
+    response = http.cached('GET', url, params)
+    if response is not None:
+        return response
+    for attempt in range(retries + 1):
+        limiter.wait()
+        response = http.send('GET', url, params=params, headers=headers)
+        if response.status_code not in (429, 503) or attempt == retries:
+            http.store('GET', url, params, response)
+            return response
+        try:
+            delay = float(response.headers.get('Retry-After', ''))
+        except ValueError:
+            delay = 2 ** (attempt + 1)
+        logger.warning(f"Rate limited by {url}, waiting {delay:.0f}s")
+        time.sleep(delay)
+    return response
+
+def create_tables(cursor):
+    """
+    Creates the MusicBrainz lookup queue, the matched recordings and the
+    AcousticBrainz document cache (data is NULL when AcousticBrainz has no document).
+    """
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS musicbrainz_queue (
+            spotify_id TEXT PRIMARY KEY REFERENCES songs(spotify_id),
+            status TEXT NOT NULL DEFAULT 'pending',
+            attempts INTEGER NOT NULL DEFAULT 0,
+            updated_at TEXT
+        )
+    """)
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_musicbrainz_queue_status ON musicbrainz_queue(status)")
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS musicbrainz_recordings (
+            spotify_id TEXT PRIMARY KEY REFERENCES songs(spotify_id),
+            mbid TEXT NOT NULL,
+            score INTEGER,
+            matched_at TEXT NOT NULL
+        )
+    """)
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_musicbrainz_recordings_mbid ON musicbrainz_recordings(mbid)")
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS acousticbrainz_data (
+            mbid TEXT NOT NULL,
+            level TEXT NOT NULL,
+            data TEXT,
+            fetched_at TEXT NOT NULL,
+            PRIMARY KEY (mbid, level)
+        )
+    """)
+
+def enqueue_songs(conn):
+    """Add songs not yet in the queue, returns how many were added"""
+    with conn:
+        cursor = conn.execute("""
+            INSERT OR IGNORE INTO musicbrainz_queue (spotify_id, updated_at)
+            SELECT spotify_id, datetime('now') FROM songs
+        """)
+    return cursor.rowcount
+
+def lucene_escape(text):
+    """Escape a value for a quoted MusicBrainz search term"""
+    return text.replace('\\', '\\\\').replace('"', '\\"')
 
 def search_musicbrainz(track_name, artist_name):
-    query = f'recording:"{track_name}" AND artist:"{artist_name}"'
-    url = f"https://musicbrainz.org/ws/2/recording/?query={query}&fmt=json"
-    headers = {'User-Agent': 'MusicMatcher/1.0 ( your_email@example.com )'}
-    r = requests.get(url, headers=headers)
+    """Search MusicBrainz recordings, returns the JSON response"""
+    query = f'recording:"{lucene_escape(track_name)}" AND artist:"{lucene_escape(artist_name)}"'
+    r = polite_get(MUSICBRAINZ_URL, musicbrainz_limiter, params={'query': query, 'fmt': 'json', 'limit': 5})
     r.raise_for_status()
     return r.json()
 
-def fetch_acousticbrainz_data(mbid, level="low-level"):
-    url = f"http://acousticbrainz.org/{mbid}/{level}"
-    r = requests.get(url)
-    if r.status_code == 200:
-        return r.json()
-    else:
-        return {"error": f"No AcousticBrainz {level} data found for this MBID."}
-
-# === Main Script ===
+def lookup_mbids(conn):
+    """
+    Work through the queue at MusicBrainz's rate, one committed lookup at a time,
+    so an interrupted run resumes where it stopped. Failed lookups are retried on
+    later runs up to --max-attempts.
+    """
+    pending = conn.execute("""
+        SELECT q.spotify_id, s.title, s.artist
+        FROM musicbrainz_queue q JOIN songs s ON s.spotify_id = q.spotify_id
+        WHERE q.status = 'pending' OR (q.status = 'error' AND q.attempts < ?)
+        ORDER BY q.spotify_id
+    """, (args.max_attempts,)).fetchall()
+    if args.limit:
+        pending = pending[:args.limit]
+    logger.warning(f"{len(pending)} songs to look up on MusicBrainz (about {len(pending) * MUSICBRAINZ_INTERVAL / 60:.0f} minutes)")
 
-spotify_track_id = "6DwBCjospi1c9WsRVfoCwN"  # Example: Blinding Lights
+    counts = {'done': 0, 'not_found': 0, 'error': 0}
+    for i, (spotify_id, title, artist) in enumerate(pending, 1):
+        try:
+            recordings = search_musicbrainz(title, artist).get('recordings', [])
+            best = recordings[0] if recordings else None
+            if best and best.get('score', 0) >= args.min_score:
+                status = 'done'
+                with conn:
+                    conn.execute("""
+                        INSERT INTO musicbrainz_recordings (spotify_id, mbid, score, matched_at)
+                        VALUES (?, ?, ?, datetime('now'))
+                        ON CONFLICT(spotify_id) DO UPDATE SET
+                            mbid = excluded.mbid, score = excluded.score, matched_at = excluded.matched_at
+                    """, (spotify_id, best['id'], best.get('score')))
+            else:
+                status = 'not_found'
+                logger.debug(f"No MBID found for '{title}' by '{artist}'")
+        except (requests.RequestException, ValueError) as e:
+            status = 'error'
+            logger.error(f"MusicBrainz lookup failed for '{title}' by '{artist}': {e}")
 
-try:
-    print("🔐 Fetching Spotify token...")
-    token = get_spotify_token()
+        with conn:
+            conn.execute("""
+                UPDATE musicbrainz_queue
+                SET status = ?, attempts = attempts + 1, updated_at = datetime('now')
+                WHERE spotify_id = ?
+            """, (status, spotify_id))
+        counts[status] += 1
+        if i % 100 == 0:
+            logger.warning(f"Looked up {i}/{len(pending)} songs")
 
-    print("🎵 Fetching Spotify track info...")
-    track_data = get_spotify_track_info(spotify_track_id, token)
-    track_name = track_data['name']
-    artist_name = track_data['artists'][0]['name']
+    logger.warning(f"MusicBrainz: {counts['done']} matched, {counts['not_found']} not found, {counts['error']} errors")
 
-    print(f"\n🎯 Track: {track_name} by {artist_name}")
-
-    print("\n🔍 Searching MusicBrainz...")
-    mb_results = search_musicbrainz(track_name, artist_name)
+def fetch_acousticbrainz_bulk(mbids, level):
+    """
+    Fetch one AcousticBrainz level for up to 25 MBIDs in one call.
+    Returns a dictionary of mbid -> document for the MBIDs AcousticBrainz has.
+    """
+    r = polite_get(f"{ACOUSTICBRAINZ_URL}/{level}", acousticbrainz_limiter,
+                   params={'recording_ids': ';'.join(mbids)})
+    r.raise_for_status()
+    documents = {}
+    for mbid, submissions in r.json().items():
+        # Several submissions can exist per recording, keyed by offset; keep the first
+        if mbid in mbids and isinstance(submissions, dict) and '0' in submissions:
+            documents[mbid] = submissions['0']
+    return documents
 
-    if mb_results['recordings']:
-        mbid = mb_results['recordings'][0]['id']
-        print(f"\n✅ Found MBID: {mbid}")
+def fetch_acousticbrainz(conn):
+    """Fetch both AcousticBrainz levels for every matched MBID not cached yet, 25 MBIDs per call"""
+    for level in ACOUSTICBRAINZ_LEVELS:
+        missing = [row[0] for row in conn.execute("""
+            SELECT DISTINCT r.mbid FROM musicbrainz_recordings r
+            WHERE NOT EXISTS (SELECT 1 FROM acousticbrainz_data a WHERE a.mbid = r.mbid AND a.level = ?)
+            ORDER BY r.mbid
+        """, (level,))]
+        logger.warning(f"{len(missing)} MBIDs without cached AcousticBrainz {level} data")
 
-        print("\n🎧 Fetching AcousticBrainz low-level features...")
-        low_level = fetch_acousticbrainz_data(mbid, level="low-level")
+        found = 0
+        for i in range(0, len(missing), ACOUSTICBRAINZ_BATCH_SIZE):
+            batch = missing[i:i + ACOUSTICBRAINZ_BATCH_SIZE]
+            try:
+                documents = fetch_acousticbrainz_bulk(batch, level)
+            except (requests.RequestException, ValueError) as e:
+                logger.error(f"AcousticBrainz {level} request failed for {len(batch)} MBIDs: {e}")
+                continue
+            found += len(documents)
+            # MBIDs without a document are cached as NULL so reruns skip them
+            with conn:
+                conn.executemany("""
+                    INSERT OR REPLACE INTO acousticbrainz_data (mbid, level, data, fetched_at)
+                    VALUES (?, ?, ?, datetime('now'))
+                """, [(mbid, level, json.dumps(documents[mbid]) if mbid in documents else None) for mbid in batch])
 
-        print("🎼 Fetching AcousticBrainz high-level features...")
-        high_level = fetch_acousticbrainz_data(mbid, level="high-level")
+        logger.warning(f"AcousticBrainz {level}: {found} of {len(missing)} MBIDs had data")
 
-        print("\n📦 Low-Level Features:")
-        print(json.dumps(low_level, indent=4))
+def get_acousticbrainz_data(conn, spotify_id, level="low-level"):
+    """Cached AcousticBrainz document for a song, None if there is none"""
+    row = conn.execute("""
+        SELECT a.data FROM musicbrainz_recordings r
+        JOIN acousticbrainz_data a ON a.mbid = r.mbid AND a.level = ?
+        WHERE r.spotify_id = ?
+    """, (level, spotify_id)).fetchone()
+    return json.loads(row[0]) if row and row[0] else None
 
-        print("\n📊 High-Level Features:")
-        print(json.dumps(high_level, indent=4))
+def enrich_songs():
+    """Queue all songs, look up their MBIDs and fetch their AcousticBrainz data"""
+    conn = sqlite3.connect(DB_FILE)
+    try:
+        create_tables(conn.cursor())
+        conn.commit()
+        added = enqueue_songs(conn)
+        logger.warning(f"Queued {added} new songs")
 
-    else:
-        print("❌ No MBID found on MusicBrainz.")
+        if not args.skip_musicbrainz:
+            lookup_mbids(conn)
+        if not args.skip_acousticbrainz:
+            fetch_acousticbrainz(conn)
+    except sqlite3.Error as e:
+        logger.error(f"Database error: {e}")
+    finally:
+        conn.close()
 
-except Exception as e:
-    print("💥 Error:", e)
+if __name__ == "__main__":
+    enrich_songs()
@@ -0,0 +1,214 @@
+import re
+import unicodedata
+from collections import defaultdict
+from functools import lru_cache
+
+# "feat." style clauses, inside brackets or trailing the title/artist
+FEATURE_PATTERN = re.compile(r'[\(\[]\s*(?:feat|ft|featuring|with)\b[^\)\]]*[\)\]]|\s(?:feat|ft|featuring)\b.*$')
+
+# Any other bracketed part, e.g. "(Remastered 2011)", "[Live]", "(From Chhaava)"
+BRACKET_PATTERN = re.compile(r'\([^\)]*\)|\[[^\]]*\]')
+
+# Trailing " - Radio Edit", " - 2011 Remaster", ...
+VERSION_PATTERN = re.compile(
+    r'\s-\s.*\b(?:remaster(?:ed)?|live|edit|version|mix|remix|acoustic|mono|stereo|demo|instrumental)\b.*$'
+)
+
+# Separators between several artists
+ARTIST_SEPARATOR_PATTERN = re.compile(r'\s*(?:,|&|\band\b|\bx\b|\+|/|;)\s*')
+
+PUNCTUATION_PATTERN = re.compile(r'[^\w\s]')
+
+def strip_accents(text):
+    """Remove accents: 'Rosé' -> 'Rose'"""
+    if text.isascii():
+        return text
+    decomposed = unicodedata.normalize('NFKD', text)
+    return ''.join(c for c in decomposed if not unicodedata.combining(c))
+
+@lru_cache(maxsize=65536)
+def normalize_title(text):
+    """
+    Normalize a song title for matching.
+    Case-folds, removes accents, "feat." clauses, bracketed and " - ... version"
+    suffixes and punctuation, and collapses whitespace.
+    """
+    if not text:
+        return ""
+    text = strip_accents(str(text)).casefold()
+    text = FEATURE_PATTERN.sub(' ', text)
+    text = BRACKET_PATTERN.sub(' ', text)
+    text = VERSION_PATTERN.sub(' ', text)
+    text = PUNCTUATION_PATTERN.sub(' ', text)
+    return ' '.join(text.split())
+
+@lru_cache(maxsize=65536)
+def normalize_artist(text):
+    """
+    Normalize an artist credit for matching.
+    Only the primary artist is kept, so 'SZA, Kendrick Lamar' and 'SZA feat. Kendrick Lamar' both become 'sza'.
+    """
+    if not text:
+        return ""
+    text = strip_accents(str(text)).casefold()
+    text = FEATURE_PATTERN.sub(' ', text)
+    text = ARTIST_SEPARATOR_PATTERN.split(text.strip(), maxsplit=1)[0]
+    text = PUNCTUATION_PATTERN.sub(' ', text)
+    return ' '.join(text.split())
+
+def trigrams(text):
+    """Character trigrams of a normalized string, padded so short words still count"""
+    padded = f"  {text} "
+    return {padded[i:i + 3] for i in range(len(padded) - 2)}
+
+def trigram_similarity(grams1, grams2):
+    """Dice coefficient of two trigram sets (0 to 1)"""
+    if not grams1 or not grams2:
+        return 0.0
+    return 2 * len(grams1 & grams2) / (len(grams1) + len(grams2))
+
+def similarity(str1, str2):
+    """Similarity of two already normalized strings (0 to 1)"""
+    if not str1 or not str2:
+        return 0.0
+    if str1 == str2:
+        return 1.0
+    return trigram_similarity(trigrams(str1), trigrams(str2))
+
+def is_approximate_match(str1, str2, threshold=0.8, normalize=normalize_title):
+    """
+    Check if two strings match approximately after normalization.
+    Pass normalize=normalize_artist when comparing artist credits.
+    """
+    if not str1 or not str2:
+        return False
+    return similarity(normalize(str1), normalize(str2)) >= threshold
+
+class MatchIndex:
+    """
+    In-memory index of (title, artist) records for fast exact and fuzzy lookups.
+
+    Exact lookups on the normalized title/artist are dictionary hits. Otherwise
+    candidates are retrieved through title token blocking (only the rarest tokens
+    of the query are used, and very common tokens are ignored) and scored with
+    trigram similarity, the title weighing TITLE_WEIGHT and the artist the rest.
+    Build the index on the smaller side and query it with the larger one.
+    """
+
+    TITLE_WEIGHT = 0.7
+
+    def __init__(self, threshold=0.85, max_block_size=1000, blocking_tokens=2):
+        self.threshold = threshold
+        self.max_block_size = max_block_size
+        self.blocking_tokens = blocking_tokens
+        self.keys = []
+        self.titles = []
+        self.artists = []
+        self.title_grams = []
+        self.artist_grams = []
+        self.exact = {}
+        self.by_title = {}
+        self.blocks = defaultdict(list)
+
+    def __len__(self):
+        return len(self.keys)
+
+    def add(self, key, title, artist=None):
+        """Add a record; the first record added for a given title/artist wins exact lookups"""
+        title_norm = normalize_title(title)
+        if not title_norm:
+            return
+        artist_norm = normalize_artist(artist)
+        record = len(self.keys)
+        self.keys.append(key)
+        self.titles.append(title_norm)
+        self.artists.append(artist_norm)
+        self.title_grams.append(trigrams(title_norm))
+        self.artist_grams.append(trigrams(artist_norm) if artist_norm else set())
+        self.exact.setdefault((title_norm, artist_norm), record)
+        self.by_title.setdefault(title_norm, record)
+        for token in set(title_norm.split()):
+            self.blocks[token].append(record)
+
+    def candidates(self, title_norm):
+        """Records sharing one of the rarest title tokens of the query"""
+        blocks = [self.blocks[token] for token in set(title_norm.split()) if token in self.blocks]
+        blocks = [block for block in blocks if len(block) <= self.max_block_size]
+        blocks.sort(key=len)
+        found = set()
+        for block in blocks[:self.blocking_tokens]:
+            found.update(block)
+        return found
+
+    def lookup(self, title, artist=None):
+        """
+        Find the best record for a title (and artist when given).
+        Returns (key, score, exact) or None if nothing scores above the threshold.
+        """
+        title_norm = normalize_title(title)
+        if not title_norm:
+            return None
+        artist_norm = normalize_artist(artist)
+
+        record = self.exact.get((title_norm, artist_norm))
+        if record is None and not artist_norm:
+            record = self.by_title.get(title_norm)
+        if record is not None:
+            return self.keys[record], 1.0, True
+
+        candidates = self.candidates(title_norm)
+        if not candidates:
+            return None
+
+        title_grams = trigrams(title_norm)
+        artist_grams = trigrams(artist_norm) if artist_norm else set()
+        title_size = len(title_grams)
+        # Title score needed to reach the threshold even with a perfect artist score
+        min_title_score = (self.threshold - (1 - self.TITLE_WEIGHT)) / self.TITLE_WEIGHT if artist_grams else self.threshold
+
+        best_record, best_score = None, 0.0
+        # Sorted so the earliest record wins ties
+        for record in sorted(candidates):
+            record_grams = self.title_grams[record]
+            # Dice can't exceed 2 * smaller / (sum of sizes), skip hopeless candidates early
+            size = len(record_grams)
+            if 2 * min(size, title_size) < min_title_score * (size + title_size):
+                continue
+            score = trigram_similarity(record_grams, title_grams)
+            if artist_grams and self.artist_grams[record]:
+                artist_score = trigram_similarity(self.artist_grams[record], artist_grams)
+                score = self.TITLE_WEIGHT * score + (1 - self.TITLE_WEIGHT) * artist_score
+            if score > best_score:
+                best_record, best_score = record, score
+
+        if best_record is None or best_score < self.threshold:
+            return None
+        return self.keys[best_record], best_score, False
+
+def evaluate_matches(index, labeled):
+    """
+    Measure precision and recall of an index against labeled queries.
+    labeled is an iterable of (title, artist, expected_key), expected_key being None
+    when the query should not match anything.
+    """
+    true_positives = false_positives = false_negatives = 0
+    for title, artist, expected in labeled:
+        result = index.lookup(title, artist)
+        predicted = result[0] if result else None
+        if predicted is not None and predicted == expected:
+            true_positives += 1
+        else:
+            if predicted is not None:
+                false_positives += 1
+            if expected is not None:
+                false_negatives += 1
+
+    precision = true_positives / (true_positives + false_positives) if true_positives + false_positives else 0.0
+    recall = true_positives / (true_positives + false_negatives) if true_positives + false_negatives else 0.0
+    return {
+        'true_positives': true_positives,
+        'false_positives': false_positives,
+        'false_negatives': false_negatives,
+        'precision': precision,
+        'recall': recall,
+    }
@@ -1,71 +1,255 @@
 import requests
 import json
+import sqlite3
+import threading
+import time
+import argparse
+import logging
+from concurrent.futures import ThreadPoolExecutor, as_completed
 from dotenv import load_dotenv
 import os
-import urllib.parse
+from song_matching import normalize_title, normalize_artist
+import http_client
 
-# Load environment variables
-load_dotenv()
-API_KEY = os.getenv("GETSONGBPM_API_KEY")
+# Base API URL
+BASE_URL = "https://api.getsong.co"
 
-if not API_KEY:
-    print("❌ Error: GETSONGBPM_API_KEY not found in .env file")
-    exit(1)
+# Database connection
+DB_FILE = "music_weather.db"
 
-print(f"Using API Key: {API_KEY[:5]}...{API_KEY[-5:]}")
+logger = logging.getLogger('songbpm')
 
-# Base API URL
-BASE_URL = "https://api.getsong.co"
+class RateLimiter:
+    """Thread-safe limiter spacing requests at least 1/rate seconds apart"""
 
-def get_raw_json(song_name, artist_name=None):
+    def __init__(self, rate):
+        self.interval = 1.0 / rate
+        self.next_slot = 0.0
+        self.lock = threading.Lock()
+
+    def wait(self):
+        with self.lock:
+            now = time.monotonic()
+            slot = max(now, self.next_slot)
+            self.next_slot = slot + self.interval
+        if slot > now:
+            time.sleep(slot - now)
+
+def query_key(song_name, artist_name=None):
+    """Cache key of a search: the normalized title and artist"""
+    return f"{normalize_title(song_name)}|{normalize_artist(artist_name)}"
+
+class SongBPMClient:
     """
-    Get raw JSON response from the GetSongBPM API
+    GetSongBPM search client with a rate limiter and a response cache.
+    Responses are cached by normalized query, 'no result' answers included,
+    so the same song is never searched twice. Safe to use from several threads.
     """
-    # URL encode the song name and artist name
-    encoded_song = urllib.parse.quote(song_name)
-    
-    # Construct the search URL with API key in header
-    search_url = f"{BASE_URL}/search/?api_key={API_KEY}&type=song&lookup={encoded_song}"
-    
-    # Add artist name if provided
-    if artist_name:
-        encoded_artist = urllib.parse.quote(artist_name)
-        search_url = f"{BASE_URL}/search/?api_key={API_KEY}&type=both&lookup=song:{encoded_song} artist:{encoded_artist}"
-    
-    print(f"\n🔍 Searching for: {song_name}")
-    if artist_name:
-        print(f"   Artist: {artist_name}")
-    print(f"URL: {search_url}")
 
-    try:
-        response = requests.get(search_url)
-        print(f"Response Status Code: {response.status_code}")
-        
+    def __init__(self, api_key=None, rate=2.0, cache=None):
+        if api_key is None:
+            load_dotenv()
+            api_key = os.getenv("GETSONGBPM_API_KEY")
+        if not api_key:
+            raise ValueError("GETSONGBPM_API_KEY not found in .env file")
+        self.api_key = api_key
+        self.limiter = RateLimiter(rate)
+        self.http = http_client.get_client()
+        self.cache = cache if cache is not None else {}
+        self.cache_lock = threading.Lock()
+        self.new_entries = {}
+
+    def get_raw_json(self, song_name, artist_name=None):
+        """
+        Get the JSON response of a GetSongBPM search, from the cache when possible.
+        Returns None if the request failed (failures are not cached).
+        """
+        key = query_key(song_name, artist_name)
+        with self.cache_lock:
+            if key in self.cache:
+                return self.cache[key]
+
+        params = {"api_key": self.api_key, "type": "song", "lookup": song_name}
+        if artist_name:
+            params["type"] = "both"
+            params["lookup"] = f"song:{song_name} artist:{artist_name}"
+
+        # Responses cached by http_client from an earlier run skip the rate limiter
+        response = self.http.cached("GET", f"{BASE_URL}/search/", params)
+        try:
+            if response is None:
+                self.limiter.wait()
+                response = self.http.get(f"{BASE_URL}/search/", params=params, timeout=30)
+        except requests.exceptions.RequestException as e:
+            logger.error(f"Network error searching '{song_name}': {e}")
+            return None
         if response.status_code != 200:
-            print(f"❌ Error during search: {response.status_code}")
-            print(f"Error Response: {response.text}")
+            logger.error(f"Error during search for '{song_name}': {response.status_code} {response.text}")
+            return None
+        try:
+            data = response.json()
+        except ValueError as e:
+            logger.error(f"JSON parsing error for '{song_name}': {e}")
             return None
 
-        # Print raw response
-        print("\n📦 RAW API RESPONSE:")
-        print(json.dumps(response.json(), indent=4))
-        
-        return response.json()
-
-    except requests.exceptions.RequestException as e:
-        print(f"❌ Network error: {e}")
-    except json.JSONDecodeError as e:
-        print(f"❌ JSON parsing error: {e}")
-    except Exception as e:
-        print(f"❌ Unexpected error: {e}")
-    
-    return None
+        with self.cache_lock:
+            self.cache[key] = data
+            self.new_entries[key] = data
+        return data
+
+    def take_new_entries(self):
+        """Cache entries added since the last call, for persisting"""
+        with self.cache_lock:
+            entries, self.new_entries = self.new_entries, {}
+        return entries
+
+def pick_tempo(data, artist_name=None):
+    """
+    Tempo of the best search result: the first whose artist matches after
+    normalization, else the first result. None when there is no usable result.
+    """
+    results = data.get("search") if data else None
+    # No results come back as {"search": {"error": "no result"}}
+    if not isinstance(results, list) or not results:
+        return None
+    best = results[0]
+    if artist_name:
+        wanted = normalize_artist(artist_name)
+        for result in results:
+            if normalize_artist((result.get("artist") or {}).get("name")) == wanted:
+                best = result
+                break
+    try:
+        return int(round(float(best.get("tempo"))))
+    except (TypeError, ValueError):
+        return None
+
+def create_cache_table(cursor):
+    """Creates the 'songbpm_cache' table of raw search responses keyed by normalized query"""
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS songbpm_cache (
+            query_key TEXT PRIMARY KEY,
+            response TEXT NOT NULL,
+            fetched_at TEXT NOT NULL
+        )
+    """)
+
+def load_cache(conn):
+    return {key: json.loads(response) for key, response in conn.execute("SELECT query_key, response FROM songbpm_cache")}
+
+def save_cache_entries(conn, entries):
+    conn.executemany("""
+        INSERT OR REPLACE INTO songbpm_cache (query_key, response, fetched_at)
+        VALUES (?, ?, datetime('now'))
+    """, [(key, json.dumps(data)) for key, data in entries.items()])
+
+def flush(conn, client, bpm_updates):
+    """Write pending bpm updates and new cache entries in one transaction"""
+    with conn:
+        if bpm_updates:
+            conn.executemany("UPDATE songs SET bpm = ? WHERE spotify_id = ?", bpm_updates)
+        save_cache_entries(conn, client.take_new_entries())
+    return len(bpm_updates)
+
+def update_song_bpm(db_file=DB_FILE, api_key=None, workers=4, rate=2.0, batch_size=100, limit=0):
+    """
+    Look up the BPM of every song whose bpm is NULL and store it in songs.bpm.
+    Searches run on `workers` threads, paced to `rate` requests per second overall;
+    results are written back every batch_size songs. Returns a dictionary of counts.
+    """
+    conn = sqlite3.connect(db_file)
+    counts = {'songs': 0, 'updated': 0, 'not_found': 0, 'failed': 0}
+    try:
+        create_cache_table(conn.cursor())
+        conn.commit()
+        client = SongBPMClient(api_key, rate=rate, cache=load_cache(conn))
+        logger.warning(f"Loaded {len(client.cache)} cached searches")
+
+        query = "SELECT spotify_id, title, artist FROM songs WHERE bpm IS NULL"
+        if limit:
+            query += f" LIMIT {int(limit)}"
+        songs = conn.execute(query).fetchall()
+        counts['songs'] = len(songs)
+        logger.warning(f"Found {len(songs)} songs without bpm")
+
+        # Songs sharing a normalized title/artist need a single search
+        groups = {}
+        for spotify_id, title, artist in songs:
+            groups.setdefault(query_key(title, artist), (title, artist, []))[2].append(spotify_id)
+
+        def lookup(group):
+            title, artist, spotify_ids = group
+            data = client.get_raw_json(title, artist)
+            return spotify_ids, data, pick_tempo(data, artist) if data is not None else None
+
+        bpm_updates = []
+        done = 0
+        with ThreadPoolExecutor(max_workers=workers) as executor:
+            futures = [executor.submit(lookup, group) for group in groups.values()]
+            for future in as_completed(futures):
+                spotify_ids, data, tempo = future.result()
+                done += len(spotify_ids)
+                if data is None:
+                    counts['failed'] += len(spotify_ids)
+                elif tempo is None:
+                    counts['not_found'] += len(spotify_ids)
+                else:
+                    bpm_updates.extend((tempo, spotify_id) for spotify_id in spotify_ids)
+                if len(bpm_updates) >= batch_size:
+                    counts['updated'] += flush(conn, client, bpm_updates)
+                    bpm_updates = []
+                    logger.warning(f"Processed {done}/{len(songs)} songs")
+        counts['updated'] += flush(conn, client, bpm_updates)
+    except sqlite3.Error as e:
+        logger.error(f"Database error: {e}")
+    finally:
+        conn.close()
+
+    logger.warning(f"BPM update complete. Updated: {counts['updated']}, "
+                   f"Not found: {counts['not_found']}, Failed: {counts['failed']}")
+    return counts
+
+def get_raw_json(song_name, artist_name=None):
+    """
+    Get raw JSON response from the GetSongBPM API
+    """
+    return SongBPMClient().get_raw_json(song_name, artist_name)
+
+def parse_args():
+    parser = argparse.ArgumentParser(description='Fill songs.bpm from the GetSongBPM API')
+    parser.add_argument('--log-level',
+                        choices=['DEBUG', 'INFO', 'WARNING', 'ERROR', 'CRITICAL'],
+                        default='WARNING',
+                        help='Set the logging level (default: WARNING)')
+    parser.add_argument('--workers', type=int, default=4,
+                        help='Number of concurrent searches (default: 4)')
+    parser.add_argument('--rate', type=float, default=2.0,
+                        help='Most requests per second, across all workers (default: 2)')
+    parser.add_argument('--batch-size', type=int, default=100,
+                        help='Songs per database update (default: 100)')
+    parser.add_argument('--limit', type=int, default=0,
+                        help='Limit the number of songs to process (default: 0, meaning no limit)')
+    parser.add_argument('--search', nargs='+', metavar=('SONG', 'ARTIST'),
+                        help='Print the raw search response for one song and exit (quote names with spaces)')
+    args = parser.parse_args()
+    if args.search and len(args.search) > 2:
+        parser.error(f"--search takes a song and an optional artist, got {len(args.search)} values; "
+                     "quote names that contain spaces")
+    return args
 
 def main():
-    # Test with a sample song
-    song_name = "Blinding Lights"
-    artist_name = "The Weeknd"
-    get_raw_json(song_name, artist_name)
+    args = parse_args()
+
+    # Imported here since logger_config creates the logs directory on import;
+    # this configures the same 'songbpm' logger the module uses
+    from logger_config import get_script_logger
+    get_script_logger('songbpm', level=getattr(logging, args.log_level))
+
+    if args.search:
+        print(json.dumps(get_raw_json(*args.search), indent=4))
+        return
+
+    update_song_bpm(workers=args.workers, rate=args.rate, batch_size=args.batch_size, limit=args.limit)
 
 if __name__ == "__main__":
     main()
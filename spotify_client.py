@@ -0,0 +1,207 @@
+import base64
+import logging
+import os
+import random
+import threading
+import time
+import requests
+from dotenv import load_dotenv
+import http_client
+
+TOKEN_URL = "https://accounts.spotify.com/api/token"
+
+# Responses worth retrying; anything else is returned to the caller as is
+RETRY_STATUSES = {429, 500, 502, 503, 504}
+
+class AdaptiveLimiter:
+    """
+    Bounds the number of requests in flight and adapts the bound to throttling.
+    The limit is halved on every 429 and grows back by one after
+    `increase_after` successful requests in a row (AIMD), between
+    min_concurrency and max_concurrency. A Retry-After pause applies to all threads.
+    """
+
+    def __init__(self, max_concurrency=8, min_concurrency=1, increase_after=20):
+        self.max_concurrency = max_concurrency
+        self.min_concurrency = min_concurrency
+        self.increase_after = increase_after
+        self.limit = max_concurrency
+        self.in_flight = 0
+        self.successes = 0
+        self.paused_until = 0.0
+        self.condition = threading.Condition()
+
+    def acquire(self):
+        with self.condition:
+            while True:
+                wait = self.paused_until - time.monotonic()
+                if wait > 0:
+                    self.condition.wait(wait)
+                elif self.in_flight >= self.limit:
+                    self.condition.wait()
+                else:
+                    self.in_flight += 1
+                    return
+
+    def release(self):
+        with self.condition:
+            self.in_flight -= 1
+            self.condition.notify_all()
+
+    def record_success(self):
+        with self.condition:
+            self.successes += 1
+            if self.successes >= self.increase_after and self.limit < self.max_concurrency:
+                self.limit += 1
+                self.successes = 0
+                self.condition.notify_all()
+
+    def record_throttle(self, retry_after):
+        with self.condition:
+            self.successes = 0
+            self.limit = max(self.min_concurrency, self.limit // 2)
+            self.paused_until = max(self.paused_until, time.monotonic() + retry_after)
+
+class SpotifyClient:
+    """
+    Spotify Web API client shared by the enrichment scripts.
+
+    Every call goes through request(), which gets and refreshes the client
+    credentials token, honours Retry-After on 429, retries server errors and
+    connection failures with exponential backoff, and counts what happened in
+    `stats`. It is safe to call from several threads; `limiter` bounds and
+    adapts how many requests are in flight. Requests go through the shared
+    http_client, so GETs cached by an earlier run are answered without a call.
+    """
+
+    def __init__(self, client_id=None, client_secret=None, max_retries=5,
+                 max_concurrency=8, backoff=1.0, max_backoff=60.0, logger=None, http=None):
+        if client_id is None or client_secret is None:
+            load_dotenv()
+            client_id = client_id or os.getenv("MUSIC_CLIENT_ID")
+            client_secret = client_secret or os.getenv("MUSIC_CLIENT_SECRET")
+        if not client_id or not client_secret:
+            raise Exception("Missing Spotify API credentials in .env file")
+
+        self.client_id = client_id
+        self.client_secret = client_secret
+        self.max_retries = max_retries
+        self.backoff = backoff
+        self.max_backoff = max_backoff
+        self.logger = logger or logging.getLogger(__name__)
+        self.limiter = AdaptiveLimiter(max_concurrency=max_concurrency)
+        self.http = http or http_client.get_client()
+        self.token = None
+        self.token_expires = 0.0
+        self.token_lock = threading.Lock()
+        self.stats_lock = threading.Lock()
+        self.stats = {
+            'requests': 0,
+            'throttled': 0,
+            'retried': 0,
+            'token_refreshes': 0,
+            'failed': 0,
+        }
+
+    def count(self, name):
+        with self.stats_lock:
+            self.stats[name] += 1
+
+    def get_token(self, force=False):
+        """Current access token, fetched again when it is about to expire or force is set"""
+        with self.token_lock:
+            if force or self.token is None or time.monotonic() >= self.token_expires:
+                auth_headers = {
+                    "Authorization": "Basic " + base64.b64encode(
+                        f"{self.client_id}:{self.client_secret}".encode()).decode(),
+                }
+                response = self.http.post(TOKEN_URL, headers=auth_headers,
+                                          data={"grant_type": "client_credentials"})
+                if response.status_code != 200:
+                    raise Exception(f"Failed to get access token: {response.text}")
+                data = response.json()
+                self.token = data.get("access_token")
+                # Refresh a minute early so a token never expires mid-request
+                self.token_expires = time.monotonic() + data.get("expires_in", 3600) - 60
+                self.count('token_refreshes')
+            return self.token
+
+    def retry_delay(self, attempt):
+        """Exponential backoff with jitter"""
+        return min(self.max_backoff, self.backoff * 2 ** attempt) * random.uniform(0.5, 1.0)
+
+    def request(self, method, url, **kwargs):
+        """
+        Send an authorized request and return the final response.
+        Throttled, expired-token and transient failures are retried up to max_retries
+        times; the last response is returned if they keep failing. Connection errors
+        are raised once retries are exhausted.
+        """
+        cached = self.http.cached(method, url, kwargs.get("params"))
+        if cached is not None:
+            return cached
+
+        headers = dict(kwargs.pop("headers", None) or {})
+        refreshed = False
+        for attempt in range(self.max_retries + 1):
+            headers["Authorization"] = f"Bearer {self.get_token()}"
+            self.limiter.acquire()
+            try:
+                self.count('requests')
+                response = self.http.send(method, url, headers=headers, **kwargs)
+            except requests.RequestException as e:
+                if attempt == self.max_retries:
+                    self.count('failed')
+                    raise
+                delay = self.retry_delay(attempt)
+                self.logger.warning(f"Request to {url} failed ({e}), retrying in {delay:.1f}s")
+                self.count('retried')
+                time.sleep(delay)
+                continue
+            finally:
+                self.limiter.release()
+
+            if response.status_code == 401 and not refreshed:
+                # Token expired or was revoked early, refresh once
+                refreshed = True
+                self.get_token(force=True)
+                self.count('retried')
+                continue
+
+            if response.status_code not in RETRY_STATUSES:
+                if response.status_code < 400:
+                    self.limiter.record_success()
+                    self.http.store(method, url, kwargs.get("params"), response)
+                else:
+                    self.count('failed')
+                return response
+
+            if attempt == self.max_retries:
+                self.count('failed')
+                return response
+
+            if response.status_code == 429:
+                self.count('throttled')
+                try:
+                    delay = float(response.headers.get("Retry-After", ""))
+                except ValueError:
+                    delay = self.retry_delay(attempt)
+                self.limiter.record_throttle(delay)
+                self.logger.warning(f"Throttled by Spotify, waiting {delay:.1f}s "
+                                    f"(concurrency now {self.limiter.limit})")
+            else:
+                delay = self.retry_delay(attempt)
+                self.logger.warning(f"Spotify returned {response.status_code}, retrying in {delay:.1f}s")
+                time.sleep(delay)
+            self.count('retried')
+        return response
+
+    def get(self, url, **kwargs):
+        return self.request("GET", url, **kwargs)
+
+    def log_stats(self):
+        """Log the request counters"""
+        self.logger.warning(
+            "Spotify requests: {requests}, throttled: {throttled}, retried: {retried}, "
+            "token refreshes: {token_refreshes}, failed: {failed}".format(**self.stats)
+        )
@@ -0,0 +1,23 @@
+import importlib
+import os
+import sys
+
+import pytest
+
+REPO_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, REPO_DIR)
+
+@pytest.fixture
+def import_script(tmp_path, monkeypatch):
+    """
+    Import a top-level script from inside tmp_path with the given command line,
+    since the scripts parse their arguments and create logs/ at import time.
+    """
+    def _import(name, *argv):
+        monkeypatch.chdir(tmp_path)
+        # logger_config only creates logs/ when it is first imported
+        (tmp_path / "logs").mkdir(exist_ok=True)
+        monkeypatch.setattr(sys, "argv", [f"{name}.py", *argv])
+        sys.modules.pop(name, None)
+        return importlib.import_module(name)
+    return _import
@@ -0,0 +1,25 @@
+import http_client
+from api_replay import FixtureStore
+
+def test_token_response_is_redacted(tmp_path):
+    store = FixtureStore(tmp_path / "fixtures.db")
+    response = http_client.build_response(
+        "https://accounts.spotify.com/api/token", 200,
+        "Content-Type: application/json\nAuthorization: Bearer live-token",
+        b'{"access_token": "live-token", "token_type": "Bearer", "expires_in": 3600}')
+
+    store.put("POST", "https://accounts.spotify.com/api/token", response)
+
+    status, headers, body, _ = store.get("POST", "https://accounts.spotify.com/api/token")
+    assert status == 200
+    assert headers == "Content-Type: application/json\nAuthorization: REDACTED"
+    assert body == b'{"access_token": "REDACTED", "token_type": "Bearer", "expires_in": 3600}'
+
+def test_other_bodies_are_stored_unchanged(tmp_path):
+    store = FixtureStore(tmp_path / "fixtures.db")
+    body = b'{"tracks": [{"id": "abc"}]}'
+    response = http_client.build_response("https://api.spotify.com/v1/tracks?ids=abc", 200, "", body)
+
+    store.put("GET", "https://api.spotify.com/v1/tracks?ids=abc", response)
+
+    assert store.get("GET", "https://api.spotify.com/v1/tracks?ids=abc")[2] == body
@@ -0,0 +1,79 @@
+import csv
+import json
+import sqlite3
+
+def make_database(tmp_path):
+    conn = sqlite3.connect(tmp_path / "music_weather.db")
+    conn.execute("CREATE TABLE songs (spotify_id TEXT PRIMARY KEY, title TEXT, artist TEXT, album TEXT)")
+    conn.executemany("INSERT INTO songs VALUES (?, ?, ?, NULL)",
+                     [("id1", "Song One", "Artist A"), ("id2", "Song Two", "Artist B")])
+    conn.commit()
+    return conn
+
+def write_csv(path, header, rows):
+    with open(path, "w", newline="", encoding="utf-8") as f:
+        writer = csv.writer(f)
+        writer.writerow(header)
+        writer.writerows(rows)
+
+def albums(conn):
+    return dict(conn.execute("SELECT spotify_id, album FROM songs ORDER BY spotify_id"))
+
+def test_unknown_update_columns_are_dropped(tmp_path, import_script):
+    conn = make_database(tmp_path)
+    module = import_script("csv_parsing_songs_update", "--csv-dir", ".", "--non-interactive")
+    write_csv(tmp_path / "a.csv", ["Title", "Artist", "Album", "Release Year"],
+              [["Song One", "Artist A", "First", "2020"]])
+
+    module.process_csv_batch([("a.csv", {"Title": "title", "Artist": "artist"},
+                               {"Album": "album", "Release Year": "release_year"})])
+
+    assert albums(conn) == {"id1": "First", "id2": None}
+
+def test_profile_matches_header_in_another_case(tmp_path, import_script):
+    conn = make_database(tmp_path)
+    module = import_script("csv_parsing_songs_update", "--csv-dir", ".")
+    module.save_profile("source", ["Title", "Artist", "Album"],
+                        {"Title": "title", "Artist": "artist"}, {"Album": "album"})
+    header = ["title", "artist", "album"]
+    write_csv(tmp_path / "a.csv", header, [["Song Two", "Artist B", "Second"]])
+
+    matching_columns, update_columns = module.resolve_column_mapping("a.csv", header, ["title", "artist", "album"])
+    module.process_csv_batch([("a.csv", matching_columns, update_columns)])
+
+    assert albums(conn) == {"id1": None, "id2": "Second"}
+
+def test_batch_applies_files_in_order_and_skips_failed_files(tmp_path, import_script):
+    conn = make_database(tmp_path)
+    module = import_script("csv_parsing_songs_update", "--csv-dir", ".", "--workers", "2")
+    mapping = ({"Title": "title", "Artist": "artist"}, {"Album": "album"})
+    write_csv(tmp_path / "a.csv", ["Title", "Artist", "Album"], [["Song One", "Artist A", "From A"]])
+    write_csv(tmp_path / "b.csv", ["Title", "Artist", "Album"],
+              [["Song One", "Artist A", "From B"], ["Song Two", "Artist B", "From B"]])
+
+    module.process_csv_batch([("missing.csv",) + mapping, ("a.csv",) + mapping, ("b.csv",) + mapping])
+
+    # Only empty fields are filled, so the first file in the list wins
+    assert albums(conn) == {"id1": "From A", "id2": "From B"}
+
+def test_existing_profile_is_not_overwritten(tmp_path, import_script):
+    module = import_script("csv_parsing_songs_update", "--csv-dir", ".")
+    assert module.save_profile("source", ["Title"], {"Title": "title"}, {})
+    assert not module.save_profile("source", ["Name"], {"Name": "title"}, {})
+    with open(tmp_path / module.args.profiles_file) as f:
+        assert json.load(f)["source"]["header"] == ["Title"]
+
+    module.args.overwrite_profile = True
+    assert module.save_profile("source", ["Name"], {"Name": "title"}, {})
+    with open(tmp_path / module.args.profiles_file) as f:
+        assert json.load(f)["source"]["header"] == ["Name"]
+
+def test_misspelled_title_gets_a_fuzzy_match(tmp_path, import_script):
+    conn = make_database(tmp_path)
+    module = import_script("csv_parsing_songs_update", "--csv-dir", ".", "--non-interactive")
+    write_csv(tmp_path / "a.csv", ["Title", "Artist", "Album"],
+              [["Song Twoo", "Artist B", "Second"], ["Other Song", "Artist B", "Unknown"]])
+
+    module.process_csv_batch([("a.csv", {"Title": "title", "Artist": "artist"}, {"Album": "album"})])
+
+    assert albums(conn) == {"id1": None, "id2": "Second"}
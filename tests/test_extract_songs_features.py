@@ -0,0 +1,21 @@
+import pandas as pd
+from extract_songs_features import read_file_chunks
+
+def read_valence(path, rows):
+    pd.DataFrame(rows, columns=["track_id", "track_name", "artists", "valence"]).to_csv(path, index=False)
+    return pd.concat(read_file_chunks(str(path)))["valence"].tolist()
+
+def test_single_outlier_is_nulled_not_rescaled(tmp_path):
+    valence = read_valence(tmp_path / "songs.csv",
+                           [["id1", "Song One", "Artist A", 0.7], ["id2", "Song Two", "Artist B", 0.2],
+                            ["id3", "Song Three", "Artist C", 70]])
+
+    assert valence[:2] == [0.7, 0.2]
+    assert pd.isna(valence[2])
+
+def test_percent_column_is_rescaled(tmp_path):
+    valence = read_valence(tmp_path / "songs.csv",
+                           [["id1", "Song One", "Artist A", 70], ["id2", "Song Two", "Artist B", 20],
+                            ["id3", "Song Three", "Artist C", 0.5]])
+
+    assert [round(value, 3) for value in valence] == [0.7, 0.2, 0.005]
@@ -0,0 +1,34 @@
+import sqlite3
+import http_client
+
+class FakeClient(http_client.HttpClient):
+    """HttpClient answering every call with the same body instead of the network"""
+
+    def send(self, method, url, params=None, **kwargs):
+        self.count('network')
+        return http_client.build_response(self.full_url(method, url, params), 200, "", b'{"ok": true}')
+
+def test_cache_key_has_no_credentials(tmp_path):
+    cache_file = tmp_path / "cache.db"
+    client = FakeClient(cache=http_client.ResponseCache(cache_file))
+
+    client.get("https://api.getsong.co/search/", params={"api_key": "secret1", "lookup": "song"})
+    client.get("https://api.getsong.co/search/", params={"api_key": "secret2", "lookup": "song"})
+
+    assert client.stats == {'network': 1, 'cache_hits': 1}
+    keys = [key for key, in sqlite3.connect(cache_file).execute("SELECT key FROM responses")]
+    assert keys == ["GET https://api.getsong.co/search/?api_key=REDACTED&lookup=song"]
+
+def test_entries_keyed_with_credentials_are_purged(tmp_path):
+    cache_file = tmp_path / "cache.db"
+    cache = http_client.ResponseCache(cache_file)
+    response = http_client.build_response("https://api.getsong.co/", 200, "", b"{}")
+    cache.put("GET https://api.getsong.co/search/?api_key=secret&lookup=song", "https://api.getsong.co/", response)
+    cache.put("GET https://api.getsong.co/search/?api_key=REDACTED&lookup=song", "https://api.getsong.co/", response)
+    cache.conn.close()
+
+    reopened = http_client.ResponseCache(cache_file)
+
+    keys = [key for key, in reopened.conn.execute("SELECT key FROM responses")]
+    assert keys == ["GET https://api.getsong.co/search/?api_key=REDACTED&lookup=song"]
+    assert reopened.total_bytes == 2
@@ -0,0 +1,22 @@
+import csv
+import os
+from song_matching import MatchIndex, evaluate_matches
+
+DATA_DIR = os.path.join(os.path.dirname(__file__), "data")
+
+def read_rows(name):
+    with open(os.path.join(DATA_DIR, name), newline="", encoding="utf-8") as f:
+        return list(csv.DictReader(f))
+
+def test_labeled_sample_precision_and_recall():
+    index = MatchIndex()
+    for row in read_rows("matching_catalog.csv"):
+        index.add(row["key"], row["title"], row["artist"])
+    labeled = [(row["title"], row["artist"], row["expected_key"] or None)
+               for row in read_rows("matching_labeled.csv")]
+
+    result = evaluate_matches(index, labeled)
+
+    assert (result["true_positives"], result["false_positives"], result["false_negatives"]) == (60, 0, 2)
+    assert round(result["precision"], 2) == 1.0
+    assert round(result["recall"], 2) == 0.97
@@ -0,0 +1,47 @@
+import json
+import sqlite3
+
+def make_databases(tmp_path, num_songs):
+    source = sqlite3.connect(tmp_path / "songs_master.db")
+    source.execute("CREATE TABLE songs_master_table (track_name TEXT, artist_name TEXT, "
+                   "danceability REAL, energy REAL, valence REAL)")
+    source.executemany("INSERT INTO songs_master_table VALUES (?, ?, 0.5, 0.6, 0.7)",
+                       [(f"Song {i}", "Artist") for i in range(num_songs)])
+    source.commit()
+    source.close()
+
+    target = sqlite3.connect(tmp_path / "music_weather.db")
+    target.execute("CREATE TABLE songs (spotify_id TEXT PRIMARY KEY, title TEXT, artist TEXT, "
+                   "danceability REAL, energy REAL, valence REAL)")
+    target.executemany("INSERT INTO songs (spotify_id, title, artist) VALUES (?, ?, 'Artist')",
+                       [(f"id{i:02d}", f"Song {i}") for i in range(num_songs)])
+    # Make the second batch (id02, id03) fail to commit
+    target.execute("""
+        CREATE TRIGGER fail_batch BEFORE UPDATE ON songs WHEN NEW.spotify_id = 'id03'
+        BEGIN SELECT RAISE(ABORT, 'forced failure'); END
+    """)
+    target.commit()
+    return target
+
+def updated_ids(target):
+    return [row[0] for row in target.execute(
+        "SELECT spotify_id FROM songs WHERE energy IS NOT NULL ORDER BY spotify_id")]
+
+def test_failed_batch_is_retried_on_resume(tmp_path, import_script):
+    target = make_databases(tmp_path, 6)
+    module = import_script("update_song_features", "--batch-size", "2")
+
+    module.update_song_features()
+
+    # The run stops at the failed batch and the checkpoint stays on the last committed one
+    assert updated_ids(target) == ["id00", "id01"]
+    with open(tmp_path / module.CHECKPOINT_FILE) as f:
+        assert json.load(f)["last_spotify_id"] == "id01"
+
+    target.execute("DROP TRIGGER fail_batch")
+    target.commit()
+    module.args.resume = True
+    module.update_song_features()
+
+    assert updated_ids(target) == [f"id{i:02d}" for i in range(6)]
+    assert not (tmp_path / module.CHECKPOINT_FILE).exists()
@@ -7,12 +7,19 @@ from selenium.webdriver.support.ui import WebDriverWait
 from selenium.webdriver.support import expected_conditions as EC
 from selenium.common.exceptions import TimeoutException
 from bs4 import BeautifulSoup
+from concurrent.futures import ThreadPoolExecutor, as_completed
+import hashlib
 import json
 import time
 import os
+import threading
 from datetime import datetime
 import logging
 import random
+import re
+import sqlite3
+import argparse
+from urllib.parse import quote
 from webdriver_manager.chrome import ChromeDriverManager
 
 # Set up logging
@@ -26,82 +33,233 @@ logging.basicConfig(
 )
 logger = logging.getLogger(__name__)
 
+BASE_URL = "https://tunebat.com"
+
+# Database connection
+DB_FILE = "music_weather.db"
+
+# Labels of the track page that describe the key/tempo rather than audio features
+MUSICAL_ATTRIBUTE_LABELS = ('key', 'bpm', 'camelot')
+
+_driver_path = None
+_driver_path_lock = threading.Lock()
+
+def get_driver_path():
+    """
+    Path of the ChromeDriver binary, installed once per process.
+    Set CHROMEDRIVER_PATH to skip webdriver_manager entirely.
+    """
+    global _driver_path
+    with _driver_path_lock:
+        if _driver_path is None:
+            _driver_path = os.getenv("CHROMEDRIVER_PATH") or ChromeDriverManager().install()
+        return _driver_path
+
+class PolitenessBudget:
+    """
+    Shared pacing of page loads across all tabs/drivers: at most `pages_per_minute`
+    navigations, each slot jittered by up to `jitter` seconds.
+    """
+
+    def __init__(self, pages_per_minute=20, jitter=1.0):
+        self.interval = 60.0 / pages_per_minute
+        self.jitter = jitter
+        self.next_slot = 0.0
+        self.lock = threading.Lock()
+
+    def wait(self):
+        with self.lock:
+            now = time.monotonic()
+            slot = max(now, self.next_slot) + random.uniform(0, self.jitter)
+            self.next_slot = slot + self.interval
+        if slot > now:
+            time.sleep(slot - now)
+
+class PageCache:
+    """
+    Track-page HTML cached on disk by URL, plus the search -> track URL mapping,
+    so pages can be parsed again offline.
+    """
+
+    def __init__(self, cache_dir='tunebat_cache'):
+        self.cache_dir = cache_dir
+        self.index_file = os.path.join(cache_dir, 'searches.json')
+        self.lock = threading.Lock()
+        os.makedirs(cache_dir, exist_ok=True)
+        self.searches = {}
+        if os.path.exists(self.index_file):
+            with open(self.index_file, 'r', encoding='utf-8') as f:
+                self.searches = json.load(f)
+
+    @staticmethod
+    def search_key(artist, song):
+        return f"{artist.strip().lower()}|{song.strip().lower()}"
+
+    def page_file(self, url):
+        return os.path.join(self.cache_dir, hashlib.sha1(url.encode('utf-8')).hexdigest() + '.html')
+
+    def get_search(self, artist, song):
+        """Cached track URL of a search, None if never searched"""
+        with self.lock:
+            entry = self.searches.get(self.search_key(artist, song))
+        return entry['url'] if entry else None
+
+    def put_search(self, artist, song, url):
+        with self.lock:
+            self.searches[self.search_key(artist, song)] = {'artist': artist, 'song': song, 'url': url}
+            tmp_file = f"{self.index_file}.tmp"
+            with open(tmp_file, 'w', encoding='utf-8') as f:
+                json.dump(self.searches, f, ensure_ascii=False)
+            os.replace(tmp_file, self.index_file)
+
+    def get_page(self, url):
+        path = self.page_file(url)
+        if not os.path.exists(path):
+            return None
+        with open(path, 'r', encoding='utf-8') as f:
+            return f.read()
+
+    def put_page(self, url, html):
+        with open(self.page_file(url), 'w', encoding='utf-8') as f:
+            f.write(html)
+
+    def entries(self):
+        """Cached searches as (artist, song, url) whose track page is cached too"""
+        with self.lock:
+            entries = list(self.searches.values())
+        return [(e['artist'], e['song'], e['url']) for e in entries
+                if e['url'] and os.path.exists(self.page_file(e['url']))]
+
+def parse_song_page(html, artist, song, url, scraped_date=None):
+    """
+    Extract song information from a Tunebat track page.
+    Works on live and cached pages alike, so selector changes only need a re-parse.
+    Returns None if the page has no song information.
+    """
+    soup = BeautifulSoup(html, 'html.parser')
+
+    song_data = {
+        "song_name": song,
+        "artist": artist,
+        "url": url,
+        "scraped_date": scraped_date or datetime.now().strftime("%Y-%m-%d %H:%M:%S"),
+        "musical_attributes": {},
+        "audio_features": {}
+    }
+
+    # Extract song information
+    info_divs = soup.find_all('div', class_='ant-row')
+    for div in info_divs:
+        label = div.find('div', class_='Label__LabelDiv-sc-15fxapi-0')
+        value = div.find('div', class_='Value__ValueDiv-sc-1zxzxfr-0')
+
+        if label and value:
+            label_text = label.get_text().strip().lower()
+            value_text = value.get_text().strip()
+
+            logger.debug(f"Found {label_text}: {value_text}")
+
+            # Categorize the information
+            if label_text in MUSICAL_ATTRIBUTE_LABELS:
+                song_data["musical_attributes"][label_text] = value_text
+            else:
+                song_data["audio_features"][label_text] = value_text
+
+    if not song_data["musical_attributes"] and not song_data["audio_features"]:
+        return None
+    return song_data
+
 class TunebatScraper:
-    def __init__(self):
+    def __init__(self, cache=None, budget=None, headless=False):
         # Set up Chrome options
         self.chrome_options = Options()
         self.chrome_options.add_argument("--window-size=1920,1080")
         self.chrome_options.add_argument("--disable-gpu")
         self.chrome_options.add_argument("--no-sandbox")
         self.chrome_options.add_argument("--disable-dev-shm-usage")
-        
+        if headless:
+            self.chrome_options.add_argument("--headless=new")
+
         # Add user agent
         self.chrome_options.add_argument("user-agent=Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/123.0.0.0 Safari/537.36")
-        
-        # Initialize the Chrome WebDriver
-        self.driver = webdriver.Chrome(
-            service=Service(ChromeDriverManager().install()),
-            options=self.chrome_options
-        )
-        
-        self.base_url = "https://tunebat.com"
-        
+
+        # The browser is only started when a page is not cached
+        self.driver = None
+        self.wait = None
+
+        self.base_url = BASE_URL
+        self.cache = cache if cache is not None else PageCache()
+        self.budget = budget if budget is not None else PolitenessBudget()
+
         # Create data directory if it doesn't exist
         if not os.path.exists('tunebat_data'):
             os.makedirs('tunebat_data')
-            
-        # Set up WebDriverWait
-        self.wait = WebDriverWait(self.driver, 10)
 
-    def _random_delay(self):
-        """Add a random delay between actions"""
-        time.sleep(random.uniform(2, 4))
+    def _start_driver(self):
+        """Start Chrome with the once-installed ChromeDriver"""
+        if self.driver is None:
+            self.driver = webdriver.Chrome(
+                service=Service(get_driver_path()),
+                options=self.chrome_options
+            )
+            # Set up WebDriverWait
+            self.wait = WebDriverWait(self.driver, 10)
 
-    def _scroll_page(self):
-        """Scroll the page to simulate human behavior"""
-        self.driver.execute_script("window.scrollTo(0, document.body.scrollHeight / 2);")
-        time.sleep(1)
-        self.driver.execute_script("window.scrollTo(0, 0);")
+    def _load(self, url):
+        """Navigate to a URL within the shared politeness budget"""
+        self._start_driver()
+        self.budget.wait()
+        self.driver.get(url)
 
     def search_song(self, artist, song):
-        """Search for a song on Tunebat"""
+        """Search for a song on Tunebat, returns the URL of the first track result"""
+        cached_url = self.cache.get_search(artist, song)
+        if cached_url:
+            return cached_url
+
         try:
             # Format search URL
-            search_query = f"{song} {artist}".replace(' ', '%20')
-            search_url = f"{self.base_url}/Search?q={search_query}"
-            
+            search_url = f"{self.base_url}/Search?q={quote(f'{song} {artist}')}"
+
             logger.info(f"Searching for: {search_url}")
-            print(f"Searching for: {search_url}")
-            
-            # Navigate to the search URL
-            self.driver.get(search_url)
-            
-            # Wait for page to load and add random delay
-            self._random_delay()
-            
-            # Scroll the page
-            self._scroll_page()
-            
+            self._load(search_url)
+
             # Wait for search results to be present
             try:
                 search_results = self.wait.until(
                     EC.presence_of_all_elements_located((By.CSS_SELECTOR, "a[href*='/Track/']"))
                 )
-                
-                if search_results:
-                    # Click the first result
-                    search_results[0].click()
-                    self._random_delay()
-                    return self.driver.current_url
-                
             except TimeoutException:
                 logger.warning("No search results found")
                 return None
-            
+
+            song_url = search_results[0].get_attribute('href')
+            self.cache.put_search(artist, song, song_url)
+            return song_url
+
         except Exception as e:
             logger.error(f"Error searching for {song} by {artist}: {str(e)}")
             return None
 
+    def get_page(self, url):
+        """HTML of a track page, from the page cache or the browser"""
+        html = self.cache.get_page(url)
+        if html is not None:
+            return html
+
+        self._load(url)
+        try:
+            self.wait.until(
+                EC.presence_of_element_located((By.CLASS_NAME, "ant-row"))
+            )
+        except TimeoutException:
+            logger.warning("Could not find song information")
+            return None
+
+        html = self.driver.page_source
+        self.cache.put_page(url, html)
+        return html
+
     def get_song_info(self, artist, song):
         """Get detailed information about a song"""
         try:
@@ -111,52 +269,12 @@ class TunebatScraper:
                 raise Exception("Song not found")
 
             logger.info(f"Getting song info from: {song_url}")
-            print(f"Getting song info from: {song_url}")
-
-            # Wait for the page to load
-            self._random_delay()
-            
-            # Initialize song data dictionary
-            song_data = {
-                "song_name": song,
-                "artist": artist,
-                "url": song_url,
-                "scraped_date": datetime.now().strftime("%Y-%m-%d %H:%M:%S"),
-                "musical_attributes": {},
-                "audio_features": {}
-            }
-
-            # Wait for the information to be present
-            try:
-                self.wait.until(
-                    EC.presence_of_element_located((By.CLASS_NAME, "ant-row"))
-                )
-            except TimeoutException:
-                logger.warning("Could not find song information")
+
+            html = self.get_page(song_url)
+            if html is None:
                 return None
 
-            # Get page source and parse with BeautifulSoup
-            soup = BeautifulSoup(self.driver.page_source, 'html.parser')
-            
-            # Extract song information
-            info_divs = soup.find_all('div', class_='ant-row')
-            for div in info_divs:
-                label = div.find('div', class_='Label__LabelDiv-sc-15fxapi-0')
-                value = div.find('div', class_='Value__ValueDiv-sc-1zxzxfr-0')
-                
-                if label and value:
-                    label_text = label.get_text().strip().lower()
-                    value_text = value.get_text().strip()
-                    
-                    print(f"Found {label_text}: {value_text}")
-                    
-                    # Categorize the information
-                    if label_text in ['key', 'bpm', 'camelot']:
-                        song_data["musical_attributes"][label_text] = value_text
-                    else:
-                        song_data["audio_features"][label_text] = value_text
-
-            return song_data
+            return parse_song_page(html, artist, song, song_url)
 
         except Exception as e:
             logger.error(f"Error getting info for {song} by {artist}: {str(e)}")
@@ -168,10 +286,10 @@ class TunebatScraper:
             try:
                 filename = f"{song_data['artist'].replace(' ', '_')}_{song_data['song_name'].replace(' ', '_')}.json"
                 filepath = os.path.join(output_dir, filename)
-                
+
                 with open(filepath, 'w', encoding='utf-8') as f:
                     json.dump(song_data, f, indent=2, ensure_ascii=False)
-                
+
                 logger.info(f"Saved data to {filepath}")
                 return filepath
             except Exception as e:
@@ -183,47 +301,343 @@ class TunebatScraper:
         """Close the browser"""
         if self.driver:
             self.driver.quit()
+            self.driver = None
+
+class TunebatScraperPool:
+    """
+    Scrape many songs concurrently with one browser per worker, all sharing
+    one page cache and one politeness budget. Cached songs never start a browser.
+    """
+
+    def __init__(self, workers=3, pages_per_minute=20, cache_dir='tunebat_cache', headless=True):
+        self.workers = workers
+        self.cache = PageCache(cache_dir)
+        self.budget = PolitenessBudget(pages_per_minute)
+        self.headless = headless
+        self.local = threading.local()
+        self.scrapers = []
+        self.lock = threading.Lock()
+
+    def _scraper(self):
+        """The calling thread's scraper"""
+        scraper = getattr(self.local, 'scraper', None)
+        if scraper is None:
+            scraper = TunebatScraper(cache=self.cache, budget=self.budget, headless=self.headless)
+            self.local.scraper = scraper
+            with self.lock:
+                self.scrapers.append(scraper)
+        return scraper
+
+    def _scrape(self, song_info):
+        return song_info, self._scraper().get_song_info(song_info['artist'], song_info['song'])
+
+    def scrape(self, songs_to_scrape):
+        """
+        Scrape a list of {"artist", "song"} dictionaries.
+        Yields (song_info, song_data) in completion order, not input order, so a slow
+        page does not hold back the others; song_data is None on failure.
+        """
+        with ThreadPoolExecutor(max_workers=self.workers) as executor:
+            futures = [executor.submit(self._scrape, song_info) for song_info in songs_to_scrape]
+            for future in as_completed(futures):
+                yield future.result()
+
+    def close(self):
+        """Close every browser"""
+        for scraper in self.scrapers:
+            scraper.close()
+        self.scrapers = []
+
+def reparse_cache(cache_dir='tunebat_cache'):
+    """Parse every cached track page again, without browsing. Returns the list of song data."""
+    cache = PageCache(cache_dir)
+    results = []
+    for artist, song, url in cache.entries():
+        song_data = parse_song_page(cache.get_page(url), artist, song, url)
+        if song_data:
+            results.append(song_data)
+    return results
+
+# Tunebat's 0-100 features, stored on the 0-1 scale of the Spotify columns
+PERCENT_FEATURES = ('energy', 'danceability', 'happiness', 'acousticness',
+                    'instrumentalness', 'liveness', 'speechiness')
+
+def parse_number(text):
+    """First number in a value such as '128', '-5 dB' or '65%', None if there is none"""
+    match = re.search(r'-?\d+(?:\.\d+)?', text or '')
+    return float(match.group()) if match else None
+
+def parse_duration(text):
+    """'3:25' -> 205 seconds"""
+    parts = (text or '').strip().split(':')
+    if len(parts) < 2 or not all(part.isdigit() for part in parts):
+        return None
+    seconds = 0
+    for part in parts:
+        seconds = seconds * 60 + int(part)
+    return seconds
+
+def to_feature_row(spotify_id, song_data):
+    """Typed tunebat_features row of a scraped song"""
+    attributes = song_data['musical_attributes']
+    features = song_data['audio_features']
+
+    key_name, mode = attributes.get('key'), None
+    if key_name:
+        key_parts = key_name.rsplit(' ', 1)
+        if len(key_parts) == 2 and key_parts[1].lower() in ('major', 'minor'):
+            key_name, mode = key_parts[0], key_parts[1].lower()
+
+    bpm = parse_number(attributes.get('bpm'))
+    row = {
+        'spotify_id': spotify_id,
+        'url': song_data['url'],
+        'song_key': key_name,
+        'mode': mode,
+        'camelot': attributes.get('camelot'),
+        'bpm': int(round(bpm)) if bpm is not None else None,
+        'loudness': parse_number(features.get('loudness')),
+        'popularity': parse_number(features.get('popularity')),
+        'duration_sec': parse_duration(features.get('duration')),
+        'scraped_at': song_data['scraped_date'],
+    }
+    for name in PERCENT_FEATURES:
+        value = parse_number(features.get(name))
+        row[name] = value / 100 if value is not None else None
+    return row
+
+FEATURE_COLUMNS = ('spotify_id', 'url', 'song_key', 'mode', 'camelot', 'bpm', 'loudness',
+                   'popularity', 'duration_sec', 'scraped_at') + PERCENT_FEATURES
+
+def create_tables(cursor):
+    """
+    Creates the 'tunebat_queue' progress table and the 'tunebat_features' table
+    of typed values scraped from Tunebat, one row per song.
+    """
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS tunebat_queue (
+            spotify_id TEXT PRIMARY KEY REFERENCES songs(spotify_id),
+            status TEXT NOT NULL DEFAULT 'pending',
+            attempts INTEGER NOT NULL DEFAULT 0,
+            updated_at TEXT
+        )
+    """)
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_tunebat_queue_status ON tunebat_queue(status)")
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS tunebat_features (
+            spotify_id TEXT PRIMARY KEY REFERENCES songs(spotify_id),
+            url TEXT,
+            song_key TEXT,
+            mode TEXT,
+            camelot TEXT,
+            bpm INTEGER,
+            energy FLOAT,
+            danceability FLOAT,
+            happiness FLOAT,
+            acousticness FLOAT,
+            instrumentalness FLOAT,
+            liveness FLOAT,
+            speechiness FLOAT,
+            loudness FLOAT,
+            popularity INTEGER,
+            duration_sec INTEGER,
+            scraped_at TEXT
+        )
+    """)
+
+def enqueue_songs(conn):
+    """Queue songs missing a key, BPM or energy that are not queued yet, returns how many were added"""
+    with conn:
+        cursor = conn.execute("""
+            INSERT OR IGNORE INTO tunebat_queue (spotify_id, updated_at)
+            SELECT s.spotify_id, datetime('now') FROM songs s
+            LEFT JOIN tunebat_features t ON t.spotify_id = s.spotify_id
+            WHERE s.bpm IS NULL OR s.energy IS NULL OR t.song_key IS NULL
+        """)
+    return cursor.rowcount
+
+def save_results(conn, results, update_queue=True):
+    """
+    Bulk-upsert scraped songs into tunebat_features, fill the songs' missing
+    bpm/energy/danceability/valence and mark the queue (unless update_queue is False),
+    all in one transaction. `results` is a list of (spotify_id, song_data or None).
+    """
+    rows = [to_feature_row(spotify_id, song_data) for spotify_id, song_data in results if song_data]
+    columns = ', '.join(FEATURE_COLUMNS)
+    placeholders = ', '.join(f':{name}' for name in FEATURE_COLUMNS)
+    updates = ', '.join(f'{name} = excluded.{name}' for name in FEATURE_COLUMNS if name != 'spotify_id')
+    with conn:
+        conn.executemany(f"""
+            INSERT INTO tunebat_features ({columns}) VALUES ({placeholders})
+            ON CONFLICT(spotify_id) DO UPDATE SET {updates}
+        """, rows)
+        conn.executemany("""
+            UPDATE songs SET
+                bpm = COALESCE(bpm, :bpm),
+                energy = COALESCE(energy, :energy),
+                danceability = COALESCE(danceability, :danceability),
+                valence = COALESCE(valence, :happiness)
+            WHERE spotify_id = :spotify_id
+        """, rows)
+        if not update_queue:
+            return len(rows)
+        conn.executemany("""
+            UPDATE tunebat_queue
+            SET status = ?, attempts = attempts + 1, updated_at = datetime('now')
+            WHERE spotify_id = ?
+        """, [('done' if song_data else 'error', spotify_id) for spotify_id, song_data in results])
+    return len(rows)
+
+def scrape_catalog(db_file=DB_FILE, workers=3, pages_per_minute=20, batch_size=50,
+                   limit=0, max_attempts=3, cache_dir='tunebat_cache', headless=True):
+    """
+    Scrape Tunebat for every queued song with the scraper pool and store the results.
+    Results are committed every batch_size songs together with the queue status, so an
+    interrupted run resumes where it stopped; failed songs are retried on later runs
+    up to max_attempts. Returns a dictionary of counts.
+    """
+    conn = sqlite3.connect(db_file)
+    pool = None
+    counts = {'songs': 0, 'saved': 0, 'failed': 0}
+    try:
+        create_tables(conn.cursor())
+        conn.commit()
+        logger.info(f"Queued {enqueue_songs(conn)} new songs")
+
+        query = """
+            SELECT q.spotify_id, s.title, s.artist
+            FROM tunebat_queue q JOIN songs s ON s.spotify_id = q.spotify_id
+            WHERE q.status = 'pending' OR (q.status = 'error' AND q.attempts < ?)
+            ORDER BY q.spotify_id
+        """
+        if limit:
+            query += f" LIMIT {int(limit)}"
+        pending = conn.execute(query, (max_attempts,)).fetchall()
+        counts['songs'] = len(pending)
+        logger.info(f"{len(pending)} songs to scrape from Tunebat")
+
+        pool = TunebatScraperPool(workers=workers, pages_per_minute=pages_per_minute,
+                                  cache_dir=cache_dir, headless=headless)
+        songs_to_scrape = [{'spotify_id': spotify_id, 'artist': artist, 'song': title}
+                           for spotify_id, title, artist in pending]
+        results = []
+        for i, (song_info, song_data) in enumerate(pool.scrape(songs_to_scrape), 1):
+            results.append((song_info['spotify_id'], song_data))
+            if len(results) >= batch_size or i == len(songs_to_scrape):
+                saved = save_results(conn, results)
+                counts['saved'] += saved
+                counts['failed'] += len(results) - saved
+                results = []
+                logger.info(f"Scraped {i}/{len(songs_to_scrape)} songs")
+    except sqlite3.Error as e:
+        logger.error(f"Database error: {e}")
+    finally:
+        if pool:
+            pool.close()
+        conn.close()
+
+    logger.info(f"Tunebat batch complete. Saved: {counts['saved']}, Failed: {counts['failed']}")
+    return counts
+
+def reparse_catalog(db_file=DB_FILE, cache_dir='tunebat_cache'):
+    """
+    Parse every cached track page again and refresh tunebat_features, without browsing.
+    Pages are matched back to songs by the artist and title they were searched with;
+    the scrape queue is left as it is. Returns the number of songs saved.
+    """
+    conn = sqlite3.connect(db_file)
+    saved = 0
+    try:
+        create_tables(conn.cursor())
+        conn.commit()
+        spotify_ids = {PageCache.search_key(artist, title): spotify_id
+                       for spotify_id, title, artist in conn.execute("SELECT spotify_id, title, artist FROM songs")
+                       if title and artist}
+        results = []
+        pages = reparse_cache(cache_dir)
+        for song_data in pages:
+            spotify_id = spotify_ids.get(PageCache.search_key(song_data['artist'], song_data['song_name']))
+            if spotify_id:
+                results.append((spotify_id, song_data))
+        saved = save_results(conn, results, update_queue=False)
+        logger.info(f"Re-parsed {len(pages)} cached pages, saved {saved} songs")
+    except sqlite3.Error as e:
+        logger.error(f"Database error: {e}")
+    finally:
+        conn.close()
+    return saved
+
+def parse_args():
+    parser = argparse.ArgumentParser(description='Scrape song keys, BPM and audio features from Tunebat')
+    parser.add_argument('--batch', action='store_true',
+                        help='Scrape every song of the database missing a key, BPM or energy')
+    parser.add_argument('--workers', type=int, default=3,
+                        help='Number of concurrent browsers (default: 3)')
+    parser.add_argument('--pages-per-minute', type=float, default=20,
+                        help='Most page loads per minute, across all browsers (default: 20)')
+    parser.add_argument('--batch-size', type=int, default=50,
+                        help='Songs per database commit (default: 50)')
+    parser.add_argument('--limit', type=int, default=0,
+                        help='Limit the number of songs to scrape (default: 0, meaning no limit)')
+    parser.add_argument('--max-attempts', type=int, default=3,
+                        help='Give up on a song after this many failed scrapes (default: 3)')
+    parser.add_argument('--show-browser', action='store_true',
+                        help='Run the batch browsers with a visible window')
+    parser.add_argument('--reparse-cache', action='store_true',
+                        help='Parse the cached track pages again and refresh tunebat_features, without browsing')
+    return parser.parse_args()
 
 def main():
+    args = parse_args()
+    if args.reparse_cache:
+        reparse_catalog()
+        return
+
+    if args.batch:
+        scrape_catalog(workers=args.workers, pages_per_minute=args.pages_per_minute,
+                       batch_size=args.batch_size, limit=args.limit,
+                       max_attempts=args.max_attempts, headless=not args.show_browser)
+        return
+
     scraper = None
     try:
         # Initialize scraper
         scraper = TunebatScraper()
-        
+
         # Example songs to scrape
         songs_to_scrape = [
             {"artist": "Rod Wave", "song": "25"}
         ]
-        
+
         for song_info in songs_to_scrape:
             print(f"\nScraping data for '{song_info['song']}' by {song_info['artist']}...")
-            
+
             # Get song information
             song_data = scraper.get_song_info(song_info['artist'], song_info['song'])
-            
+
             if song_data:
                 # Save to file
                 saved_file = scraper.save_song_info(song_data)
                 if saved_file:
                     print(f"Data saved to: {saved_file}")
-                    
+
                     # Print some key information
                     print("\nKey Information:")
                     if "musical_attributes" in song_data:
                         for key, value in song_data["musical_attributes"].items():
                             print(f"{key.upper()}: {value}")
-                    
+
                     print("\nAudio Features:")
                     if "audio_features" in song_data:
                         for key, value in song_data["audio_features"].items():
                             print(f"{key.title()}: {value}")
             else:
                 print(f"Failed to get data for {song_info['song']} by {song_info['artist']}")
-    
+
     finally:
         # Make sure to close the browser
         if scraper:
             scraper.close()
 
 if __name__ == "__main__":
-    main()
\ No newline at end of file
+    main()
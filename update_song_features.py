@@ -1,7 +1,10 @@
 import sqlite3
 import argparse
 import logging
+import json
+import os
 from logger_config import get_script_logger
+from song_matching import normalize_title, normalize_artist
 
 # Parse command line arguments
 parser = argparse.ArgumentParser(description='Update song features from master database')
@@ -13,6 +16,10 @@ parser.add_argument('--batch-size',
                     type=int,
                     default=1000,
                     help='Number of songs to process in each batch (default: 1000)')
+parser.add_argument('--resume', action='store_true',
+                    help='Resume after the last committed batch of a previous run')
+parser.add_argument('--set-based', action='store_true',
+                    help='ATTACH the master database and match/update in SQL in one transaction')
 args = parser.parse_args()
 
 # Convert string log level to logging constant
@@ -25,6 +32,31 @@ logger = get_script_logger('update_song_features', level=log_level)
 SOURCE_DB = "songs_master.db"
 TARGET_DB = "music_weather.db"
 
+# Last spotify_id committed to the target database
+CHECKPOINT_FILE = "update_song_features_checkpoint.json"
+
+def load_checkpoint():
+    """Load the last committed spotify_id, None if there is no checkpoint"""
+    if os.path.exists(CHECKPOINT_FILE):
+        try:
+            with open(CHECKPOINT_FILE, 'r') as f:
+                return json.load(f).get('last_spotify_id')
+        except (OSError, ValueError):
+            logger.error(f"Could not read checkpoint file {CHECKPOINT_FILE}, starting from the beginning")
+    return None
+
+def save_checkpoint(spotify_id):
+    """Persist the last committed spotify_id"""
+    tmp_file = f"{CHECKPOINT_FILE}.tmp"
+    with open(tmp_file, 'w') as f:
+        json.dump({'last_spotify_id': spotify_id}, f)
+    os.replace(tmp_file, CHECKPOINT_FILE)
+
+def clear_checkpoint():
+    """Remove the checkpoint once a run completes"""
+    if os.path.exists(CHECKPOINT_FILE):
+        os.remove(CHECKPOINT_FILE)
+
 class Statistics:
     def __init__(self):
         self.total_processed = 0
@@ -46,6 +78,39 @@ class Statistics:
             logger.warning(f"Match rate: {match_rate:.2f}%")
         logger.warning("=" * 50)
 
+def build_master_index(source_cursor):
+    """
+    Load the master table into in-memory hash indexes in a single scan.
+    Returns two dictionaries mapping to (danceability, energy, valence):
+    1. (normalized title, normalized artist) -> features
+    2. normalized title -> features
+    The first row seen for a key wins, matching the old per-song SELECT.
+    """
+    by_title_artist = {}
+    by_title = {}
+    source_cursor.execute("""
+        SELECT track_name, artist_name, danceability, energy, valence
+        FROM songs_master_table
+    """)
+    for track_name, artist_name, danceability, energy, valence in source_cursor:
+        title_key = normalize_title(track_name)
+        if not title_key:
+            continue
+        features = (danceability, energy, valence)
+        by_title.setdefault(title_key, features)
+        by_title_artist.setdefault((title_key, normalize_artist(artist_name)), features)
+    logger.warning(f"Indexed {len(by_title)} titles and {len(by_title_artist)} title/artist pairs from the master table")
+    return by_title_artist, by_title
+
+def find_features(master_index, title, artist):
+    """Look up a song by title and artist, falling back to title only"""
+    by_title_artist, by_title = master_index
+    title_key = normalize_title(title)
+    result = by_title_artist.get((title_key, normalize_artist(artist)))
+    if result is None:
+        result = by_title.get(title_key)
+    return result
+
 def update_song_features():
     """Update song features from master database to target database"""
     stats = Statistics()
@@ -61,43 +126,52 @@ def update_song_features():
         logger.warning(f"Connected to source database: {SOURCE_DB}")
         logger.warning(f"Connected to target database: {TARGET_DB}")
         
-        # Get count of songs in target database
-        target_cursor.execute("SELECT COUNT(*) FROM songs")
+        # Load the master table once instead of querying it per song
+        master_index = build_master_index(source_cursor)
+        
+        # Start after the last committed key when resuming
+        last_key = load_checkpoint() if args.resume else None
+        if last_key is not None:
+            logger.warning(f"Resuming after spotify_id {last_key}")
+        
+        # Get count of songs left to process in target database
+        target_cursor.execute("SELECT COUNT(*) FROM songs WHERE spotify_id > ?", (last_key or "",))
         total_songs = target_cursor.fetchone()[0]
-        logger.warning(f"Found {total_songs} songs in the target database")
+        logger.warning(f"Found {total_songs} songs to process in the target database")
         
-        # Track statistics
-        updated_count = 0
-        not_found_count = 0
         batch_size = args.batch_size
+        total_batches = (total_songs + batch_size - 1)//batch_size
+        batch_num = 0
+        processed = 0
         
-        # Process songs in batches
-        for offset in range(0, total_songs, args.batch_size):
-            batch_num = offset//args.batch_size + 1
-            total_batches = (total_songs + args.batch_size - 1)//args.batch_size
-            logger.warning(f"Processing batch {batch_num} of {total_batches}")
-            
+        # Process songs in batches, paging on spotify_id so each batch is an index range scan
+        while True:
             # Get a batch of songs from the target database
-            target_cursor.execute("SELECT spotify_id, title FROM songs LIMIT ? OFFSET ?", 
-                                (args.batch_size, offset))
+            target_cursor.execute("""
+                SELECT spotify_id, title, artist FROM songs
+                WHERE spotify_id > ?
+                ORDER BY spotify_id
+                LIMIT ?
+            """, (last_key or "", batch_size))
             target_songs = target_cursor.fetchall()
+            if not target_songs:
+                break
+            
+            batch_num += 1
+            processed += len(target_songs)
+            logger.warning(f"Processing batch {batch_num} of {max(total_batches, batch_num)}")
             
             # Collect updates to perform in bulk
             updates = []
             
             # Process each song from the target database
-            for spotify_id, title in target_songs:
+            for spotify_id, title, artist in target_songs:
                 stats.total_processed += 1
                 logger.debug(f"Processing: {title}")
                 
                 try:
-                    # Find matching song in source database by title
-                    source_cursor.execute("""
-                        SELECT danceability, energy, valence 
-                        FROM songs_master_table 
-                        WHERE track_name = ?
-                    """, (title,))
-                    result = source_cursor.fetchone()
+                    # Find matching song in the master index
+                    result = find_features(master_index, title, artist)
                     
                     if result:
                         stats.matches_found += 1
@@ -113,6 +187,7 @@ def update_song_features():
                     logger.error(f"Error processing song {title}: {e}")
             
             # Perform bulk update for this batch if there are any updates
+            batch_committed = True
             if updates:
                 try:
                     target_cursor.executemany("""
@@ -122,16 +197,29 @@ def update_song_features():
                     """, updates)
                     target_conn.commit()  # Commit after each batch
                     stats.updates_performed += len(updates)
-                    logger.warning(f"Batch {batch_num}/{total_batches} update completed. "
-                                 f"Progress: {min(offset + args.batch_size, total_songs)}/{total_songs} songs")
+                    logger.warning(f"Batch {batch_num}/{max(total_batches, batch_num)} update completed. "
+                                 f"Progress: {processed}/{max(total_songs, processed)} songs")
                 except Exception as e:
                     stats.errors += 1
+                    batch_committed = False
+                    target_conn.rollback()
                     logger.error(f"Error performing batch update: {e}")
             
+            # Stop at the first failed batch so the checkpoint never moves past it
+            # and --resume retries it; later batches are not attempted
+            if not batch_committed:
+                logger.error(f"Stopping after failed batch {batch_num}, rerun with --resume to retry it")
+                break
+            last_key = target_songs[-1][0]
+            save_checkpoint(last_key)
+            
             # Print intermediate statistics every 5 batches
             if batch_num % 5 == 0:
                 stats.print_summary()
         
+        if stats.errors == 0:
+            clear_checkpoint()
+        
         # Print final statistics
         stats.print_summary()
         
@@ -148,6 +236,86 @@ def update_song_features():
         # Print final statistics even if there was an error
         stats.print_summary()
 
+def update_song_features_set_based():
+    """
+    Update song features with set-based SQL on an ATTACHed master database.
+    Matching follows find_features: normalized title and artist first, then title only,
+    the first master row winning. Everything runs in one transaction on the target database.
+    """
+    stats = Statistics()
+    
+    try:
+        target_conn = sqlite3.connect(TARGET_DB)
+        target_conn.create_function("normalize_title", 1, normalize_title, deterministic=True)
+        target_conn.create_function("normalize_artist", 1, normalize_artist, deterministic=True)
+        target_conn.execute("ATTACH DATABASE ? AS master", (SOURCE_DB,))
+        logger.warning(f"Attached source database {SOURCE_DB} to {TARGET_DB}")
+        
+        # Tables built by extract_songs_features store the normalized keys already
+        master_columns = [row[1] for row in target_conn.execute("PRAGMA master.table_info(songs_master_table)")]
+        if "track_name_norm" in master_columns and "artist_name_norm" in master_columns:
+            title_expr, artist_expr = "track_name_norm", "COALESCE(artist_name_norm, '')"
+        else:
+            title_expr, artist_expr = "normalize_title(track_name)", "normalize_artist(artist_name)"
+        
+        with target_conn:
+            # Normalized, indexed copy of the master keys
+            target_conn.execute(f"""
+                CREATE TEMP TABLE master_keys AS
+                SELECT rowid AS master_rowid,
+                       {title_expr} AS title_key,
+                       {artist_expr} AS artist_key
+                FROM master.songs_master_table
+                WHERE {title_expr} != ''
+            """)
+            target_conn.execute("CREATE INDEX temp.idx_master_keys ON master_keys(title_key, artist_key, master_rowid)")
+            
+            # Resolve every target song to a master row (NULL when not found)
+            target_conn.execute("""
+                CREATE TEMP TABLE feature_matches AS
+                SELECT s.spotify_id,
+                       COALESCE(
+                           (SELECT MIN(k.master_rowid) FROM master_keys k
+                            WHERE k.title_key = normalize_title(s.title)
+                              AND k.artist_key = normalize_artist(s.artist)),
+                           (SELECT MIN(k.master_rowid) FROM master_keys k
+                            WHERE k.title_key = normalize_title(s.title))
+                       ) AS master_rowid
+                FROM songs s
+            """)
+            
+            stats.total_processed, stats.matches_found = target_conn.execute("""
+                SELECT COUNT(*), COUNT(master_rowid) FROM feature_matches
+            """).fetchone()
+            stats.not_found = stats.total_processed - stats.matches_found
+            
+            cursor = target_conn.execute("""
+                UPDATE songs
+                SET danceability = m.danceability,
+                    energy = m.energy,
+                    valence = m.valence
+                FROM feature_matches f
+                JOIN master.songs_master_table m ON m.rowid = f.master_rowid
+                WHERE songs.spotify_id = f.spotify_id
+            """)
+            stats.updates_performed = cursor.rowcount
+            
+            target_conn.execute("DROP TABLE temp.feature_matches")
+            target_conn.execute("DROP TABLE temp.master_keys")
+        
+    except Exception as e:
+        stats.errors += 1
+        logger.error(f"Error: {e}", exc_info=True)
+    finally:
+        if 'target_conn' in locals():
+            target_conn.close()
+        logger.warning("Database connections closed")
+        
+        stats.print_summary()
+
 if __name__ == "__main__":
     logger.warning("Starting song feature update process")
-    update_song_features() 
\ No newline at end of file
+    if args.set_based:
+        update_song_features_set_based()
+    else:
+        update_song_features() 
\ No newline at end of file
@@ -1,12 +1,13 @@
 import sqlite3
 import os
-import requests
-import base64
 import logging
 import argparse
 import json
+from concurrent.futures import ThreadPoolExecutor
 from dotenv import load_dotenv
 from logger_config import get_script_logger
+from spotify_client import SpotifyClient
+from song_matching import is_approximate_match, normalize_artist
 
 # Parse command line arguments
 parser = argparse.ArgumentParser(description='Update song information from Spotify API')
@@ -18,6 +19,12 @@ parser.add_argument('--batch-size', type=int, default=50,
                     help='Number of songs to process in each batch (default: 50)')
 parser.add_argument('--sample', action='store_true',
                     help='Print sample API responses and exit')
+parser.add_argument('--artist-ttl-days', type=float, default=30,
+                    help='Re-fetch cached artist genres older than this many days (default: 30)')
+parser.add_argument('--max-concurrency', type=int, default=8,
+                    help='Most Spotify requests in flight, lowered automatically when throttled (default: 8). '
+                         'Each request carries up to 50 IDs, so a batch only sends requests concurrently '
+                         'when --batch-size is above 50')
 args = parser.parse_args()
 
 # Convert string log level to logging constant
@@ -32,26 +39,6 @@ logger = get_script_logger('update_song_info', level=log_level)
 # Database connection
 DB_FILE = "music_weather.db"
 
-def get_spotify_access_token():
-    """Get Spotify API access token using client credentials flow"""
-    client_id = os.getenv("MUSIC_CLIENT_ID")
-    client_secret = os.getenv("MUSIC_CLIENT_SECRET")
-    
-    if not client_id or not client_secret:
-        raise Exception("Missing Spotify API credentials in .env file")
-    
-    auth_url = "https://accounts.spotify.com/api/token"
-    auth_headers = {
-        "Authorization": "Basic " + base64.b64encode(f"{client_id}:{client_secret}".encode()).decode(),
-    }
-    auth_data = {"grant_type": "client_credentials"}
-    auth_response = requests.post(auth_url, headers=auth_headers, data=auth_data)
-    
-    if auth_response.status_code != 200:
-        raise Exception(f"Failed to get access token: {auth_response.text}")
-    
-    return auth_response.json().get("access_token")
-
 def print_sample_responses():
     """Print sample API responses for demonstration"""
     try:
@@ -59,8 +46,7 @@ def print_sample_responses():
         conn = sqlite3.connect(DB_FILE)
         cursor = conn.cursor()
         
-        # Get Spotify access token
-        access_token = get_spotify_access_token()
+        client = SpotifyClient(logger=logger)
         
         # Get one song from the database
         cursor.execute("SELECT spotify_id, title, artist FROM songs LIMIT 1")
@@ -75,8 +61,7 @@ def print_sample_responses():
         
         # Get track info
         url = f"https://api.spotify.com/v1/tracks/{spotify_id}"
-        headers = {"Authorization": f"Bearer {access_token}"}
-        response = requests.get(url, headers=headers)
+        response = client.get(url)
         
         if response.status_code == 200:
             track_data = response.json()
@@ -87,7 +72,7 @@ def print_sample_responses():
             artist_id = track_data.get("artists", [{}])[0].get("id")
             if artist_id:
                 artist_url = f"https://api.spotify.com/v1/artists/{artist_id}"
-                artist_response = requests.get(artist_url, headers=headers)
+                artist_response = client.get(artist_url)
                 if artist_response.status_code == 200:
                     artist_data = artist_response.json()
                     print("\nArtist API Response:")
@@ -97,7 +82,7 @@ def print_sample_responses():
             album_id = track_data.get("album", {}).get("id")
             if album_id:
                 album_url = f"https://api.spotify.com/v1/albums/{album_id}"
-                album_response = requests.get(album_url, headers=headers)
+                album_response = client.get(album_url)
                 if album_response.status_code == 200:
                     album_data = album_response.json()
                     print("\nAlbum API Response:")
@@ -111,19 +96,46 @@ def print_sample_responses():
         if conn:
             conn.close()
 
-def get_track_info(track_id, access_token):
-    """Get track information including album, release date, and genres using Spotify API"""
-    url = f"https://api.spotify.com/v1/tracks/{track_id}"
-    headers = {"Authorization": f"Bearer {access_token}"}
-    
-    response = requests.get(url, headers=headers)
-    
-    if response.status_code != 200:
-        logger.error(f"Error getting track info for {track_id}: {response.text}")
-        return None
-    
-    track_data = response.json()
-    
+# Spotify accepts up to 50 IDs per /v1/tracks and /v1/artists request
+SPOTIFY_API_URL = "https://api.spotify.com/v1"
+MAX_IDS_PER_REQUEST = 50
+
+def chunked(items, size):
+    """Split a list into consecutive chunks of at most size items"""
+    for i in range(0, len(items), size):
+        yield items[i:i + size]
+
+def get_several(endpoint, ids, client):
+    """
+    Fetch objects from a Spotify 'several items' endpoint ('tracks' or 'artists'), 50 IDs per request.
+    Chunks are requested concurrently, one thread per chunk up to the client's adaptive
+    concurrency limit, so fewer than 51 IDs always make a single request.
+    Returns a dictionary of id -> object; IDs Spotify does not know are left out.
+    """
+    def fetch(chunk):
+        response = client.get(f"{SPOTIFY_API_URL}/{endpoint}", params={"ids": ",".join(chunk)})
+        if response.status_code != 200:
+            logger.error(f"Error getting {endpoint} for {len(chunk)} IDs: {response.text}")
+            return []
+        return response.json().get(endpoint, [])
+
+    chunks = list(chunked(list(ids), MAX_IDS_PER_REQUEST))
+    if len(chunks) > 1:
+        with ThreadPoolExecutor(max_workers=min(len(chunks), client.limiter.max_concurrency)) as executor:
+            results = list(executor.map(fetch, chunks))
+    else:
+        results = [fetch(chunk) for chunk in chunks]
+
+    found = {}
+    for items in results:
+        for item in items:
+            # Unknown IDs come back as null entries
+            if item:
+                found[item["id"]] = item
+    return found
+
+def parse_track_info(track_data, artist_genres):
+    """Build the song information dictionary from a track object and known artist genres"""
     # Get basic track info
     track_name = track_data.get("name")
     artist_name = track_data.get("artists", [{}])[0].get("name")
@@ -138,40 +150,96 @@ def get_track_info(track_id, access_token):
     # Extract year from release date (format: YYYY-MM-DD or YYYY)
     release_year = int(release_date.split("-")[0]) if release_date else None
     
-    # Get genres from artist
-    genres = []
-    if artist_id:
-        artist_url = f"https://api.spotify.com/v1/artists/{artist_id}"
-        artist_response = requests.get(artist_url, headers=headers)
-        if artist_response.status_code == 200:
-            artist_data = artist_response.json()
-            genres = artist_data.get("genres", [])
-    
     return {
         "album": album_name,
         "title": track_name,
         "artist": artist_name,
+        "artist_id": artist_id,
         "release_year": release_year,
-        "genres": genres,
+        "genres": artist_genres.get(artist_id, []),
         "album_id": album_id
     }
 
-def get_first_word(text):
-    """Get the first word of a text, handling special characters"""
-    if not text:
-        return ""
-    # Split on whitespace and take first word, removing any special characters
-    return text.split()[0].lower().strip('.,!?()[]{}')
+def create_artist_tables(cursor):
+    """
+    Creates the 'artists' cache of Spotify artist lookups and the 'artist_genres'
+    table holding one row per artist and genre.
+    """
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS artists (
+            artist_id TEXT PRIMARY KEY,
+            name TEXT,
+            genres TEXT,
+            fetched_at TEXT NOT NULL
+        )
+    """)
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS artist_genres (
+            artist_id TEXT NOT NULL REFERENCES artists(artist_id),
+            genre TEXT NOT NULL,
+            PRIMARY KEY (artist_id, genre)
+        )
+    """)
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_artist_genres_genre ON artist_genres(genre)")
+
+def load_artist_cache(conn, ttl_days):
+    """Genres of cached artists fetched within the last ttl_days, as artist_id -> list of genres"""
+    rows = conn.execute(
+        "SELECT artist_id, genres FROM artists WHERE fetched_at >= datetime('now', ?)",
+        (f"-{ttl_days} days",)
+    ).fetchall()
+    return {artist_id: json.loads(genres) for artist_id, genres in rows}
+
+def save_artists(conn, artists):
+    """Upsert fetched Spotify artist objects into the artists and artist_genres tables"""
+    artists = list(artists)
+    if not artists:
+        return
+    with conn:
+        conn.executemany("""
+            INSERT INTO artists (artist_id, name, genres, fetched_at)
+            VALUES (?, ?, ?, datetime('now'))
+            ON CONFLICT(artist_id) DO UPDATE SET
+                name = excluded.name,
+                genres = excluded.genres,
+                fetched_at = excluded.fetched_at
+        """, [(a["id"], a.get("name"), json.dumps(a.get("genres", []))) for a in artists])
+        # Genres can change between fetches, replace them
+        conn.executemany("DELETE FROM artist_genres WHERE artist_id = ?", [(a["id"],) for a in artists])
+        conn.executemany(
+            "INSERT OR IGNORE INTO artist_genres (artist_id, genre) VALUES (?, ?)",
+            [(a["id"], genre) for a in artists for genre in a.get("genres", [])]
+        )
+
+def get_tracks_info(track_ids, client, artist_genres=None, conn=None):
+    """
+    Get track information for many tracks with batched track and artist requests.
+    artist_genres caches artist_id -> genres between calls; only artists missing from it are fetched.
+    When conn is given, fetched artists are also saved to the artists table for later runs.
+    Returns a dictionary of track_id -> information as returned by get_track_info.
+    """
+    if artist_genres is None:
+        artist_genres = {}
+    
+    tracks = get_several("tracks", track_ids, client)
+    
+    # Primary artist of each track, fetched once per distinct artist
+    artist_ids = {
+        track.get("artists", [{}])[0].get("id") for track in tracks.values()
+    }
+    missing = sorted(artist_id for artist_id in artist_ids if artist_id and artist_id not in artist_genres)
+    if missing:
+        fetched = get_several("artists", missing, client)
+        for artist_id, artist_data in fetched.items():
+            artist_genres[artist_id] = artist_data.get("genres", [])
+        if conn is not None:
+            save_artists(conn, fetched.values())
+    
+    return {track_id: parse_track_info(track, artist_genres) for track_id, track in tracks.items()}
 
-def is_approximate_match(str1, str2):
-    """Check if two strings match approximately by comparing first words"""
-    if not str1 or not str2:
-        return False
-    # Try exact match first
-    if str1.lower() == str2.lower():
-        return True
-    # Try first word match
-    return get_first_word(str1) == get_first_word(str2)
+def get_track_info(track_id, client):
+    """Get track information including album, release date, and genres using Spotify API"""
+    return get_tracks_info([track_id], client).get(track_id)
 
 def update_song_info():
     """Update song information from Spotify API"""
@@ -180,9 +248,12 @@ def update_song_info():
         conn = sqlite3.connect(DB_FILE)
         cursor = conn.cursor()
         
-        # Get Spotify access token
-        access_token = get_spotify_access_token()
-        
+        # Spotify client, retries throttled requests and refreshes the token
+        client = SpotifyClient(max_concurrency=args.max_concurrency, logger=logger)
+        if args.max_concurrency > 1 and args.batch_size <= MAX_IDS_PER_REQUEST:
+            logger.warning(f"--batch-size {args.batch_size} fits in one request per batch, "
+                           f"raise it above {MAX_IDS_PER_REQUEST} for --max-concurrency to take effect")
+
         # Get all songs from the database with their current info
         cursor.execute("SELECT spotify_id, title, artist FROM songs")
         songs = cursor.fetchall()
@@ -200,15 +271,25 @@ def update_song_info():
         # Process songs in batches
         batch_size = args.batch_size
         updates = []  # Store all updates
+        # artist_id -> genres, from artists cached by earlier runs and shared by all batches
+        artist_genres = load_artist_cache(conn, args.artist_ttl_days)
+        logger.warning(f"Loaded {len(artist_genres)} cached artists")
         
         for i in range(0, total_songs, batch_size):
             batch = songs[i:i + batch_size]
             logger.warning(f"Processing batch {i//batch_size + 1}/{(total_songs + batch_size - 1)//batch_size}")
             
+            # Fetch the whole batch with 50-ID track and artist requests
+            try:
+                batch_info = get_tracks_info([song[0] for song in batch], client, artist_genres, conn)
+            except Exception as e:
+                logger.error(f"Error fetching batch from Spotify: {e}")
+                batch_info = {}
+            
             for spotify_id, db_title, db_artist in batch:
                 try:
                     # Get track info
-                    info = get_track_info(spotify_id, access_token)
+                    info = batch_info.get(spotify_id)
                     
                     if info:
                         # Verify that we have the correct song by checking title and artist
@@ -222,7 +303,7 @@ def update_song_info():
                         # If no exact match, try approximate match
                         if not (title_matches and artist_matches):
                             title_approx = is_approximate_match(spotify_title, db_title)
-                            artist_approx = is_approximate_match(spotify_artist, db_artist)
+                            artist_approx = is_approximate_match(spotify_artist, db_artist, normalize=normalize_artist)
                             
                             if title_approx and artist_approx:
                                 logger.warning(f"\nApproximate match found for ID: {spotify_id}")
@@ -256,6 +337,7 @@ def update_song_info():
                             info["album"],
                             info["release_year"],
                             ",".join(info["genres"]),
+                            info["artist_id"],
                             spotify_id
                         ))
                         updated_count += 1
@@ -274,12 +356,13 @@ def update_song_info():
                     UPDATE songs 
                     SET album = ?,
                         release_year = ?,
-                        genres = ?
+                        genres = ?,
+                        artist_id = ?
                     WHERE spotify_id = ?
                 """, updates)
                 conn.commit()
-                updates = []  # Clear the updates list
                 logger.warning(f"Bulk updated {len(updates)} songs in this batch")
+                updates = []  # Clear the updates list
             
             logger.warning(f"Processed {min(i + batch_size, total_songs)}/{total_songs} songs")
         
@@ -303,6 +386,7 @@ def update_song_info():
                 logger.warning(f"Spotify:  '{m['spotify_title']}' by '{m['spotify_artist']}'")
         
         logger.warning(f"\nUpdate complete. Updated: {updated_count}, Errors: {error_count}, Mismatches: {mismatch_count}, Approximate Matches: {approximate_match_count}")
+        client.log_stats()
         
     except sqlite3.Error as e:
         logger.error(f"Database error: {e}")
@@ -331,6 +415,14 @@ def add_new_columns():
             cursor.execute("ALTER TABLE songs ADD COLUMN genres TEXT")
             logger.info("Added genres column to songs table")
         
+        # Primary Spotify artist, joins songs to artists/artist_genres
+        if "artist_id" not in columns:
+            cursor.execute("ALTER TABLE songs ADD COLUMN artist_id TEXT")
+            logger.info("Added artist_id column to songs table")
+        cursor.execute("CREATE INDEX IF NOT EXISTS idx_songs_artist_id ON songs(artist_id)")
+        
+        create_artist_tables(cursor)
+        
         conn.commit()
         logger.info("Database schema updated successfully")
         
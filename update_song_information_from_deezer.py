@@ -9,6 +9,7 @@ from logger_config import get_script_logger
 import re
 import time
 from tqdm import tqdm
+import http_client
 
 # Parse command line arguments
 parser = argparse.ArgumentParser(description='Update song information from Deezer API')
@@ -64,7 +65,7 @@ def save_progress(spotify_id):
 
 def add_preview_column():
     """
-    Add preview_available column to songs table if it doesn't exist
+    Add preview_available and preview_file columns to songs table if they don't exist
     """
     try:
         conn = sqlite3.connect(DB_FILE)
@@ -80,6 +81,13 @@ def add_preview_column():
             logger.info("Added preview_available column to songs table")
         else:
             logger.debug("preview_available column already exists")
+        
+        if "preview_file" not in columns:
+            cursor.execute("ALTER TABLE songs ADD COLUMN preview_file TEXT")
+            conn.commit()
+            logger.info("Added preview_file column to songs table")
+        else:
+            logger.debug("preview_file column already exists")
             
     except sqlite3.Error as e:
         logger.error(f"Error adding preview_available column: {e}")
@@ -87,9 +95,11 @@ def add_preview_column():
         if conn:
             conn.close()
 
-def update_preview_status(spotify_id, has_preview):
+def update_preview_status(spotify_id, has_preview, preview_file=None):
     """
-    Update the preview_available status for a song in the database
+    Update the preview_available status for a song in the database.
+    preview_file is the name of the downloaded file in AUDIO_DIR, which
+    essentia_output_deezer/ and audio_features.csv are keyed by.
     """
     try:
         conn = sqlite3.connect(DB_FILE)
@@ -97,9 +107,9 @@ def update_preview_status(spotify_id, has_preview):
         
         cursor.execute("""
             UPDATE songs 
-            SET preview_available = ? 
+            SET preview_available = ?, preview_file = ?
             WHERE spotify_id = ?
-        """, (1 if has_preview else 0, spotify_id))
+        """, (1 if has_preview else 0, preview_file if has_preview else None, spotify_id))
         
         conn.commit()
         return True
@@ -137,18 +147,18 @@ def download_preview(preview_url, track_name, artist_name, spotify_id):
         # Check if file already exists and we're not forcing download
         if os.path.exists(filepath) and not args.force_download:
             logger.info(f"Preview already exists for '{track_name}' by '{artist_name}'")
-            update_preview_status(spotify_id, True)
+            update_preview_status(spotify_id, True, filename)
             return True
         
         # Download the file
-        response = requests.get(preview_url, stream=True)
+        response = http_client.get(preview_url, stream=True, cache=False)
         if response.status_code == 200:
             with open(filepath, 'wb') as f:
                 for chunk in response.iter_content(chunk_size=8192):
                     if chunk:
                         f.write(chunk)
             logger.info(f"✅ Downloaded preview for '{track_name}' by '{artist_name}'")
-            update_preview_status(spotify_id, True)
+            update_preview_status(spotify_id, True, filename)
             return True
         else:
             logger.error(f"Failed to download preview for '{track_name}' by '{artist_name}': {response.status_code}")
@@ -172,7 +182,7 @@ def search_deezer_track(title, artist):
         
         # Make the API request
         url = f"https://api.deezer.com/search?q={encoded_query}"
-        response = requests.get(url)
+        response = http_client.get(url)
         
         if response.status_code == 200:
             data = response.json()
@@ -9,8 +9,8 @@ from datetime import datetime
 import re
 import time
 import argparse
-import requests
 import json
+import http_client
 
 # Configuration for Selenium and API
 chrome_options = Options()
@@ -80,7 +80,7 @@ def print_music_dashboard(status_data):
 
 def get_weather(lat, lon):
     url = f"https://api.openweathermap.org/data/2.5/weather?lat={lat}&lon={lon}&appid={api_key}&units=metric"
-    response = requests.get(url)
+    response = http_client.get(url)
     return response.json()
 
 def main():